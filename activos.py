@@ -0,0 +1,94 @@
+"""
+CSS y JS de static/ con huella en el nombre y versión gzip ya comprimida.
+
+build.sh corre `python activos.py`: cada .css/.js se copia a static/dist/ como
+nombre.<hash del contenido>.ext (más nombre.<hash>.ext.gz) y se escribe manifest.json.
+Las plantillas piden la URL con activo('boletas.js') y app.py la sirve en /activos/
+con caché de un año: si el archivo cambia, cambia el nombre. Sin manifiesto
+(desarrollo) se usa static/ tal cual.
+
+    python activos.py
+"""
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+ORIGEN = Path(__file__).resolve().parent / "static"
+DESTINO = ORIGEN / "dist"
+MANIFIESTO = DESTINO / "manifest.json"
+EXTENSIONES = (".css", ".js")
+EXCLUIR = {"sw.js"}  # el service worker se sirve en /sw.js con nombre fijo
+GZIP_MIN = 256  # bytes: por debajo la versión gzip no ahorra nada
+
+
+def _escribir(ruta, datos):
+    parcial = ruta.with_name(f"{ruta.name}.{os.getpid()}.part")
+    parcial.write_bytes(datos)
+    os.replace(parcial, ruta)
+
+
+def construir() -> dict:
+    """Genera static/dist/ y su manifiesto. Devuelve {nombre lógico: nombre con huella}."""
+    DESTINO.mkdir(exist_ok=True)
+    archivos, comprimidos = {}, []
+    for ruta in sorted(ORIGEN.iterdir()):
+        if not ruta.is_file() or ruta.suffix not in EXTENSIONES or ruta.name in EXCLUIR:
+            continue
+        datos = ruta.read_bytes()
+        nombre = f"{ruta.stem}.{hashlib.sha256(datos).hexdigest()[:10]}{ruta.suffix}"
+        if not (DESTINO / nombre).exists():
+            _escribir(DESTINO / nombre, datos)
+        if len(datos) >= GZIP_MIN:
+            gz = DESTINO / f"{nombre}.gz"
+            if not gz.exists():
+                # mtime=0: el mismo contenido produce siempre los mismos bytes
+                _escribir(gz, gzip.compress(datos, compresslevel=9, mtime=0))
+            comprimidos.append(nombre)
+        archivos[ruta.name] = nombre
+
+    vigentes = {MANIFIESTO.name, *archivos.values(), *(f"{n}.gz" for n in comprimidos)}
+    for ruta in DESTINO.iterdir():
+        if ruta.name not in vigentes:
+            ruta.unlink()
+    _escribir(MANIFIESTO, json.dumps({"archivos": archivos, "gzip": comprimidos}, indent=1).encode())
+    return archivos
+
+
+# --- Lectura del manifiesto (una vez por worker) ---
+_manifiesto = None
+
+
+def _cargar():
+    global _manifiesto
+    try:
+        datos = json.loads(MANIFIESTO.read_text())
+    except FileNotFoundError:
+        datos = {"archivos": {}, "gzip": []}
+    _manifiesto = (datos["archivos"], set(datos["archivos"].values()), set(datos["gzip"]))
+    return _manifiesto
+
+
+def con_huella(nombre) -> str | None:
+    """Nombre con huella de un archivo de static/ (None si no hay manifiesto o no está)."""
+    archivos, _, _ = _manifiesto or _cargar()
+    return archivos.get(nombre)
+
+
+def ruta(nombre, gzip_ok=False) -> tuple[Path, bool] | None:
+    """
+    Archivo a servir para un nombre con huella y si es la versión gzip.
+    None si el nombre no está en el manifiesto (nunca se sirve otra cosa de DESTINO).
+    """
+    _, nombres, comprimidos = _manifiesto or _cargar()
+    if nombre not in nombres:
+        return None
+    if gzip_ok and nombre in comprimidos:
+        return DESTINO / f"{nombre}.gz", True
+    return DESTINO / nombre, False
+
+
+if __name__ == "__main__":
+    hechos = construir()
+    print(*(f"{k} -> {v}" for k, v in hechos.items()), sep="\n")
@@ -1,12 +1,25 @@
 import os
-from datetime import datetime
+import hashlib
+import math
+import re
+from datetime import datetime, timedelta
 from itertools import zip_longest
 from functools import wraps
 from urllib.parse import quote
-from flask import Flask, render_template, request, redirect, url_for, flash, Response, session
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, session, jsonify, send_file
+from markupsafe import Markup
+from werkzeug.datastructures import MultiDict
 
+import activos
+import archivo
 import database
-from pricing import calcular_precio
+import fragmentos
+import importacion
+import metricas
+import migraciones
+import pricing
+import respaldo
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-only-change-me')
@@ -16,8 +29,24 @@ WHATSAPP_NUMBER = os.getenv("LAVA_WHATSAPP", "51999999999")
 LAVA_DIRECCION = os.getenv("LAVA_DIRECCION", "Tu calle #123, Huánuco")
 PROMO_BANNER = os.getenv("LAVA_PROMO", "🌿 Martes: perfumado GRATIS en lavados por kilo")
 
-# Inicializar BD
-database.crear_bd()
+# Métricas: tiempos de database.py y sentencias por petición (antes de abrir conexiones)
+metricas.instrumentar_database(database)
+METRICS_TOKEN = os.getenv("LAVA_METRICS_TOKEN")
+
+# Esquema: las migraciones corren en build.sh; aquí solo se comprueba la versión
+migraciones.asegurar()
+database.precargar_config()
+# Cada worker reutiliza su conexión; al cerrar el app context solo se limpia
+app.teardown_appcontext(database.liberar_conexion)
+
+@app.before_request
+def _iniciar_metricas():
+    metricas.iniciar_peticion()
+
+@app.after_request
+def _registrar_metricas(response):
+    metricas.terminar_peticion(request.endpoint, response.status_code)
+    return response
 
 # Inyectar datos globales a los templates
 @app.context_processor
@@ -27,9 +56,41 @@ def inject_globals():
         LAVA_DIRECCION=LAVA_DIRECCION,
         PROMO_BANNER=PROMO_BANNER,
         logged_in=session.get('user_logged_in', False),
-        admin_logged_in=session.get('admin_logged_in', False)
+        admin_logged_in=session.get('admin_logged_in', False),
+        activo=activo,
     )
 
+# --- CSS/JS con huella (activos.py, generados en build.sh) ---
+ACTIVOS_MAX_AGE = 365 * 24 * 3600
+
+def activo(nombre):
+    """URL de un archivo de static/: la versión con huella si se corrió activos.py."""
+    huella = activos.con_huella(nombre)
+    if huella is None:
+        return url_for('static', filename=nombre)
+    return url_for('activo_estatico', nombre=huella)
+
+@app.route('/activos/<nombre>')
+def activo_estatico(nombre):
+    # La versión gzip ya está comprimida: solo se elige según Accept-Encoding
+    elegido = activos.ruta(nombre, gzip_ok=request.accept_encodings['gzip'] > 0)
+    if elegido is None:
+        return Response('No encontrado', status=404, mimetype='text/plain')
+    ruta, comprimido = elegido
+    mimetype = 'text/css' if nombre.endswith('.css') else 'text/javascript'
+    resp = send_file(ruta, mimetype=mimetype, max_age=ACTIVOS_MAX_AGE, conditional=True)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    resp.vary.add('Accept-Encoding')
+    if comprimido:
+        resp.headers['Content-Encoding'] = 'gzip'
+    return resp
+
+@app.route('/sw.js')
+def service_worker():
+    # Desde la raíz para que su alcance sea todo el sitio; sin caché para que se actualice
+    return send_file(os.path.join(app.static_folder, 'sw.js'), mimetype='text/javascript', max_age=0)
+
 # --- Helpers ---
 def to_float(x, default=0.0):
     """Convierte un valor a float de forma segura."""
@@ -126,7 +187,89 @@ def admin_panel():
             database.set_config('ADMIN_PASSWORD', new_admin_pass)
             flash('La contraseña de administrador ha sido actualizada.', 'success')
         return redirect(url_for('admin_panel'))
-    return render_template('admin.html')
+    return render_template('admin.html', respaldos=respaldo.respaldos(), respaldo_ultimo=respaldo.ULTIMO)
+
+@app.route('/admin/respaldo', methods=['POST'])
+@admin_required
+def admin_respaldo():
+    """Lanza un respaldo en segundo plano (ver respaldo.py); el resultado aparece en el panel."""
+    if respaldo.iniciar_en_segundo_plano():
+        flash('Respaldo iniciado. Recarga el panel en unos segundos para ver el resultado.', 'success')
+    else:
+        flash('Ya hay un respaldo en curso.', 'info')
+    return redirect(url_for('admin_panel'))
+
+@app.route('/admin/respaldo/<nombre>')
+@admin_required
+def admin_respaldo_descargar(nombre):
+    ruta = respaldo.ruta_respaldo(nombre)
+    if ruta is None or not ruta.exists():
+        flash('Respaldo no encontrado.', 'error')
+        return redirect(url_for('admin_panel'))
+    return send_file(ruta, mimetype='application/gzip', as_attachment=True, download_name=nombre)
+
+# --- Reporte del período (database.reporte_periodo) ---
+def _rango_reporte():
+    """?desde / ?hasta del reporte; por defecto, el mes en curso hasta hoy."""
+    hoy = datetime.now().date()
+    return (request.args.get('desde') or hoy.replace(day=1).isoformat(),
+            request.args.get('hasta') or hoy.isoformat())
+
+@app.route('/admin/reporte')
+@admin_required
+def admin_reporte():
+    desde, hasta = _rango_reporte()
+    try:
+        reporte = database.reporte_periodo(desde, hasta)
+    except ValueError as e:
+        flash(str(e), 'error')
+        reporte = None
+    hoy = datetime.now().date()
+    inicio_mes = hoy.replace(day=1)
+    fin_anterior = inicio_mes - timedelta(days=1)
+    atajos = {
+        'Este mes': (inicio_mes, hoy),
+        'Mes anterior': (fin_anterior.replace(day=1), fin_anterior),
+        'Este año': (hoy.replace(month=1, day=1), hoy),
+    }
+    return render_template('reporte.html', reporte=reporte, desde=desde, hasta=hasta, atajos=atajos)
+
+@app.route('/api/reporte')
+@admin_required
+def api_reporte():
+    desde, hasta = _rango_reporte()
+    try:
+        reporte = database.reporte_periodo(desde, hasta)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    resp = jsonify(reporte)
+    # Un período cerrado ya no cambia salvo correcciones: el navegador puede reutilizarlo un rato
+    resp.headers["Cache-Control"] = "private, max-age=300" if reporte["hasta"] < datetime.now().date().isoformat() else "private, no-cache"
+    return resp
+
+@app.route('/admin/importar', methods=['POST'])
+@admin_required
+def admin_importar():
+    """Importa boletas desde un CSV con el formato de /export.csv."""
+    import io
+    archivo = request.files.get('archivo')
+    if not archivo or not archivo.filename:
+        flash('Selecciona un archivo CSV para importar.', 'error')
+        return redirect(url_for('admin_panel'))
+    try:
+        texto = io.TextIOWrapper(archivo.stream, encoding='utf-8-sig', newline='')
+        resumen = importacion.importar_csv(texto)
+    except (importacion.ErrorImportacion, UnicodeDecodeError) as e:
+        flash(f'No se pudo importar: {e}', 'error')
+        return redirect(url_for('admin_panel'))
+
+    flash(f"Importación: {resumen['insertadas']} boletas nuevas, "
+          f"{resumen['omitidas']} ya existían.", 'success')
+    for linea, mensaje in resumen['errores'][:20]:
+        flash(f'Línea {linea}: {mensaje}', 'error')
+    if len(resumen['errores']) > 20:
+        flash(f"... y {len(resumen['errores']) - 20} errores más.", 'error')
+    return redirect(url_for('admin_panel'))
 
 @app.route('/admin/reset-password-safely')
 def reset_admin_password():
@@ -135,36 +278,146 @@ def reset_admin_password():
     flash('La contraseña de administrador ha sido restablecida a "Cris123".', 'success')
     return redirect(url_for('admin_login'))
 
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato Prometheus: sesión de admin o 'Authorization: Bearer <LAVA_METRICS_TOKEN>'."""
+    token_ok = METRICS_TOKEN and request.headers.get('Authorization') == f'Bearer {METRICS_TOKEN}'
+    if not (token_ok or session.get('admin_logged_in')):
+        return Response('No autorizado\n', status=401, mimetype='text/plain')
+    return Response(metricas.texto_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 # ------------------- PÁGINAS BASE -------------------
 @app.route("/")
 def home():
     return render_template("index.html")
 
-@app.route("/boletas")
-@login_required
-def boletas():
-    pagina = int(request.args.get("page", 1))
+def _parametros_listado():
+    """Paginación y filtros de /boletas (y de su API): ?page / after / before / cliente / desde / hasta."""
+    pagina = max(1, to_int(request.args.get("page"), 1))
     limite = 20
-    offset = (pagina - 1) * limite
+    after = request.args.get("after") or None
+    before = request.args.get("before") or None
+    # Sin token se respeta ?page=N (enlaces antiguos) con OFFSET; con token, keyset.
+    offset = 0 if (after or before) else (pagina - 1) * limite
+    return dict(
+        pagina=pagina, limite=limite, after=after, before=before, offset=offset,
+        cliente=(request.args.get("cliente") or "").strip() or None,
+        fecha_desde=request.args.get("desde") or None,
+        fecha_hasta=request.args.get("hasta") or None,
+    )
 
-    cliente = (request.args.get("cliente") or "").strip() or None
-    fecha_desde = request.args.get("desde") or None
-    fecha_hasta = request.args.get("hasta") or None
+def _etag(prefijo, version, p=None):
+    """ETag fuerte: versión de los datos + (si hay) los parámetros que definen la respuesta."""
+    if p is None:
+        return f'{prefijo}{version}'
+    clave = "|".join(str(p[k] or "") for k in sorted(p))
+    return f'{prefijo}{version}-{hashlib.sha1(clave.encode("utf-8")).hexdigest()[:12]}'
+
+def _json_condicional(etag, datos):
+    """
+    Respuesta JSON con ETag. Si el cliente ya tiene esa versión (If-None-Match) se
+    responde 304 sin llamar a datos().
+    """
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify(datos())
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
 
-    filas, total_registros = database.obtener_boletas_paginado(
-        limit=limite, offset=offset, cliente=cliente,
-        fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+@app.route("/boletas")
+@login_required
+def boletas():
+    p = _parametros_listado()
+    filas, token_anterior, token_siguiente = database.obtener_boletas_cursor(
+        limit=p["limite"], after=p["after"], before=p["before"], offset=p["offset"], cliente=p["cliente"],
+        fecha_desde=p["fecha_desde"], fecha_hasta=p["fecha_hasta"],
     )
-    total_paginas = max(1, (total_registros + limite - 1) // limite)
+    filtros = dict(cliente=p["cliente"], fecha_desde=p["fecha_desde"], fecha_hasta=p["fecha_hasta"])
+    # El conteo exacto se cachea mientras no cambien las boletas: no se recalcula en cada página
+    total_registros = database.contar_boletas(**filtros)
+    total_paginas = max(1, (total_registros + p["limite"] - 1) // p["limite"])
     # El total del período ahora se calcula sobre la tabla 'boleta'
-    total_periodo = database.total_periodo(cliente=cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+    total_periodo = database.total_periodo(**filtros)
+    # Versión de lo mostrado: la página refresca la tabla desde la API solo si cambia
+    version = database.version_boletas()
 
     return render_template(
-        "boletas.html", filas=filas, pagina=pagina, total_paginas=total_paginas,
+        "boletas.html", filas=filas, pagina=p["pagina"], total_paginas=total_paginas,
+        token_anterior=token_anterior, token_siguiente=token_siguiente,
         total_periodo=total_periodo,
-        filtros={"cliente": cliente or "", "desde": fecha_desde or "", "hasta": fecha_hasta or ""},
+        filtros={"cliente": p["cliente"] or "", "desde": p["fecha_desde"] or "", "hasta": p["fecha_hasta"] or ""},
+        etag_lista=_etag("l", version, p), etag_totales=_etag("t", version, filtros),
     )
 
+@app.route("/entregas")
+@login_required
+def entregas():
+    """Cola del mostrador: boletas sin entregar vencidas, para hoy, próximas o con saldo."""
+    tramo = request.args.get("tramo")
+    if tramo not in database.TRAMOS_ENTREGA:
+        tramo = "hoy"
+    return render_template("entregas.html", tramo=tramo, conteos=database.conteo_entregas(),
+                           filas=database.boletas_por_entregar(tramo))
+
+# ------------------- API JSON (solo lectura, con ETag) -------------------
+@app.route("/api/boletas")
+@login_required
+def api_boletas():
+    p = _parametros_listado()
+
+    def datos():
+        filas, token_anterior, token_siguiente = database.obtener_boletas_cursor(
+            limit=p["limite"], after=p["after"], before=p["before"], offset=p["offset"], cliente=p["cliente"],
+            fecha_desde=p["fecha_desde"], fecha_hasta=p["fecha_hasta"],
+        )
+        return {"boletas": [f.como_dict() for f in filas], "anterior": token_anterior, "siguiente": token_siguiente}
+
+    return _json_condicional(_etag("l", database.version_boletas(), p), datos)
+
+@app.route("/api/boletas/totales")
+@login_required
+def api_boletas_totales():
+    p = _parametros_listado()
+    filtros = dict(cliente=p["cliente"], fecha_desde=p["fecha_desde"], fecha_hasta=p["fecha_hasta"])
+
+    def datos():
+        return {"total": database.total_periodo(**filtros), "cantidad": database.contar_boletas(**filtros)}
+
+    return _json_condicional(_etag("t", database.version_boletas(), filtros), datos)
+
+@app.route("/api/boletas/<int:boleta_id>")
+@login_required
+def api_boleta_detalle(boleta_id):
+    # Solo la versión de la cabecera decide el 304: los items no se consultan
+    version = database.version_boleta(boleta_id)
+    if version is None:
+        return jsonify({"error": "Boleta no encontrada"}), 404
+
+    def datos():
+        cab, items = database.obtener_boleta_detalle(boleta_id)
+        return {"boleta": cab.como_dict(), "items": [i.como_dict() for i in items]}
+
+    return _json_condicional(_etag(f"d{boleta_id}-", version), datos)
+
+@app.route("/api/clientes")
+@login_required
+def api_clientes():
+    """Autocompletado de boleta_nueva: clientes por prefijo de nombre o teléfono."""
+    limite = min(max(to_int(request.args.get("limit") or 8), 1), 20)
+    clientes = database.sugerir_clientes(request.args.get("q"), limite)
+    respuesta = jsonify({"clientes": [c.como_dict() for c in clientes]})
+    respuesta.headers["Cache-Control"] = "private, max-age=30"
+    return respuesta
+
+@app.route("/api/clientes/<telefono>/boletas")
+@login_required
+def api_cliente_historial(telefono):
+    limite = min(max(to_int(request.args.get("limit") or 20), 1), 100)
+    filas = database.historial_cliente(telefono, limite)
+    return jsonify({"telefono": database.normalizar_telefono(telefono), "boletas": [f.como_dict() for f in filas]})
+
 @app.route("/export.csv")
 @login_required
 def export_csv():
@@ -174,131 +427,180 @@ def export_csv():
         s = str(s or "")
         return ("'" + s) if (s and s[0] in POTENTIALLY_DANGEROUS) else s
 
-    import csv, io
-    # Exportar desde la nueva tabla de boletas
-    filas = database.obtener_boletas_todas() 
-
-    output = io.StringIO()
-    output.write("\ufeff")
-    writer = csv.writer(output, delimiter=';')
-
-    writer.writerow([
-        # Info de la Boleta
-        "Boleta_ID", "Fecha_Emision", "Cliente", "Telefono", "Direccion", 
-        "Metodo_Pago_Boleta", "Estado_Boleta", "Total_Boleta", "A_Cuenta_Boleta", "Saldo_Boleta", "Notas_Boleta",
-        # Info del Item
-        "Item_ID", "Item_Descripcion", "Item_Tipo", "Item_Cantidad_Unidades", "Item_Cantidad_Kilos", 
-        "Item_Servicio", "Item_Precio_Unitario", "Item_Importe"
-    ])
-
-    for boleta_header in filas:
-        # Por cada boleta, obtener sus items
-        _, items = database.obtener_boleta_detalle(boleta_header['id'])
-        for item in items:
+    import csv, io, zlib
+    # Mismos filtros que /boletas
+    cliente = (request.args.get("cliente") or "").strip() or None
+    fecha_desde = request.args.get("desde") or None
+    fecha_hasta = request.args.get("hasta") or None
+    comprimir = request.args.get("gzip") == "1"
+
+    # Una sola consulta (boleta JOIN items) leída fila a fila
+    filas = database.iterar_boletas_export(cliente=cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+
+    def generar_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+        buffer.write("\ufeff")
+        writer.writerow([
+            # Info de la Boleta
+            "Boleta_ID", "Fecha_Emision", "Cliente", "Telefono", "Direccion", 
+            "Metodo_Pago_Boleta", "Estado_Boleta", "Total_Boleta", "A_Cuenta_Boleta", "Saldo_Boleta", "Notas_Boleta",
+            # Info del Item
+            "Item_ID", "Item_Descripcion", "Item_Tipo", "Item_Cantidad_Unidades", "Item_Cantidad_Kilos", 
+            "Item_Servicio", "Item_Precio_Unitario", "Item_Importe",
+            # Al final para no mover columnas: clave de re-importación
+            "Numero_Boleta"
+        ])
+        for fila in filas:
             writer.writerow([
                 # Datos de la boleta (se repiten por cada item)
-                boleta_header['id'], boleta_header['fecha'], sanitize_cell(boleta_header['cliente']), 
-                sanitize_cell(boleta_header['telefono']), sanitize_cell(boleta_header['direccion']),
-                boleta_header['metodo_pago'], boleta_header['estado'], boleta_header['total'], 
-                boleta_header['a_cuenta'], boleta_header['saldo'], sanitize_cell(boleta_header['notas']),
+                fila.b_id, fila.b_fecha, sanitize_cell(fila.b_cliente),
+                sanitize_cell(fila.b_telefono), sanitize_cell(fila.b_direccion),
+                fila.b_metodo_pago, fila.b_estado, fila.b_total,
+                fila.b_a_cuenta, fila.b_saldo, sanitize_cell(fila.b_notas),
                 # Datos del item
-                item['id'], sanitize_cell(item['descripcion']), item['tipo'],
-                item['prendas'], item['kilos'], item['lavado'],
-                item['p_unit'], item['importe']
+                fila.i_id, sanitize_cell(fila.i_descripcion), fila.i_tipo,
+                fila.i_prendas, fila.i_kilos, fila.i_lavado,
+                fila.i_p_unit, fila.i_importe,
+                sanitize_cell(fila.b_numero)
             ])
+            # Enviar en bloques de ~64 KB para mantener la memoria plana
+            if buffer.tell() >= 65536:
+                yield buffer.getvalue()
+                buffer.seek(0); buffer.truncate(0)
+        yield buffer.getvalue()
+
+    def generar_gzip():
+        compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+        for bloque in generar_csv():
+            datos = compresor.compress(bloque.encode("utf-8"))
+            if datos:
+                yield datos
+        yield compresor.flush()
 
     filename = f"boletas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    if comprimir:
+        return Response(
+            generar_gzip(), mimetype="application/gzip",
+            headers={"Content-Disposition": f"attachment; filename={filename}.gz"}
+        )
     return Response(
-        output.getvalue(), mimetype="text/csv; charset=utf-8",
+        generar_csv(), mimetype="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 # ------------------- NUEVO: BOLETA MULTI-ITEM -------------------
-def _normalize_phone(raw: str|None) -> str|None:
-    if not raw: return None
-    digits = "".join(ch for ch in raw if ch.isdigit())
-    if not digits: return None
-    if not digits.startswith("51"):
-        digits = "51" + digits.lstrip("0")
-    return digits
+# Topes de lo que se escribe en el mostrador (un error de tipeo no llega a la BD)
+CANTIDAD_MAX = 10_000     # kilos o prendas por ítem
+MONTO_MAX = 100_000.0     # soles: precio unitario y monto a cuenta
+
+def _numero_boleta(valor, campo, maximo):
+    """Número finito entre 0 y 'maximo' (vacío = 0). ValueError con el nombre del campo si no."""
+    numero = to_float((valor or "").strip(), math.nan)
+    if not math.isfinite(numero):
+        raise ValueError(f"{campo} no es un número válido.")
+    if not 0 <= numero <= maximo:
+        raise ValueError(f"{campo} debe estar entre 0 y {maximo:g}.")
+    return numero
+
+def _leer_boleta(form, fecha=None):
+    """
+    Cabecera e items de una boleta desde los campos de boleta_nueva.html (request.form,
+    o el MultiDict de una boleta guardada sin conexión). ValueError si no es válida.
+    """
+    # Cabecera
+    cliente = (form.get("cliente") or "").strip()
+    direccion = (form.get("direccion") or "").strip()
+    telefono = (form.get("telefono") or "").strip()
+    entrega_fecha = form.get("entrega_fecha") or ""
+    entrega_hora = form.get("entrega_hora") or ""
+    metodo_pago = form.get("metodo_pago") or "efectivo"
+    a_cuenta = _numero_boleta(form.get("a_cuenta"), "El monto a cuenta", MONTO_MAX)
+    notas = (form.get("notas") or "").strip()
+
+    if not cliente:
+        raise ValueError("El nombre del cliente es obligatorio")
+
+    # Items (listas)
+    tipos = form.getlist("item_tipo[]")
+    descs = form.getlist("item_desc[]")
+    cantidades_list = form.getlist("item_cantidad[]")
+    servicios_list = form.getlist("item_servicio[]")
+    punits_list = form.getlist("item_punit[]")
+
+    items = []
+    for tipo, desc, cantidad_str, servicio, punit_str in zip_longest(
+        tipos, descs, cantidades_list, servicios_list, punits_list, fillvalue=""
+    ):
+        tipo = (tipo or "otro").strip()
+        desc = (desc or tipo.capitalize()).strip()
+        cantidad = _numero_boleta(cantidad_str, f"La cantidad de «{desc}»", CANTIDAD_MAX)
+        p_unit = _numero_boleta(punit_str, f"El precio de «{desc}»", MONTO_MAX)
+        servicio = (servicio or "normal").strip()
+
+        # Saltar filas vacías
+        if not desc and p_unit == 0 and cantidad == 0:
+            continue
+        # El precio puesto en el mostrador manda sobre la lista y ya incluye lo que cobre
+        # el servicio (el formulario no suma RECARGO_SERVICIO/RECARGO_PERFUMADO).
+        # Solo un precio en blanco toma el de lista (config_precios); un 0 escrito es gratis
+        if not (punit_str or "").strip():
+            p_unit = pricing.TABLA.precio_unitario(tipo) / 100
+
+        prendas = to_int(cantidad) if tipo == 'unidad' else 0
+        kilos = cantidad if tipo == 'kilogramo' else 0
+
+        items.append(dict( # El campo 'servicio' ahora se llama 'lavado' en la BD
+            descripcion=desc, tipo=tipo, prendas=prendas, kilos=kilos,
+            lavado=servicio, secado=None, p_unit=p_unit, cantidad=cantidad
+        ))
+
+    if not items:
+        raise ValueError("Agrega al menos un ítem con cantidad/precio.")
+
+    # Importes y total se recalculan en el servidor, exactos al céntimo
+    importes, total = pricing.TABLA.precio_items(items)
+    for it, importe in zip(items, importes):
+        it["importe"] = importe
+        del it["cantidad"]
+
+    if round(a_cuenta, 2) > round(total, 2):
+        raise ValueError("El monto a cuenta no puede ser mayor que el total.")
+    saldo = round(total - a_cuenta, 2)
+    cabecera = dict(
+        numero=None, cliente=cliente, direccion=direccion, telefono=telefono,
+        fecha=fecha or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        entrega_fecha=entrega_fecha, entrega_hora=entrega_hora,
+        metodo_pago=metodo_pago, estado="registrado",
+        a_cuenta=a_cuenta, saldo=saldo, total=round(total, 2), notas=notas
+    )
+    return cabecera, items
+
+def _enlace_whatsapp(cabecera, items):
+    """WhatsApp: al cliente si escribió teléfono, si no al número del negocio."""
+    wa_destino = database.normalizar_telefono(cabecera["telefono"]) or WHATSAPP_NUMBER
+    msg = (
+        f"Hola {cabecera['cliente']}, gracias por elegir Lavandería RÍOS.%0A"
+        f"Total: S/ {cabecera['total']:.2f}. A cuenta: S/ {cabecera['a_cuenta']:.2f}. Saldo: S/ {cabecera['saldo']:.2f}.%0A"
+        f"Entrega: {cabecera['entrega_fecha'] or '-'} {cabecera['entrega_hora'] or ''}.%0A"
+        f"Dirección: {(cabecera['direccion'] or LAVA_DIRECCION)}.%0A"
+        f"Detalle:%0A" + "%0A".join([f"• {it['descripcion']} — S/ {it['importe']:.2f}" for it in items])
+    )
+    return f"https://wa.me/{wa_destino}?text={quote(msg)}"
 
 @app.route("/boleta/nueva", methods=["GET", "POST"])
 def boleta_nueva():
     if request.method == "POST":
         try:
-            # Cabecera
-            cliente = (request.form.get("cliente") or "").strip()
-            direccion = (request.form.get("direccion") or "").strip()
-            telefono = (request.form.get("telefono") or "").strip()
-            entrega_fecha = request.form.get("entrega_fecha") or ""
-            entrega_hora = request.form.get("entrega_hora") or ""
-            metodo_pago = request.form.get("metodo_pago") or "efectivo"
-            a_cuenta = to_float(request.form.get("a_cuenta"), 0.0)
-            notas = (request.form.get("notas") or "").strip()
-
-            if not cliente:
-                flash("El nombre del cliente es obligatorio", "error")
-                return render_template("boleta_nueva.html")
-
-            # Items (listas)
-            tipos = request.form.getlist("item_tipo[]")
-            descs = request.form.getlist("item_desc[]")
-            cantidades_list = request.form.getlist("item_cantidad[]")
-            servicios_list = request.form.getlist("item_servicio[]")
-            punits_list = request.form.getlist("item_punit[]")
-
-            items, total = [], 0.0
-            for tipo, desc, cantidad_str, servicio, punit_str in zip_longest(
-                tipos, descs, cantidades_list, servicios_list, punits_list, fillvalue=""
-            ):
-                tipo = (tipo or "otro").strip()
-                desc = (desc or tipo.capitalize()).strip()
-                cantidad = to_float(cantidad_str, 0.0)
-                p_unit = to_float(punit_str, 0.0)
-                servicio = (servicio or "normal").strip()
-
-                # Saltar filas vacías
-                if not desc and p_unit == 0 and cantidad == 0:
-                    continue
-
-                # Importe
-                importe = round(cantidad * p_unit, 2)
-                
-                prendas = to_int(cantidad) if tipo == 'unidad' else 0
-                kilos = cantidad if tipo == 'kilogramo' else 0
-
-                total += importe
-                items.append(dict( # El campo 'servicio' ahora se llama 'lavado' en la BD
-                    descripcion=desc, tipo=tipo, prendas=prendas, kilos=kilos,
-                    lavado=servicio, secado=None, p_unit=p_unit, importe=importe
-                ))
-
-            if not items:
-                flash("Agrega al menos un ítem con cantidad/precio.", "error")
+            try:
+                cabecera, items = _leer_boleta(request.form)
+            except ValueError as e:
+                flash(str(e), "error")
                 return render_template("boleta_nueva.html")
 
-            saldo = round(total - a_cuenta, 2)
-            fecha_emision = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cabecera = dict(
-                numero=None, cliente=cliente, direccion=direccion, telefono=telefono,
-                fecha=fecha_emision, entrega_fecha=entrega_fecha, entrega_hora=entrega_hora,
-                metodo_pago=metodo_pago, estado="registrado",
-                a_cuenta=a_cuenta, saldo=saldo, total=round(total, 2), notas=notas
-            )
-
             # Guardar en nuevo esquema (cabecera + items)
             boleta_id = database.insertar_boleta_compuesta(cabecera, items)
-
-            # WhatsApp: al cliente si escribió teléfono, si no al número del negocio
-            wa_destino = _normalize_phone(telefono) or WHATSAPP_NUMBER
-            msg = (
-                f"Hola {cliente}, gracias por elegir Lavandería RÍOS.%0A"
-                f"Total: S/ {total:.2f}. A cuenta: S/ {a_cuenta:.2f}. Saldo: S/ {saldo:.2f}.%0A"
-                f"Entrega: {entrega_fecha or '-'} {entrega_hora or ''}.%0A"
-                f"Dirección: {(direccion or LAVA_DIRECCION)}.%0A"
-                f"Detalle:%0A" + "%0A".join([f"• {it['descripcion']} — S/ {it['importe']:.2f}" for it in items])
-            )
-            wa_link = f"https://wa.me/{wa_destino}?text={quote(msg)}"
+            wa_link = _enlace_whatsapp(cabecera, items)
 
             flash("Boleta creada con éxito", "success")
             return redirect(url_for("boleta_detalle", boleta_id=boleta_id, wa=wa_link))
@@ -310,30 +612,119 @@ def boleta_nueva():
     # GET
     return render_template("boleta_nueva.html")
 
+# Boletas guardadas sin conexión (cola.js): llegan en lotes, cada una con su clave
+SYNC_MAX = 100
+_CLAVE_RE = re.compile(r"^[A-Za-z0-9-]{8,64}$")
+
+def _fecha_offline(ms):
+    """Hora en que se guardó la boleta en el navegador (ms epoch); None (ahora) si no es válida o es futura."""
+    try:
+        fecha = datetime.fromtimestamp(float(ms) / 1000)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    return None if fecha > datetime.now() else fecha.strftime("%Y-%m-%d %H:%M:%S")
+
+def _formulario_offline(campos):
+    """Campos guardados por cola.js -> MultiDict como request.form (item_*[] llegan como listas)."""
+    form = MultiDict()
+    for nombre, valor in campos.items():
+        for v in valor if isinstance(valor, list) else [valor]:
+            if not isinstance(v, (str, int, float)):
+                raise ValueError(f"Campo inválido: {nombre}")
+            form.add(nombre, str(v))
+    return form
+
+@app.route("/api/boletas/sync", methods=["POST"])
+@login_required
+def api_boletas_sync():
+    """
+    Recibe {"boletas": [{"clave", "creada", "campos"}, ...]} (campos como los del formulario)
+    y las inserta en una transacción. Una clave ya recibida devuelve la boleta que creó,
+    tal como quedó guardada (o un error si se eliminó).
+    """
+    boletas = (request.get_json(silent=True) or {}).get("boletas")
+    if not isinstance(boletas, list) or not 0 < len(boletas) <= SYNC_MAX:
+        return jsonify({"error": f"Se esperan entre 1 y {SYNC_MAX} boletas"}), 400
+
+    lote, leidas, errores = [], {}, []
+    vistas = set()
+    for b in boletas:
+        clave = str(b.get("clave") or "") if isinstance(b, dict) else ""
+        if not _CLAVE_RE.match(clave):
+            errores.append({"clave": clave, "error": "Clave de idempotencia inválida"})
+            continue
+        if clave in vistas:  # repetida en el mismo lote: vale la primera
+            continue
+        vistas.add(clave)
+        try:
+            campos = b.get("campos")
+            if not isinstance(campos, dict):
+                raise ValueError("Faltan los campos de la boleta")
+            cabecera, items = _leer_boleta(_formulario_offline(campos), fecha=_fecha_offline(b.get("creada")))
+        except ValueError as e:
+            errores.append({"clave": clave, "error": str(e)})
+            continue
+        lote.append((clave, cabecera, items))
+        leidas[clave] = (cabecera, items)
+
+    respuesta = []
+    for clave, boleta_id, nueva in database.sincronizar_boletas(lote):
+        if nueva:
+            cabecera, items = leidas[clave]
+        elif boleta_id is not None:
+            # Reenvío: se responde con lo guardado, no con lo que trae este envío
+            cab, guardados = database.obtener_boleta_detalle(boleta_id)
+            if cab is None:
+                boleta_id = None
+            else:
+                cabecera, items = cab.como_dict(), [it.como_dict() for it in guardados]
+        if boleta_id is None:
+            errores.append({"clave": clave, "error": "La boleta de esta clave fue eliminada"})
+            continue
+        respuesta.append({
+            "clave": clave, "id": boleta_id, "nueva": nueva, "cliente": cabecera["cliente"],
+            "total": cabecera["total"], "detalle": url_for("boleta_detalle", boleta_id=boleta_id),
+            "whatsapp": _enlace_whatsapp(cabecera, items),
+        })
+    return jsonify({"boletas": respuesta, "errores": errores})
+
 @app.route("/boleta/<int:boleta_id>")
 @login_required
 def boleta_detalle(boleta_id):
     try:
-        # Obtener la cabecera y los items de la boleta
-        cab, items = database.obtener_boleta_detalle(boleta_id)
-        
-        if not cab:
+        # Los items no cambian tras crearse: el recibo renderizado vale mientras no cambie la versión
+        version = database.version_boleta(boleta_id)
+        if version is None:
             flash("Boleta no encontrada", "error")
             return redirect(url_for("boletas"))
-        
+
+        def renderizar_recibo():
+            cab, items = database.obtener_boleta_detalle(boleta_id)
+            return render_template("boleta_recibo.html", cab=cab, items=items)
+
+        recibo = fragmentos.boleta("recibo", boleta_id, version, renderizar_recibo)
         # Generar el enlace para WhatsApp con los datos de la boleta
         wa_link = request.args.get("wa")  # opcional, pasa por query string
-        return render_template("boleta_detalle.html", cab=cab, items=items, wa_link=wa_link)
+        return render_template("boleta_detalle.html", boleta_id=boleta_id, recibo=Markup(recibo), wa_link=wa_link)
     except Exception as e:
         flash(f"Error al cargar la boleta: {e}", "error")
         return redirect(url_for("boletas"))
 
+def _boleta_sin_cambios(boleta_id):
+    """Mensaje cuando una baja o un cambio de estado no tocó ninguna fila."""
+    if database.archivo_de_boleta(boleta_id):
+        return f"La boleta #{boleta_id} está archivada: es de solo lectura."
+    return "Boleta no encontrada."
+
 @app.route("/boleta/eliminar/<int:boleta_id>", methods=["POST"])
 @admin_required
 def eliminar_boleta(boleta_id):
     try:
-        database.eliminar_boleta(boleta_id)
-        flash(f"Boleta #{boleta_id} eliminada correctamente.", "success")
+        if database.eliminar_boleta(boleta_id):
+            fragmentos.invalidar(boleta_id)
+            flash(f"Boleta #{boleta_id} eliminada correctamente.", "success")
+        else:
+            flash(_boleta_sin_cambios(boleta_id), "error")
     except Exception as e:
         flash(f"Error al eliminar la boleta: {e}", "error")
     return redirect(url_for("boletas"))
@@ -342,18 +733,161 @@ def eliminar_boleta(boleta_id):
 @admin_required
 def cambiar_estado_boleta(boleta_id):
     try:
-        cab, _ = database.obtener_boleta_detalle(boleta_id)
-        if not cab:
-            flash("Boleta no encontrada.", "error")
+        nuevo_estado = database.alternar_estado_boleta(boleta_id)
+        if not nuevo_estado:
+            flash(_boleta_sin_cambios(boleta_id), "error")
             return redirect(url_for("boletas"))
-        
-        nuevo_estado = "entregado" if cab['estado'] != 'entregado' else "registrado"
-        database.actualizar_estado_boleta(boleta_id, nuevo_estado)
+        fragmentos.invalidar(boleta_id)
         flash(f"Estado de la boleta #{boleta_id} actualizado a '{nuevo_estado.upper()}'.", "success")
     except Exception as e:
         flash(f"Error al actualizar el estado: {e}", "error")
+    # Desde la cola de entregas se vuelve al mismo tramo
+    tramo = request.form.get("tramo")
+    if tramo in database.TRAMOS_ENTREGA:
+        return redirect(url_for("entregas", tramo=tramo))
     return redirect(url_for("boletas"))
 
+ESTADOS = ("registrado", "entregado")
+
+@app.route("/boletas/estado", methods=["POST"])
+@admin_required
+def cambiar_estado_lote():
+    """Pone el mismo estado a las boletas marcadas en /boletas, en una sola transacción."""
+    estado = request.form.get("estado")
+    ids = [to_int(i) for i in request.form.getlist("ids") if to_int(i) > 0]
+    volver = url_for("boletas", cliente=request.form.get("cliente") or None,
+                     desde=request.form.get("desde") or None, hasta=request.form.get("hasta") or None)
+    if estado not in ESTADOS or not ids:
+        flash("Marca al menos una boleta y elige un estado.", "error")
+        return redirect(volver)
+    try:
+        cambiadas = database.actualizar_estado_lote(ids, estado)
+        for boleta_id in cambiadas:
+            fragmentos.invalidar(boleta_id)
+        flash(f"{len(cambiadas)} de {len(ids)} boletas pasaron a '{estado.upper()}'.", "success")
+    except Exception as e:
+        flash(f"Error al actualizar el estado: {e}", "error")
+    return redirect(volver)
+
+# ------------------- COMANDOS (flask --app app <comando>) -------------------
+@app.cli.command("reindexar-busqueda")
+def reindexar_busqueda_cmd():
+    """Reconstruye el índice de búsqueda de clientes (boleta_busqueda) desde 'boleta'."""
+    total = database.reindexar_busqueda()
+    print(f"{total} boletas indexadas.")
+
+@app.cli.command("reconstruir-clientes")
+def reconstruir_clientes_cmd():
+    """Enlaza las boletas con su cliente y recalcula la tabla cliente (también desde los archivos)."""
+    total = database.reconstruir_clientes()
+    print(f"{total} clientes.")
+
+@app.cli.command("importar-boletas")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--lote", default=importacion.TAMANO_LOTE, show_default=True, help="Boletas por transacción.")
+def importar_boletas_cmd(archivo, lote):
+    """Importa boletas desde un CSV con el formato de /export.csv (idempotente)."""
+    with open(archivo, encoding="utf-8-sig", newline="") as f:
+        try:
+            resumen = importacion.importar_csv(f, tamano_lote=lote)
+        except importacion.ErrorImportacion as e:
+            raise click.ClickException(str(e))
+    for linea, mensaje in resumen["errores"]:
+        print(f"Línea {linea}: {mensaje}")
+    print(f"{resumen['insertadas']} boletas nuevas, {resumen['omitidas']} ya existían, "
+          f"{len(resumen['errores'])} filas con errores.")
+
+@app.cli.command("simular-precios")
+@click.option("--kilo", type=float, help="Precio por kilo a simular.")
+@click.option("--edredon", type=float, help="Precio por edredón / unidad a simular.")
+@click.option("--terno", type=float, help="Precio por terno a simular.")
+@click.option("--desde", help="Fecha inicial (YYYY-MM-DD).")
+@click.option("--hasta", help="Fecha final (YYYY-MM-DD).")
+def simular_precios_cmd(kilo, edredon, terno, desde, hasta):
+    """Re-precia los items históricos con otros precios de lista y compara los totales."""
+    tabla = pricing.TablaPrecios.desde_config(precio_kilo=kilo, precio_edredon=edredon, precio_terno=terno)
+    r = tabla.simular(database.iterar_items_precio(fecha_desde=desde, fecha_hasta=hasta))
+    for tipo, t in sorted(r["por_tipo"].items()):
+        print(f"{tipo or '-':<12} {t['items']:>8} items  S/ {t['actual']:>12.2f} -> S/ {t['simulado']:>12.2f}")
+    print(f"{'TOTAL':<12} {r['items']:>8} items  S/ {r['actual']:>12.2f} -> S/ {r['simulado']:>12.2f} "
+          f"({r['diferencia']:+.2f})")
+
+@app.cli.command("migrar-legado")
+@click.option("--lote", default=migraciones.TAMANO_LOTE_LEGADO, show_default=True, help="Filas por transacción.")
+@click.option("--pausa", default=0.05, show_default=True, help="Segundos de espera entre lotes.")
+def migrar_legado_cmd(lote, pausa):
+    """Copia la tabla original 'boletas' al esquema nuevo (por lotes, se puede retomar)."""
+    copiadas = migraciones.migrar_legado(tamano_lote=lote, pausa=pausa,
+                                         progreso=lambda n: print(f"  {n} filas copiadas"))
+    v = migraciones.verificar_legado()
+    if not v["existe"]:
+        print("La tabla original 'boletas' ya no existe.")
+        return
+    print(f"{copiadas} filas copiadas. Original: {v['legado']} filas, S/ {v['suma_legado']:.2f}; "
+          f"migradas: {v['migradas']}, S/ {v['suma_total']:.2f} (items S/ {v['suma_items']:.2f}).")
+    if not v["ok"]:
+        raise click.ClickException("Las cantidades o sumas no cuadran.")
+
+@app.cli.command("retirar-legado")
+@click.option("--vacuum", is_flag=True, help="Ejecuta VACUUM después para liberar el espacio.")
+def retirar_legado_cmd(vacuum):
+    """Elimina la tabla original 'boletas' y sus índices si la migración está completa y cuadra."""
+    try:
+        v = migraciones.retirar_legado(vacuum=vacuum)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print("Tabla original 'boletas' eliminada." if v["existe"] else "La tabla original 'boletas' ya no existe.")
+
+@app.cli.command("archivar")
+@click.option("--meses", default=archivo.ARCHIVO_MESES, show_default=True,
+              help="Se archivan las boletas anteriores a este número de meses.")
+@click.option("--por-mes/--por-anio", default=archivo.ARCHIVO_POR_MES, help="Un archivo por mes o por año.")
+@click.option("--lote", default=archivo.TAMANO_LOTE, show_default=True, help="Boletas por transacción.")
+def archivar_cmd(meses, por_mes, lote):
+    """Mueve las boletas antiguas a archivo/boletas-AAAA[-MM].db (se puede retomar)."""
+    movidas = archivo.archivar(meses=meses, por_mes=por_mes, tamano_lote=lote,
+                               progreso=lambda nombre, n: print(f"  {nombre}: {n}"))
+    for nombre, n in sorted(movidas.items()):
+        print(f"{nombre}: {n} boletas archivadas")
+    if not movidas:
+        print(f"No hay boletas anteriores a {archivo.fecha_corte(meses)}.")
+
+@app.cli.command("respaldar")
+@click.option("--paginas", default=respaldo.RESPALDO_PAGINAS, show_default=True, help="Páginas copiadas por paso.")
+@click.option("--pausa", default=respaldo.RESPALDO_PAUSA, show_default=True, help="Segundos de espera entre pasos.")
+@click.option("--conservar", default=respaldo.RESPALDO_CONSERVAR, show_default=True,
+              help="Respaldos que se conservan (los más antiguos se eliminan).")
+@click.option("--sin-archivos", is_flag=True, help="No copia los archivos de boletas antiguas.")
+def respaldar_cmd(paginas, pausa, conservar, sin_archivos):
+    """Respaldo en caliente de lavanderia.db en LAVA_RESPALDO_DIR (comprimido y verificado)."""
+    try:
+        r = respaldo.respaldar(paginas=paginas, pausa=pausa, conservar=conservar, con_archivos=not sin_archivos)
+    except respaldo.ErrorRespaldo as e:
+        raise click.ClickException(str(e))
+    print(f"{r['respaldo']}: {r['bytes_bd'] / 1e6:.1f} MB -> {r['bytes_respaldo'] / 1e6:.1f} MB "
+          f"en {r['segundos']:.1f}s ({r['pasos']} pasos, el más largo {r['paso_max_ms']} ms, "
+          f"{r['reinicios']} reinicios)")
+    print(f"Espera máxima de una escritura durante la copia: {r['espera_escritura_max_ms']} ms")
+    for nombre in r["archivos"]:
+        print(f"  archivo copiado: {nombre}")
+    for nombre in r["eliminados"]:
+        print(f"  eliminado por rotación: {nombre}")
+
+@app.cli.command("verificar-resumen")
+@click.option("--reparar", is_flag=True, help="Reconstruye el resumen si hay diferencias.")
+def verificar_resumen_cmd(reparar):
+    """Compara boleta_resumen_diario con las boletas y reporta las diferencias."""
+    diferencias = database.verificar_resumen(reparar=reparar)
+    for d in diferencias:
+        print(f"{d['dia']} {d['metodo_pago']}/{d['estado']} {d['columna']}: "
+              f"boletas={d['esperado']} resumen={d['resumen']}")
+    if not diferencias:
+        print("Resumen diario consistente.")
+    elif reparar:
+        print(f"{len(diferencias)} diferencias corregidas.")
+    else:
+        raise SystemExit(1)
+
 if __name__ == "__main__":
     debug = os.getenv("FLASK_DEBUG", "1") == "1"
     app.run(debug=debug)
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Archivo de boletas antiguas.
+
+Las boletas con más de ARCHIVO_MESES meses se mueven de lavanderia.db a
+archivo/boletas-AAAA.db (o boletas-AAAA-MM.db con LAVA_ARCHIVO_PERIODO=mes), para
+que la BD del día a día siga chica:
+
+    flask --app app archivar [--meses 12] [--por-mes]
+
+Las lecturas de database.py adjuntan (ATTACH) un archivo solo cuando el rango
+pedido lo necesita; el resumen diario sigue cubriendo también lo archivado.
+Cada lote se copia al archivo y se confirma; recién después se borra de la BD
+principal. Si el proceso se corta, basta con volver a ejecutarlo.
+"""
+import logging
+import os
+import time
+from datetime import date
+
+import database
+
+log = logging.getLogger("lavanderia.archivo")
+
+ARCHIVO_MESES = int(os.getenv("LAVA_ARCHIVO_MESES", "12"))
+ARCHIVO_POR_MES = os.getenv("LAVA_ARCHIVO_PERIODO", "anio") == "mes"
+TAMANO_LOTE = 500
+
+# Boletas del lote que pueden salir de la BD principal: las que siguen iguales a su copia
+_COND_COPIADA = "id IN ({marcas}) AND version = (SELECT a.version FROM arch.boleta AS a WHERE a.id = boleta.id)"
+
+
+def fecha_corte(meses, hoy=None) -> date:
+    """Primer día del mes que está 'meses' meses antes del actual: se archiva lo anterior."""
+    hoy = hoy or date.today()
+    n = hoy.year * 12 + hoy.month - 1 - meses
+    return date(n // 12, n % 12 + 1, 1)
+
+
+def _columnas(conn, esquema, tabla):
+    return [f[1] for f in conn.execute(f"PRAGMA {esquema}.table_info({tabla})")]
+
+
+def _preparar_archivo(conn):
+    """Crea en 'arch' las tablas de la BD principal (o les agrega las columnas nuevas)."""
+    for tabla in ("boleta", "boleta_items"):
+        existentes = set(_columnas(conn, "arch", tabla))
+        if not existentes:
+            sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                               (tabla,)).fetchone()[0]
+            conn.execute(sql.replace(f"CREATE TABLE {tabla}", f"CREATE TABLE arch.{tabla}", 1))
+            continue
+        for f in conn.execute(f"PRAGMA main.table_info({tabla})").fetchall():
+            if f["name"] not in existentes:
+                default = f" DEFAULT {f['dflt_value']}" if f["dflt_value"] is not None else ""
+                conn.execute(f"ALTER TABLE arch.{tabla} ADD COLUMN {f['name']} {f['type']}{default}")
+    conn.execute("CREATE INDEX IF NOT EXISTS arch.idx_boleta_fecha ON boleta(fecha)")
+    # La importación busca por numero también en los archivos (insertar_boletas_lote)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS arch.idx_boleta_numero ON boleta(numero) WHERE numero IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS arch.idx_bitems_boleta ON boleta_items(boleta_id)")
+    conn.execute(database._SQL_INDICE_CLIENTE.format(esquema="arch."))
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS arch.boleta_busqueda USING fts5(texto, tokenize='trigram')")
+
+
+def _mover_lote(conn, nombre, ids, col_boleta, col_items):
+    marcas = ",".join("?" * len(ids))
+    cb, ci = ", ".join(col_boleta), ", ".join(col_items)
+
+    # 1) Copia al archivo (idempotente; REPLACE por si la boleta cambió desde un intento anterior)
+    conn.execute("BEGIN")
+    try:
+        conn.execute(f"INSERT OR REPLACE INTO arch.boleta ({cb}) SELECT {cb} FROM main.boleta WHERE id IN ({marcas})", ids)
+        conn.execute(f"INSERT OR IGNORE INTO arch.boleta_items ({ci}) "
+                     f"SELECT {ci} FROM main.boleta_items WHERE boleta_id IN ({marcas})", ids)
+        conn.execute(f"DELETE FROM arch.boleta_busqueda WHERE rowid IN ({marcas})", ids)
+        conn.execute("INSERT INTO arch.boleta_busqueda (rowid, texto) "
+                     f"SELECT id, lava_busqueda(cliente, telefono, notas) FROM main.boleta WHERE id IN ({marcas})", ids)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    # 2) Baja de la BD principal, conservando su aporte al resumen diario
+    cond = _COND_COPIADA.format(marcas=marcas)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        aporte = [dict(f) for f in conn.execute(
+            "SELECT substr(fecha, 1, 10) AS dia, IFNULL(metodo_pago, '') AS metodo_pago, "
+            "IFNULL(estado, '') AS estado, COUNT(1) AS cantidad, IFNULL(SUM(total), 0) AS total, "
+            "IFNULL(SUM(a_cuenta), 0) AS a_cuenta, IFNULL(SUM(saldo), 0) AS saldo "
+            f"FROM main.boleta WHERE {cond} GROUP BY 1, 2, 3", ids)]
+        conn.executemany(database._SQL_RESUMEN_SUMAR_FILA, aporte)  # el trigger de DELETE lo resta
+        conn.execute(f"INSERT OR REPLACE INTO boleta_archivada (id, archivo) SELECT id, ? FROM main.boleta WHERE {cond}",
+                     [nombre] + ids)
+        movidas = conn.execute(f"DELETE FROM main.boleta WHERE {cond}", ids).rowcount
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return movidas
+
+
+def archivar(meses=ARCHIVO_MESES, por_mes=ARCHIVO_POR_MES, tamano_lote=TAMANO_LOTE, pausa=0.05,
+             progreso=None) -> dict:
+    """
+    Mueve las boletas anteriores a fecha_corte(meses) a sus archivos, en lotes.
+    Return: {archivo: boletas movidas}
+    """
+    corte = fecha_corte(meses).isoformat()
+    database.ARCHIVO_DIR.mkdir(parents=True, exist_ok=True)
+    conn = database._abrir()
+    conn.isolation_level = None  # transacciones explícitas
+    movidas = {}
+    try:
+        while True:
+            # El período de la boleta más antigua que queda: un MIN sobre idx_boleta_fecha
+            minimo = conn.execute("SELECT MIN(fecha) FROM boleta WHERE fecha < ?", (corte,)).fetchone()[0]
+            dia = database._dia(minimo)
+            if dia is None:
+                break
+            nombre, inicio, fin = database.periodo_archivo(dia, por_mes)
+            hasta = min(fin.isoformat(), corte)
+            conn.execute("ATTACH DATABASE ? AS arch", (str(database.ruta_archivo(nombre)),))
+            try:
+                conn.execute("BEGIN")
+                try:
+                    _preparar_archivo(conn)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                col_boleta = _columnas(conn, "main", "boleta")
+                col_items = _columnas(conn, "main", "boleta_items")
+                while True:
+                    ids = [f[0] for f in conn.execute(
+                        "SELECT id FROM boleta WHERE fecha >= ? AND fecha < ? ORDER BY fecha LIMIT ?",
+                        (minimo, hasta, tamano_lote))]
+                    if not ids:
+                        break
+                    movidas[nombre] = movidas.get(nombre, 0) + _mover_lote(conn, nombre, ids, col_boleta, col_items)
+                    if progreso:
+                        progreso(nombre, movidas[nombre])
+                    time.sleep(pausa)  # deja pasar a las escrituras de la tienda
+            finally:
+                conn.execute("DETACH DATABASE arch")
+            log.info("%s: %s boletas archivadas", nombre, movidas.get(nombre, 0))
+    finally:
+        conn.close()
+    return movidas
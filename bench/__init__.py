@@ -0,0 +1,69 @@
+"""
+Benchmarks reproducibles de Lavandería RÍOS.
+
+    python -m bench.generar --dir /tmp/bench --boletas 100000      # BD sintética
+    python -m bench.micro   --dir /tmp/bench --salida micro.json   # funciones de database.py
+    python -m bench.e2e     --dir /tmp/bench --salida e2e.json     # rutas vía Flask test client
+    python -m bench.reimportar --dir /tmp/bench                   # importar tras archivar
+
+Todas usan RENDER_DATA_DIR=--dir, así que nunca tocan la BD real. Con
+--comparar base.json se muestra la variación contra una corrida anterior.
+"""
+import json
+import os
+import statistics
+import sys
+from pathlib import Path
+
+
+def usar_directorio(directorio):
+    """Apunta la app a 'directorio' (debe llamarse antes de importar database/app)."""
+    if "database" in sys.modules:
+        raise RuntimeError("usar_directorio() debe llamarse antes de importar database")
+    Path(directorio).mkdir(parents=True, exist_ok=True)
+    os.environ["RENDER_DATA_DIR"] = str(directorio)
+    raiz = str(Path(__file__).resolve().parent.parent)
+    if raiz not in sys.path:
+        sys.path.insert(0, raiz)
+
+
+def resumir(tiempos, duracion_total=None):
+    """Estadísticas de una lista de latencias en segundos (resultado en milisegundos)."""
+    if not tiempos:
+        return {"n": 0}
+    orden = sorted(tiempos)
+
+    def pct(p):
+        return orden[min(len(orden) - 1, int(round(p / 100 * (len(orden) - 1))))] * 1000
+
+    total = duracion_total if duracion_total is not None else sum(tiempos)
+    return {
+        "n": len(orden),
+        "media_ms": round(statistics.fmean(orden) * 1000, 3),
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+        "max_ms": round(orden[-1] * 1000, 3),
+        "ops_s": round(len(orden) / total, 1) if total else None,
+    }
+
+
+def guardar(resultados, salida, comparar=None):
+    """Escribe los resultados en JSON e imprime la tabla (y la comparación si se pide)."""
+    base = {}
+    if comparar:
+        with open(comparar, encoding="utf-8") as f:
+            base = json.load(f).get("casos", {})
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    print(f"{'caso':<40} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for nombre, r in resultados["casos"].items():
+        linea = (f"{nombre:<40} {r.get('n', 0):>6} {r.get('p50_ms', 0):>9.2f} "
+                 f"{r.get('p95_ms', 0):>9.2f} {r.get('p99_ms', 0):>9.2f} {r.get('ops_s') or 0:>9.1f}")
+        anterior = base.get(nombre)
+        if anterior and anterior.get("p50_ms"):
+            cambio = (r.get("p50_ms", 0) - anterior["p50_ms"]) / anterior["p50_ms"] * 100
+            linea += f"   p50 {cambio:+.1f}%"
+        print(linea)
+    print(f"Resultados en {salida}")
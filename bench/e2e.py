@@ -0,0 +1,104 @@
+"""Carga de extremo a extremo: rutas de la app vía Flask test client, con varios hilos."""
+import argparse
+import platform
+import random
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from bench import guardar, resumir, usar_directorio
+
+
+def escenarios(total_boletas, max_id):
+    """{nombre: función(cliente_http, rng) -> respuesta}"""
+    hoy = date.today()
+    paginas = max(1, total_boletas // 20)
+
+    def nueva(c, rng):
+        return c.post("/boleta/nueva", data={
+            "cliente": f"Carga {rng.randrange(10**6)}", "telefono": "987 654 321", "metodo_pago": "yape",
+            "a_cuenta": "5", "item_tipo[]": ["kilogramo", "unidad"], "item_desc[]": ["Kilos", "Edredón"],
+            "item_cantidad[]": ["3.2", "1"], "item_servicio[]": ["normal", "seco"],
+            "item_punit[]": ["3.5", "15"],
+        })
+
+    return {
+        "GET /boletas": lambda c, rng: c.get("/boletas"),
+        "GET /boletas filtrado": lambda c, rng: c.get(
+            f"/boletas?cliente=rios&desde={(hoy - timedelta(days=90)).isoformat()}&hasta={hoy.isoformat()}"),
+        "GET /boletas página profunda": lambda c, rng: c.get(f"/boletas?page={rng.randint(paginas // 2, paginas)}"),
+        "GET /boleta/<id>": lambda c, rng: c.get(f"/boleta/{rng.randint(1, max_id)}"),
+        "POST /boleta/nueva": nueva,
+        "GET /export.csv (última semana)": lambda c, rng: c.get(
+            f"/export.csv?desde={(hoy - timedelta(days=7)).isoformat()}"),
+    }
+
+
+def correr(app, escenario, hilos, peticiones, semilla):
+    """Ejecuta 'peticiones' llamadas repartidas en 'hilos'. Devuelve (latencias, errores, duración)."""
+    latencias, errores = [], []
+    candado = threading.Lock()
+    por_hilo = max(1, peticiones // hilos)
+
+    def trabajador(n):
+        rng = random.Random(semilla + n)
+        c = app.test_client()
+        c.post("/login", data={"password": app.config["BENCH_PASSWORD"]})
+        propias, fallas = [], 0
+        for _ in range(por_hilo):
+            t0 = time.perf_counter()
+            r = escenario(c, rng)
+            r.get_data()  # consumir respuestas en streaming (export)
+            propias.append(time.perf_counter() - t0)
+            if r.status_code >= 400:
+                fallas += 1
+        with candado:
+            latencias.extend(propias)
+            errores.append(fallas)
+
+    t0 = time.perf_counter()
+    ts = [threading.Thread(target=trabajador, args=(n,)) for n in range(hilos)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return latencias, sum(errores), time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--dir", required=True, help="Directorio con lavanderia.db (ver bench.generar)")
+    ap.add_argument("--hilos", type=int, default=4)
+    ap.add_argument("--peticiones", type=int, default=200, help="Peticiones por escenario")
+    ap.add_argument("--salida", default="bench_e2e.json")
+    ap.add_argument("--comparar", help="JSON de una corrida anterior")
+    ap.add_argument("--solo", help="Solo los escenarios cuyo nombre contenga este texto")
+    ap.add_argument("--semilla", type=int, default=42)
+    args = ap.parse_args()
+    usar_directorio(args.dir)
+    import app as aplicacion
+    import database
+
+    app = aplicacion.app
+    app.config["BENCH_PASSWORD"] = database.get_config("ADMIN_PASSWORD", "Cris123")
+    conn = database._conn()
+    total = conn.execute("SELECT COUNT(1) FROM boleta").fetchone()[0]
+    max_id = conn.execute("SELECT MAX(id) FROM boleta").fetchone()[0] or 1
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                    "boletas": total, "hilos": args.hilos},
+        "casos": {},
+    }
+    for nombre, escenario in escenarios(total, max_id).items():
+        if args.solo and args.solo not in nombre:
+            continue
+        latencias, errores, duracion = correr(app, escenario, args.hilos, args.peticiones, args.semilla)
+        resultados["casos"][nombre] = {**resumir(latencias, duracion), "errores": errores}
+    guardar(resultados, args.salida, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Prueba de concurrencia de escrituras: varios procesos (workers) con varios hilos
+(mostradores) crean boletas, cambian su estado y eliminan algunas a la vez.
+
+    python -m bench.estres --dir /tmp/estres --procesos 4 --hilos 8 --operaciones 200
+
+Corre primero sin cola (cada escritura en su transacción) y después con la cola de
+escritura.py, cada modo sobre una copia de la BD de --dir. Al final comprueba que
+no se perdió ninguna escritura: cada boleta creada y no eliminada existe con el
+último estado que se le puso, y las eliminadas no están.
+"""
+import argparse
+import multiprocessing
+import random
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bench import guardar, resumir, usar_directorio
+
+MODOS = ("directo", "cola")
+
+
+def _proceso(directorio, en_cola, hilos, operaciones, semilla, salida):
+    usar_directorio(directorio)
+    import database
+
+    database._escritor.en_cola = en_cola
+    esperado, latencias, errores = {}, [], []
+    lock = threading.Lock()
+
+    def mostrador(n):
+        rng = random.Random(semilla * 1000 + n)
+        propias, eliminadas = {}, set()  # id -> estado esperado
+        for i in range(operaciones):
+            op = rng.random()
+            t0 = time.perf_counter()
+            try:
+                if op < 0.6 or not propias:
+                    cab = dict(numero=None, cliente=f"Estrés {semilla}-{n}-{i}", direccion="", telefono="999888777",
+                               fecha=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), entrega_fecha="",
+                               entrega_hora="", metodo_pago="efectivo", estado="registrado", a_cuenta=0,
+                               saldo=10.5, total=10.5, notas="")
+                    items = [dict(descripcion="Kilos", tipo="kilogramo", prendas=0, kilos=3, lavado="normal",
+                                  secado=None, p_unit=3.5, importe=10.5)]
+                    propias[database.insertar_boleta_compuesta(cab, items)] = "registrado"
+                elif op < 0.9:
+                    boleta_id = rng.choice(list(propias))
+                    nuevo = "entregado" if propias[boleta_id] != "entregado" else "registrado"
+                    database.actualizar_estado_boleta(boleta_id, nuevo)
+                    propias[boleta_id] = nuevo
+                else:
+                    boleta_id = rng.choice(list(propias))
+                    database.eliminar_boleta(boleta_id)
+                    del propias[boleta_id]
+                    eliminadas.add(boleta_id)
+            except sqlite3.Error as e:
+                with lock:
+                    errores.append(str(e))
+                continue
+            with lock:
+                latencias.append(time.perf_counter() - t0)
+        with lock:
+            esperado.update(propias)
+            esperado.update(dict.fromkeys(eliminadas))
+
+    ts = [threading.Thread(target=mostrador, args=(n,)) for n in range(hilos)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    salida.put((esperado, latencias, errores))
+
+
+def correr(directorio, en_cola, procesos, hilos, operaciones):
+    ctx = multiprocessing.get_context("spawn")  # procesos limpios, como workers de gunicorn
+    salida = ctx.Queue()
+    ps = [ctx.Process(target=_proceso, args=(directorio, en_cola, hilos, operaciones, p + 1, salida))
+          for p in range(procesos)]
+    t0 = time.perf_counter()
+    for p in ps:
+        p.start()
+    resultados = [salida.get() for _ in ps]
+    duracion = time.perf_counter() - t0
+    for p in ps:
+        p.join()
+
+    esperado, latencias, errores = {}, [], []
+    for e, l, err in resultados:
+        esperado.update(e)
+        latencias += l
+        errores += err
+    return esperado, latencias, errores, duracion
+
+
+def verificar(directorio, esperado):
+    """Escrituras perdidas: boletas que no están (o están) o con otro estado que el esperado."""
+    conn = sqlite3.connect(Path(directorio) / "lavanderia.db")
+    reales = dict(conn.execute("SELECT id, estado FROM boleta WHERE cliente LIKE 'Estrés %'"))
+    conn.close()
+    perdidas = [i for i, estado in esperado.items() if reales.get(i) != estado]
+    sobrantes = [i for i in reales if i not in esperado]
+    return perdidas, sobrantes
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--dir", required=True, help="Directorio con lavanderia.db (se copia, no se modifica)")
+    ap.add_argument("--procesos", type=int, default=4)
+    ap.add_argument("--hilos", type=int, default=8, help="Hilos por proceso")
+    ap.add_argument("--operaciones", type=int, default=200, help="Operaciones por hilo")
+    ap.add_argument("--salida", default="bench_estres.json")
+    ap.add_argument("--comparar", help="JSON de una corrida anterior")
+    args = ap.parse_args()
+
+    origen = Path(args.dir) / "lavanderia.db"
+    if not origen.exists():  # BD vacía con el esquema actual
+        usar_directorio(args.dir)
+        import migraciones
+        migraciones.aplicar()
+
+    resultados = {"fecha": datetime.now().isoformat(timespec="seconds"),
+                  "entorno": {"procesos": args.procesos, "hilos": args.hilos, "operaciones": args.operaciones},
+                  "casos": {}}
+    fallo = False
+    for modo in MODOS:
+        copia = Path(args.dir) / f"estres-{modo}"
+        shutil.rmtree(copia, ignore_errors=True)
+        copia.mkdir()
+        conn = sqlite3.connect(origen)
+        with sqlite3.connect(copia / "lavanderia.db") as destino:
+            conn.backup(destino)
+        conn.close()
+
+        esperado, latencias, errores, duracion = correr(copia, modo == "cola", args.procesos, args.hilos,
+                                                        args.operaciones)
+        perdidas, sobrantes = verificar(copia, esperado)
+        resultados["casos"][modo] = {**resumir(latencias, duracion), "errores": len(errores),
+                                     "perdidas": len(perdidas), "sobrantes": len(sobrantes)}
+        print(f"{modo}: {len(latencias)} escrituras en {duracion:.1f}s, {len(errores)} errores "
+              f"({errores[0] if errores else '-'}), {len(perdidas)} perdidas, {len(sobrantes)} sobrantes")
+        fallo = fallo or bool(perdidas or sobrantes)
+        shutil.rmtree(copia, ignore_errors=True)
+    guardar(resultados, args.salida, args.comparar)
+    if fallo:
+        raise SystemExit("Se perdieron escrituras")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Genera una historia sintética de boletas en <dir>/lavanderia.db."""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bench import usar_directorio
+
+NOMBRES = ["Ana", "Luis", "María", "José", "Rosa", "Carlos", "Lucía", "Jorge", "Elena", "Pedro",
+           "Carmen", "Miguel", "Sofía", "Juan", "Isabel", "Raúl", "Núñez", "Ñique", "Gómez", "Pérez"]
+APELLIDOS = ["Ríos", "Quispe", "Mamani", "García", "Flores", "Rojas", "Huamán", "Chávez", "Torres",
+             "Núñez", "Díaz", "Castillo", "Espinoza", "Vargas", "Ramírez", "Salazar", "Córdova"]
+METODOS = ["efectivo"] * 5 + ["yape"] * 3 + ["plin", "tarjeta"]
+SERVICIOS = ["normal"] * 6 + ["seco", "mano"]
+DESCRIPCIONES_UNIDAD = ["Edredón", "Frazada", "Terno", "Casaca", "Cortinas", "Alfombra", "Zapatillas"]
+NOTAS = ["", "", "", "Prenda delicada", "Entregar antes de las 5 PM", "Martes 5 pm", "Cliente frecuente"]
+
+
+def clientes_sinteticos(n, rng):
+    """n clientes con nombre, teléfono y dirección."""
+    return [
+        (f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}",
+         f"9{rng.randrange(10**8):08d}", f"Jr. {rng.choice(APELLIDOS)} {rng.randrange(1, 999)}, Huánuco")
+        for _ in range(n)
+    ]
+
+
+def generar(boletas, dias, semilla, lote=5000):
+    import database
+    import pricing
+
+    rng = random.Random(semilla)
+    database.crear_bd()
+    clientes = clientes_sinteticos(max(10, boletas // 6), rng)
+    # Distribución sesgada (tipo Zipf): pocos clientes concentran muchas visitas
+    pesos = [1 / (r + 1) ** 1.1 for r in range(len(clientes))]
+    acumulados, acum = [], 0.0
+    for p in pesos:
+        acum += p
+        acumulados.append(acum)
+
+    inicio = datetime.now() - timedelta(days=dias)
+    paso = dias * 86400 / boletas
+    conn = database._abrir()
+    t0 = time.perf_counter()
+    for i in range(boletas):
+        cliente, telefono, direccion = rng.choices(clientes, cum_weights=acumulados)[0]
+        fecha = inicio + timedelta(seconds=i * paso + rng.uniform(0, paso))
+        items = []
+        for _ in range(rng.randint(1, 8)):
+            if rng.random() < 0.55:
+                kilos = round(rng.uniform(1, 12), 2)
+                items.append(dict(descripcion="Kilos", tipo="kilogramo", prendas=0, kilos=kilos,
+                                  lavado=rng.choice(SERVICIOS), secado=None,
+                                  p_unit=pricing.TABLA.precio_unitario("kilogramo") / 100, cantidad=kilos))
+            else:
+                prendas = rng.randint(1, 4)
+                p_unit = rng.choice([15.0, 15.0, 20.0, 12.0, 25.0])
+                items.append(dict(descripcion=rng.choice(DESCRIPCIONES_UNIDAD), tipo="unidad", prendas=prendas,
+                                  kilos=0, lavado=rng.choice(SERVICIOS), secado=None, p_unit=p_unit,
+                                  cantidad=prendas))
+        importes, total = pricing.TABLA.precio_items(items)
+        for it, importe in zip(items, importes):
+            it["importe"] = importe
+            del it["cantidad"]
+        a_cuenta = rng.choice([0.0, total, round(total / 2, 2)])
+        entrega = fecha + timedelta(days=rng.randint(1, 4))
+        viejo = fecha < datetime.now() - timedelta(days=7)
+        cabecera = dict(
+            numero=None, cliente=cliente, direccion=direccion, telefono=telefono,
+            fecha=fecha.strftime("%Y-%m-%d %H:%M:%S"), entrega_fecha=entrega.strftime("%Y-%m-%d"),
+            entrega_hora=rng.choice(["10:00", "13:00", "17:00", "18:30"]),
+            metodo_pago=rng.choice(METODOS),
+            estado="entregado" if viejo or rng.random() < 0.3 else "registrado",
+            a_cuenta=a_cuenta, saldo=round(total - a_cuenta, 2), total=total, notas=rng.choice(NOTAS),
+        )
+        cur = conn.execute(database._SQL_INSERTAR_BOLETA, cabecera)
+        conn.executemany(database._SQL_INSERTAR_ITEM, [{**it, "boleta_id": cur.lastrowid} for it in items])
+        if (i + 1) % lote == 0:
+            conn.commit()
+            print(f"  {i + 1}/{boletas} boletas ({time.perf_counter() - t0:.1f}s)")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"{boletas} boletas generadas en {time.perf_counter() - t0:.1f}s -> {database.DB_PATH}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--dir", required=True, help="Directorio donde crear lavanderia.db")
+    ap.add_argument("--boletas", type=int, default=100_000)
+    ap.add_argument("--dias", type=int, default=3 * 365, help="Días de historia a cubrir")
+    ap.add_argument("--semilla", type=int, default=42)
+    args = ap.parse_args()
+    usar_directorio(args.dir)
+    generar(args.boletas, args.dias, args.semilla)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Microbenchmark de cada función pública de database.py sobre la BD de --dir."""
+import argparse
+import platform
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+from bench import guardar, resumir, usar_directorio
+
+
+def medir(fn, repeticiones):
+    tiempos = []
+    for i in range(repeticiones):
+        t0 = time.perf_counter()
+        fn(i)
+        tiempos.append(time.perf_counter() - t0)
+    return resumir(tiempos)
+
+
+def casos(database, rng):
+    """{nombre: (función(i), repeticiones)}"""
+    conn = database._conn()
+    max_id = conn.execute("SELECT MAX(id) FROM boleta").fetchone()[0] or 1
+    total = conn.execute("SELECT COUNT(1) FROM boleta").fetchone()[0]
+    hoy = date.today()
+    mes = (hoy - timedelta(days=30)).isoformat()
+    anio = (hoy - timedelta(days=365)).isoformat()
+    cliente = conn.execute("SELECT cliente FROM boleta ORDER BY id DESC LIMIT 1").fetchone()
+    termino = (cliente[0].split()[1] if cliente and " " in cliente[0] else "rios")
+
+    # Token para una página profunda (~mitad de la historia)
+    medio, _, _ = database.obtener_boletas_cursor(limit=1, offset=total // 2)
+    token_medio = database._cursor_token(medio[0]) if medio else None
+
+    def sin_cache(fn):
+        def envoltura(i):
+            database._conteos.clear()
+            return fn(i)
+        return envoltura
+
+    creadas = []
+
+    def insertar(i):
+        cab = dict(numero=None, cliente=f"Bench {i}", direccion="", telefono="999888777",
+                   fecha=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), entrega_fecha="", entrega_hora="",
+                   metodo_pago="efectivo", estado="registrado", a_cuenta=0, saldo=10.5, total=10.5, notas="")
+        items = [dict(descripcion="Kilos", tipo="kilogramo", prendas=0, kilos=3, lavado="normal",
+                      secado=None, p_unit=3.5, importe=10.5)]
+        creadas.append(database.insertar_boleta_compuesta(cab, items))
+
+    def exportar_mes(i):
+        for _ in database.iterar_boletas_export(fecha_desde=mes):
+            pass
+
+    return {
+        "contar_boletas (sin caché)": (sin_cache(lambda i: database.contar_boletas()), 50),
+        "contar_boletas (caché)": (lambda i: database.contar_boletas(), 2000),
+        "contar_boletas cliente": (sin_cache(lambda i: database.contar_boletas(cliente=termino)), 50),
+        "obtener_boletas_cursor pág. 1": (lambda i: database.obtener_boletas_cursor(20), 500),
+        "obtener_boletas_cursor pág. media": (lambda i: database.obtener_boletas_cursor(20, after=token_medio), 500),
+        "obtener_boletas_cursor offset medio": (
+            lambda i: database.obtener_boletas_cursor(20, offset=total // 2), 20),
+        "obtener_boletas_cursor último mes": (lambda i: database.obtener_boletas_cursor(20, fecha_desde=mes), 500),
+        "obtener_boletas_cursor cliente": (lambda i: database.obtener_boletas_cursor(20, cliente=termino), 200),
+        "obtener_boletas_paginado pág. 1": (sin_cache(lambda i: database.obtener_boletas_paginado(20)), 50),
+        "total_periodo todo": (lambda i: database.total_periodo(), 200),
+        "total_periodo último año": (lambda i: database.total_periodo(fecha_desde=anio), 500),
+        "total_periodo cliente": (lambda i: database.total_periodo(cliente=termino), 100),
+        "obtener_boleta_detalle": (lambda i: database.obtener_boleta_detalle(rng.randint(1, max_id)), 2000),
+        "get_config": (lambda i: database.get_config("USER_PASSWORD"), 5000),
+        "iterar_boletas_export último mes": (exportar_mes, 5),
+        "insertar_boleta_compuesta": (insertar, 200),
+        "actualizar_estado_boleta": (
+            lambda i: database.actualizar_estado_boleta(creadas[i % len(creadas)], "entregado"), 200),
+        "eliminar_boleta": (lambda i: database.eliminar_boleta(creadas.pop()), 200),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--dir", required=True, help="Directorio con lavanderia.db (ver bench.generar)")
+    ap.add_argument("--salida", default="bench_micro.json")
+    ap.add_argument("--comparar", help="JSON de una corrida anterior")
+    ap.add_argument("--solo", help="Solo los casos cuyo nombre contenga este texto")
+    ap.add_argument("--semilla", type=int, default=42)
+    args = ap.parse_args()
+    usar_directorio(args.dir)
+    import database
+
+    database.crear_bd()
+    rng = random.Random(args.semilla)
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                    "boletas": database._conn().execute("SELECT COUNT(1) FROM boleta").fetchone()[0]},
+        "casos": {},
+    }
+    for nombre, (fn, repeticiones) in casos(database, rng).items():
+        if args.solo and args.solo not in nombre:
+            continue
+        resultados["casos"][nombre] = medir(fn, repeticiones)
+    guardar(resultados, args.salida, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
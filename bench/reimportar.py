@@ -0,0 +1,65 @@
+"""
+Re-importar después de archivar: exporta todas las boletas a CSV, archiva las
+anteriores a --meses y vuelve a importar el mismo CSV.
+
+    python -m bench.reimportar --dir /tmp/bench --meses 6
+
+Trabaja sobre una copia de --dir. La importación tiene que omitir todo (0 boletas
+nuevas, también las que ya están en los archivos) y dejar boleta_resumen_diario
+igual a lo que sale de las boletas.
+"""
+import argparse
+import io
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+from bench import usar_directorio
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--dir", required=True, help="Directorio con lavanderia.db (se copia, no se modifica)")
+    ap.add_argument("--meses", type=int, default=6, help="Se archiva lo anterior a estos meses")
+    args = ap.parse_args()
+
+    copia = Path(args.dir) / "reimportar"
+    shutil.rmtree(copia, ignore_errors=True)
+    copia.mkdir()
+    conn = sqlite3.connect(Path(args.dir) / "lavanderia.db")
+    with sqlite3.connect(copia / "lavanderia.db") as destino:
+        conn.backup(destino)
+    conn.close()
+    if (Path(args.dir) / "archivo").is_dir():
+        shutil.copytree(Path(args.dir) / "archivo", copia / "archivo")
+
+    usar_directorio(copia)
+    import app as aplicacion
+    import archivo
+    import database
+    import importacion
+
+    c = aplicacion.app.test_client()
+    c.post("/login", data={"password": database.get_config("ADMIN_PASSWORD", "Cris123")})
+    csv_texto = c.get("/export.csv").get_data(as_text=True)
+
+    movidas = archivo.archivar(meses=args.meses, pausa=0)
+    antes = database._conn().execute("SELECT COUNT(1) FROM boleta").fetchone()[0]
+
+    t0 = time.perf_counter()
+    resumen = importacion.importar_csv(io.StringIO(csv_texto, newline=""))
+    duracion = time.perf_counter() - t0
+
+    despues = database._conn().execute("SELECT COUNT(1) FROM boleta").fetchone()[0]
+    diferencias = database.verificar_resumen()
+    print(f"archivadas {sum(movidas.values())} en {len(movidas)} archivo(s); re-importación en {duracion:.1f}s: "
+          f"{resumen['insertadas']} nuevas, {resumen['omitidas']} omitidas, {len(resumen['errores'])} errores, "
+          f"{despues - antes} boletas de más, {len(diferencias)} diferencias en el resumen")
+    shutil.rmtree(copia, ignore_errors=True)
+    if resumen["insertadas"] or resumen["errores"] or despues != antes or diferencias:
+        raise SystemExit("La re-importación duplicó boletas archivadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,5 +4,9 @@ set -o errexit
 
 pip install -r requirements.txt
 
-# Crear la base de datos al construir la aplicación
-python -c "import database; database.crear_bd()"
\ No newline at end of file
+# Crear / migrar la base de datos al construir la aplicación (PRAGMA user_version)
+python migraciones.py
+# Las consultas filtradas deben usar índices (EXPLAIN QUERY PLAN); si no, falla el build
+python -c "import sys, database; p = database.verificar_planes(); print(*p, sep='\n'); sys.exit(1 if p else 0)"
+# CSS/JS con huella y versión gzip en static/dist/ (ver activos.py)
+python activos.py
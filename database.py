@@ -1,98 +1,143 @@
 import os
+import re
+import time
+import heapq
+import base64
+import json
 import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import date, timedelta
 from pathlib import Path
 
+import escritura
+import modelos
+
 # Usar el directorio de datos de Render si está disponible, si no, el directorio local.
 DATA_DIR = Path(os.getenv("RENDER_DATA_DIR", Path(__file__).parent))
 DB_PATH = str(DATA_DIR / "lavanderia.db")
 
+# Ajustes de SQLite (configurables por variables de entorno)
+DB_JOURNAL_MODE = os.getenv("LAVA_DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("LAVA_DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("LAVA_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_KB = int(os.getenv("LAVA_DB_CACHE_KB", "8192"))            # 8 MB de caché de páginas
+DB_MMAP_BYTES = int(os.getenv("LAVA_DB_MMAP_BYTES", str(64 * 1024 * 1024)))
+
+# Boletas antiguas movidas a BDs de archivo (ver archivo.py): archivo/boletas-AAAA[-MM].db
+ARCHIVO_DIR = Path(os.getenv("LAVA_ARCHIVO_DIR", DATA_DIR / "archivo"))
+# Archivos adjuntos (ATTACH) a la vez por conexión; SQLite admite 10 por defecto
+ARCHIVO_ADJUNTOS_MAX = 8
+
+# Segundos que se reutiliza un COUNT(1) de /boletas antes de recalcularlo
+CONTEO_TTL = float(os.getenv("LAVA_CONTEO_TTL", "30"))
+CONTEO_MAX = int(os.getenv("LAVA_CONTEO_MAX", "256"))  # filtros distintos guardados por worker
+
+# ====== NORMALIZACIÓN PARA BÚSQUEDA ======
+def normalizar_texto(valor) -> str:
+    """Minúsculas y sin tildes: 'Nuñez' -> 'nunez'."""
+    descompuesto = unicodedata.normalize("NFKD", str(valor or ""))
+    return "".join(ch for ch in descompuesto if not unicodedata.combining(ch)).casefold()
+
+def normalizar_telefono(valor) -> str | None:
+    """Solo dígitos y con el código de Perú: '987 654 321' -> '51987654321'. None si no hay dígitos."""
+    digitos = "".join(ch for ch in str(valor or "") if ch.isdigit())
+    if not digitos:
+        return None
+    if not digitos.startswith("51"):
+        digitos = "51" + digitos.lstrip("0")
+    return digitos
+
+def _texto_busqueda(cliente, telefono, notas) -> str:
+    """Texto indexado en boleta_busqueda: cliente, teléfono (tal cual y solo dígitos) y notas."""
+    digitos = "".join(ch for ch in str(telefono or "") if ch.isdigit())
+    return normalizar_texto(" ".join(str(x) for x in (cliente, telefono, digitos, notas) if x))
+
+# Una conexión reutilizable por hilo (y por proceso: se reabre tras un fork de gunicorn)
+_local = threading.local()
+
+def _abrir(ruta=None):
+    """Abre una conexión nueva con los pragmas del proyecto (a la BD principal o a 'ruta')."""
+    conn = sqlite3.connect(ruta or DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    if ruta is None:  # los archivos se escriben una vez: quedan con el journal por defecto
+        conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_BYTES}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    # Usada por los triggers de boleta_busqueda: toda conexión que escriba 'boleta' la necesita
+    conn.create_function("lava_busqueda", 3, _texto_busqueda, deterministic=True)
+    # Enlace boleta -> cliente (teléfono normalizado) y nombre para el autocompletado
+    conn.create_function("lava_telefono", 1, normalizar_telefono, deterministic=True)
+    conn.create_function("lava_texto", 1, normalizar_texto, deterministic=True)
+    return conn
+
 def _conn():
-    return sqlite3.connect(DB_PATH)
+    """Devuelve la conexión del hilo actual, abriéndola la primera vez."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "pid", None) != os.getpid():
+        conn = _local.conn = _abrir()
+        _local.pid = os.getpid()
+    return conn
 
-def crear_bd():
-    """Crea la BD original (boletas) y además el nuevo esquema (boleta + boleta_items)."""
-    with _conn() as conn:
-        cur = conn.cursor()
+def liberar_conexion(exc=None):
+    """
+    Fin de request (teardown del app context): deja la conexión del hilo
+    limpia para la siguiente petición, sin cerrarla.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
 
-        # ===== Esquema ORIGINAL (lo mantenemos para compatibilidad) =====
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS boletas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cliente TEXT NOT NULL,
-                tipo_item TEXT NOT NULL,
-                kilos REAL DEFAULT 0,
-                cantidad INTEGER DEFAULT 0,
-                servicio TEXT DEFAULT 'normal',
-                perfumado INTEGER DEFAULT 0,
-                precio REAL NOT NULL,
-                fecha TEXT NOT NULL,
-                metodo_pago TEXT DEFAULT 'efectivo',
-                estado TEXT DEFAULT 'registrado'
-            )
-            """
-        )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boletas_fecha ON boletas(fecha)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boletas_cliente ON boletas(cliente)")
-
-        # ===== NUEVO ESQUEMA (Cabecera + Items) =====
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS boleta (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero TEXT,                  -- opcional: correlativo impreso (N° 007601)
-                cliente TEXT NOT NULL,
-                direccion TEXT,
-                telefono TEXT,
-                fecha TEXT NOT NULL,          -- fecha de emisión
-                entrega_fecha TEXT,           -- fecha prometida
-                entrega_hora TEXT,            -- hora prometida (ej. '17:00')
-                metodo_pago TEXT DEFAULT 'efectivo',
-                estado TEXT DEFAULT 'registrado',
-                a_cuenta REAL DEFAULT 0,      -- pago parcial
-                saldo REAL DEFAULT 0,
-                total REAL DEFAULT 0,         -- total de la boleta (suma items)
-                notas TEXT                    -- observaciones (ej. 'Martes 5 pm')
-            )
-            """
-        )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_fecha ON boleta(fecha)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_cliente ON boleta(cliente)")
-
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS boleta_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                boleta_id INTEGER NOT NULL REFERENCES boleta(id) ON DELETE CASCADE,
-                descripcion TEXT,             -- 'Frazadas', 'Edredón', 'Kilos', etc.
-                tipo TEXT,                    -- kilos | edredon | terno | otro
-                prendas INTEGER DEFAULT 0,    -- nº de prendas (para terno/edredón)
-                kilos REAL DEFAULT 0,         -- para servicio por kilos
-                lavado TEXT,                  -- 'Normal', 'Seco', 'A mano'...
-                secado TEXT,                  -- 'Secadora', 'Tendedero'...
-                p_unit REAL DEFAULT 0,        -- precio unitario (por kilo o por prenda)
-                importe REAL DEFAULT 0        -- subtotal del item
-            )
-            """
-        )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_bitems_boleta ON boleta_items(boleta_id)")
-
-        # ===== TABLA DE CONFIGURACIÓN =====
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS config (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            )
-            """
-        )
-        # Insertar contraseñas por defecto si no existen
-        cur.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ('USER_PASSWORD', 'Rios123'))
-        cur.execute("INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)", ('ADMIN_PASSWORD', 'Cris123'))
+# Lecturas de boletas/items: registros de modelos.py en vez de sqlite3.Row
+_BOLETA = modelos.fabrica(modelos.Boleta)
+_ITEM = modelos.fabrica(modelos.BoletaItem)
+_FILA_EXPORT = modelos.fabrica(modelos.FilaExport)
+_CLIENTE = modelos.fabrica(modelos.Cliente)
 
-        conn.commit()
+def _leer(conn, fabrica, q, params=()):
+    """Ejecuta q en un cursor propio con la row_factory 'fabrica'."""
+    cur = conn.cursor()
+    cur.row_factory = fabrica
+    return cur.execute(q, params)
+
+def cerrar_conexion():
+    """Cierra la conexión del hilo actual (p. ej. al terminar el worker o en scripts)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        if getattr(_local, "pid", None) == os.getpid():
+            conn.close()
+
+def crear_bd():
+    """Lleva la BD a la última versión del esquema (ver migraciones.py)."""
+    import migraciones
+    migraciones.aplicar()
 
 # ====== NUEVA API (Boleta con múltiples items) ======
+_SQL_INSERTAR_BOLETA = """
+    INSERT INTO boleta (numero, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora,
+                        metodo_pago, estado, a_cuenta, saldo, total, notas, cliente_telefono)
+    VALUES (:numero, :cliente, :direccion, :telefono, :fecha, :entrega_fecha, :entrega_hora,
+            :metodo_pago, :estado, :a_cuenta, :saldo, :total, :notas, lava_telefono(:telefono))
+"""
+_SQL_INSERTAR_ITEM = """
+    INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, secado, p_unit, importe)
+    VALUES (:boleta_id, :descripcion, :tipo, :prendas, :kilos, :lavado, :secado, :p_unit, :importe)
+"""
+
+# Escrituras del mostrador: pasan por un único escritor por proceso que agrupa los
+# commits (escritura.py). Las funciones _xxx(conn, ...) no confirman: lo hace el escritor.
+_escritor = escritura.Escritor(lambda: _abrir(), lambda: _conn())
+
+def _insertar_boleta(conn, cabecera, items):
+    boleta_id = conn.execute(_SQL_INSERTAR_BOLETA, cabecera).lastrowid
+    conn.executemany(_SQL_INSERTAR_ITEM, [{**it, "boleta_id": boleta_id} for it in items])
+    return boleta_id
+
 def insertar_boleta_compuesta(cabecera: dict, items: list[dict]) -> int:
     """
     Inserta una boleta (cabecera) + sus items.
@@ -101,113 +146,928 @@ def insertar_boleta_compuesta(cabecera: dict, items: list[dict]) -> int:
     items: lista de dicts con keys: descripcion, tipo, prendas, kilos, lavado, secado, p_unit, importe
     Return: boleta_id (int)
     """
-    with _conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO boleta (numero, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora,
-                                metodo_pago, estado, a_cuenta, saldo, total, notas)
-            VALUES (:numero, :cliente, :direccion, :telefono, :fecha, :entrega_fecha, :entrega_hora,
-                    :metodo_pago, :estado, :a_cuenta, :saldo, :total, :notas)
-            """,
-            cabecera
-        )
-        boleta_id = cur.lastrowid
-
-        for it in items:
-            it = {**it, "boleta_id": boleta_id}
-            cur.execute(
-                """
-                INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, secado, p_unit, importe)
-                VALUES (:boleta_id, :descripcion, :tipo, :prendas, :kilos, :lavado, :secado, :p_unit, :importe)
-                """,
-                it
-            )
-        conn.commit()
-        return boleta_id
+    boleta_id = _escritor.ejecutar(_insertar_boleta, cabecera, items)
+    _olvidar_conteos()
+    return boleta_id
 
-def obtener_boletas_paginado(limit=20, offset=0, cliente=None, fecha_desde=None, fecha_hasta=None):
-    """Obtiene boletas paginadas y el conteo total. Usa el nuevo esquema."""
-    with _conn() as conn:
-        conn.row_factory = sqlite3.Row  # Devolver resultados como diccionarios
-        cur = conn.cursor()
-        
-        base_q = "FROM boleta"
-        params, conds = [], []
-        if cliente:
-            conds.append("cliente LIKE ?"); params.append(f"%{cliente}%")
-        if fecha_desde:
-            conds.append("date(fecha) >= date(?)"); params.append(fecha_desde)
-        if fecha_hasta:
-            conds.append("date(fecha) <= date(?)"); params.append(fecha_hasta)
-        
+# Archivar borra la boleta de la BD principal pero la conserva: sigue vigente
+_SQL_BOLETA_DE_CLAVE = """
+    SELECT k.boleta_id, EXISTS (SELECT 1 FROM boleta WHERE id = k.boleta_id)
+                        OR EXISTS (SELECT 1 FROM boleta_archivada WHERE id = k.boleta_id)
+    FROM boleta_clave k WHERE k.clave = ?
+"""
+
+def _sincronizar(conn, lote):
+    resultado = []
+    for clave, cabecera, items in lote:
+        # También atrapa claves repetidas dentro del mismo lote (la anterior ya se insertó)
+        fila = conn.execute(_SQL_BOLETA_DE_CLAVE, (clave,)).fetchone()
+        if fila:
+            boleta_id, vigente = fila
+            resultado.append((clave, boleta_id if vigente else None, False))
+            continue
+        boleta_id = _insertar_boleta(conn, cabecera, items)
+        conn.execute("INSERT INTO boleta_clave (clave, boleta_id) VALUES (?, ?)", (clave, boleta_id))
+        resultado.append((clave, boleta_id, True))
+    return resultado
+
+def sincronizar_boletas(lote: list[tuple[str, dict, list[dict]]]) -> list[tuple[str, int, bool]]:
+    """
+    Inserta boletas guardadas sin conexión, todas en una transacción.
+    lote: (clave, cabecera, items) como en insertar_boleta_compuesta; 'clave' es la clave de
+          idempotencia que generó el navegador. Las claves ya vistas no se vuelven a insertar.
+    Return: (clave, boleta_id, nueva) por cada boleta, en el orden del lote; boleta_id es
+            None si la clave ya se había recibido y su boleta se eliminó después.
+    """
+    if not lote:
+        return []
+    resultado = _escritor.ejecutar(_sincronizar, lote)
+    if any(nueva for _, _, nueva in resultado):
+        _olvidar_conteos()
+    return resultado
+
+def insertar_boletas_lote(boletas: list[tuple[dict, dict]]) -> tuple[int, list[str]]:
+    """
+    Inserta muchas boletas en una sola transacción (importación masiva).
+    boletas: lista de (cabecera, items) como en insertar_boleta_compuesta; cada cabecera
+             debe traer 'numero', que es la clave de idempotencia.
+    Se omiten las que ya existen (mismo numero, o mismo id y fecha si cabecera trae 'id'),
+    también si ya se archivaron.
+    Return: (insertadas, numeros_omitidos)
+    """
+    if not boletas:
+        return 0, []
+    # ATTACH no se puede dentro de una transacción: los archivos se revisan antes de encolar
+    archivadas = _archivadas_del_lote(_conn(), boletas)
+    # Por la cola del escritor: la búsqueda de existentes y los INSERT van en la misma transacción
+    nuevas, omitidas = _escritor.ejecutar(_insertar_lote, boletas, archivadas)
+    if nuevas:
+        _olvidar_conteos()
+    return nuevas, omitidas
+
+def _existentes_del_lote(conn, boletas, esquema=""):
+    """(numeros, {(id, fecha)}) del lote que ya están en 'esquema'.boleta."""
+    numeros = [cab["numero"] for cab, _ in boletas]
+    existentes = {f[0] for f in conn.execute(
+        f"SELECT numero FROM {esquema}boleta WHERE numero IN ({','.join('?' * len(numeros))})", numeros)}
+    # Re-importar un export propio: Boleta_ID + fecha ya presentes
+    ids = [cab["id"] for cab, _ in boletas if cab.get("id")]
+    presentes = {(f[0], f[1]) for f in conn.execute(
+        f"SELECT id, fecha FROM {esquema}boleta WHERE id IN ({','.join('?' * len(ids))})", ids)} if ids else set()
+    return existentes, presentes
+
+def _archivadas_del_lote(conn, boletas):
+    """Lo mismo que _existentes_del_lote, en los archivos que cubren las fechas del lote."""
+    numeros, presentes = set(), set()
+    fechas = [cab["fecha"] for cab, _ in boletas]
+    for nombre, _, _ in archivos(min(fechas), max(fechas)):
+        n, p = _existentes_del_lote(conn, boletas, _adjuntar(conn, nombre))
+        numeros |= n
+        presentes |= p
+    return numeros, presentes
+
+def _insertar_lote(conn, boletas, archivadas=(set(), set())):
+    existentes, presentes = _existentes_del_lote(conn, boletas)
+    existentes |= archivadas[0]
+    presentes |= archivadas[1]
+
+    nuevas, omitidas = [], []
+    for cab, items in boletas:
+        clave = cab["numero"]
+        if clave in existentes or (cab.get("id"), cab["fecha"]) in presentes:
+            omitidas.append(clave)
+            continue
+        existentes.add(clave)  # duplicados dentro del mismo lote
+        nuevas.append((cab, items))
+
+    conn.executemany(_SQL_INSERTAR_BOLETA, [cab for cab, _ in nuevas])
+    if nuevas:
+        numeros_nuevos = [cab["numero"] for cab, _ in nuevas]
+        ids = dict(conn.execute(
+            f"SELECT numero, id FROM boleta WHERE numero IN ({','.join('?' * len(numeros_nuevos))})",
+            numeros_nuevos).fetchall())
+        conn.executemany(_SQL_INSERTAR_ITEM, [
+            {**it, "boleta_id": ids[cab["numero"]]} for cab, items in nuevas for it in items
+        ])
+    return len(nuevas), omitidas
+
+def _dia(valor):
+    """'YYYY-MM-DD...' -> date, o None si no es una fecha válida."""
+    try:
+        return date.fromisoformat(str(valor)[:10])
+    except ValueError:
+        return None
+
+def _filtros_boleta(cliente=None, fecha_desde=None, fecha_hasta=None, alias="", esquema=""):
+    """
+    Arma (condiciones, params) de los filtros de /boletas sobre la tabla 'boleta'.
+    esquema: prefijo de un archivo adjunto ('arch_2023.'); vacío para la BD principal.
+    'cliente' busca en cliente, teléfono y notas vía boleta_busqueda (FTS5 trigram).
+    Las fechas se comparan como rango semiabierto sobre el texto ISO de 'fecha'
+    (fecha >= desde AND fecha < hasta + 1 día) para que se use idx_boleta_fecha.
+    """
+    a = f"{alias}." if alias else ""
+    params, conds = [], []
+    if cliente:
+        termino = normalizar_texto(cliente).strip()
+        if len(termino) >= 3:
+            # Frase entre comillas: el trigram busca la subcadena en el índice
+            conds.append(f"{a}id IN (SELECT rowid FROM {esquema}boleta_busqueda WHERE boleta_busqueda MATCH ?)")
+            params.append('"' + termino.replace('"', '""') + '"')
+        else:
+            # El trigram necesita 3+ caracteres; con menos se recorre solo el índice de búsqueda
+            conds.append(f"{a}id IN (SELECT rowid FROM {esquema}boleta_busqueda WHERE texto LIKE ?)")
+            params.append(f"%{termino}%")
+    if fecha_desde:
+        dia = _dia(fecha_desde)
+        if dia is None:
+            conds.append("0")  # como date('basura'): no coincide nada
+        else:
+            conds.append(f"{a}fecha >= ?"); params.append(dia.isoformat())
+    if fecha_hasta:
+        dia = _dia(fecha_hasta)
+        if dia is None:
+            conds.append("0")
+        else:
+            conds.append(f"{a}fecha < ?"); params.append((dia + timedelta(days=1)).isoformat())
+    return conds, params
+
+# --- SQL de listado / totales / exportación ---
+# Se arman aquí para que las funciones y verificar_planes() usen exactamente la misma consulta.
+# 'esquema' (prefijo 'arch_...') arma la misma consulta sobre un archivo adjunto.
+def _sql_conteo(cliente=None, fecha_desde=None, fecha_hasta=None, esquema=""):
+    conds, params = _filtros_boleta(cliente, fecha_desde, fecha_hasta, esquema=esquema)
+    where_clause = " WHERE " + " AND ".join(conds) if conds else ""
+    return f"SELECT COUNT(1) FROM {esquema}boleta{where_clause}", params
+
+def _sql_listado(limit=20, pos_after=None, pos_before=None, offset=0,
+                 cliente=None, fecha_desde=None, fecha_hasta=None, esquema=""):
+    conds, params = _filtros_boleta(cliente, fecha_desde, fecha_hasta, esquema=esquema)
+    orden = "DESC"
+    if pos_after:
+        conds.append("(fecha, id) < (?, ?)"); params.extend(pos_after)
+    elif pos_before:
+        conds.append("(fecha, id) > (?, ?)"); params.extend(pos_before)
+        orden = "ASC"  # se recorre hacia atrás y luego se invierte
+    where_clause = " WHERE " + " AND ".join(conds) if conds else ""
+    q = (f"SELECT {', '.join(modelos.COLUMNAS_LISTADO)} FROM {esquema}boleta{where_clause} "
+         f"ORDER BY fecha {orden}, id {orden} LIMIT ? OFFSET ?")
+    return q, params + [limit, offset]
+
+def _sql_total(cliente=None, fecha_desde=None, fecha_hasta=None, esquema=""):
+    if cliente:
+        # La búsqueda por cliente no está en el rollup: se suma sobre 'boleta'
+        conds, params = _filtros_boleta(cliente, fecha_desde, fecha_hasta, esquema=esquema)
         where_clause = " WHERE " + " AND ".join(conds) if conds else ""
+        return f"SELECT COALESCE(SUM(total), 0) FROM {esquema}boleta{where_clause}", params
+    # Sin cliente: pocas filas de boleta_resumen_diario en vez de todas las boletas
+    # (el resumen incluye las boletas archivadas: no hace falta adjuntar archivos)
+    conds, params = [], []
+    for valor, operador in ((fecha_desde, ">="), (fecha_hasta, "<=")):
+        if valor:
+            dia = _dia(valor)
+            if dia is None:
+                conds.append("0")
+            else:
+                conds.append(f"dia {operador} ?"); params.append(dia.isoformat())
+    where_clause = " WHERE " + " AND ".join(conds) if conds else ""
+    return f"SELECT COALESCE(SUM(total), 0) FROM boleta_resumen_diario{where_clause}", params
+
+def _sql_export(cliente=None, fecha_desde=None, fecha_hasta=None):
+    conds, params = _filtros_boleta(cliente, fecha_desde, fecha_hasta, alias="b")
+    where_clause = " WHERE " + " AND ".join(conds) if conds else ""
+    q = ("SELECT b.id AS b_id, b.fecha AS b_fecha, b.cliente AS b_cliente, b.telefono AS b_telefono, "
+         "b.direccion AS b_direccion, b.metodo_pago AS b_metodo_pago, b.estado AS b_estado, "
+         "b.total AS b_total, b.a_cuenta AS b_a_cuenta, b.saldo AS b_saldo, b.notas AS b_notas, "
+         "i.id AS i_id, i.descripcion AS i_descripcion, i.tipo AS i_tipo, i.prendas AS i_prendas, "
+         "i.kilos AS i_kilos, i.lavado AS i_lavado, i.p_unit AS i_p_unit, i.importe AS i_importe, "
+         "b.numero AS b_numero "
+         "FROM boleta AS b JOIN boleta_items AS i ON i.boleta_id = b.id"
+         f"{where_clause} ORDER BY b.fecha DESC, b.id DESC, i.id ASC")
+    return q, params
+
+# ====== ARCHIVO (boletas antiguas fuera de la BD principal) ======
+# archivo.py mueve las boletas viejas a archivo/boletas-AAAA.db (o -AAAA-MM.db).
+# Las consultas adjuntan (ATTACH) solo los archivos cuyo período se cruza con el
+# rango pedido; un archivo cubre fechas en [inicio, fin).
+_ARCHIVO_RE = re.compile(r"^boletas-(\d{4})(?:-(\d{2}))?\.db$")
+_archivos_cache = (None, [])  # (mtime del directorio, [(nombre, inicio, fin)])
+
+def periodo_archivo(dia: date, por_mes=False):
+    """Archivo que corresponde a un día: (nombre, inicio, fin)."""
+    if por_mes:
+        inicio = dia.replace(day=1)
+        fin = (inicio + timedelta(days=32)).replace(day=1)
+        return f"boletas-{inicio:%Y-%m}", inicio, fin
+    inicio = dia.replace(month=1, day=1)
+    return f"boletas-{inicio:%Y}", inicio, inicio.replace(year=inicio.year + 1)
+
+def archivos(fecha_desde=None, fecha_hasta=None) -> list[tuple[str, date, date]]:
+    """Archivos (nombre, inicio, fin) que pueden tener boletas del rango, del más reciente al más antiguo."""
+    global _archivos_cache
+    try:
+        mtime = ARCHIVO_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if _archivos_cache[0] != mtime:
+        lista = []
+        for ruta in ARCHIVO_DIR.iterdir():
+            m = _ARCHIVO_RE.match(ruta.name)
+            if m:
+                anio, mes = int(m.group(1)), m.group(2)
+                lista.append(periodo_archivo(date(anio, int(mes or 1), 1), por_mes=bool(mes)))
+        _archivos_cache = (mtime, sorted(lista, key=lambda a: a[1], reverse=True))
+    desde, hasta = _dia(fecha_desde), _dia(fecha_hasta)
+    return [a for a in _archivos_cache[1]
+            if (desde is None or a[2] > desde) and (hasta is None or a[1] <= hasta)]
+
+def ruta_archivo(nombre) -> Path:
+    return ARCHIVO_DIR / f"{nombre}.db"
+
+def _adjuntar(conn, nombre) -> str:
+    """
+    Adjunta el archivo 'nombre' a la conexión del hilo (si no lo estaba) y devuelve su
+    prefijo de esquema ('arch_2023.'). Con más de ARCHIVO_ADJUNTOS_MAX se suelta el menos usado.
+    """
+    estado = getattr(_local, "adjuntos", None)
+    if estado is None or estado[0] is not conn:
+        estado = _local.adjuntos = (conn, OrderedDict())
+    adjuntos = estado[1]
+    esquema = "arch_" + nombre.split("-", 1)[1].replace("-", "_")
+    if esquema in adjuntos:
+        adjuntos.move_to_end(esquema)
+    else:
+        if len(adjuntos) >= ARCHIVO_ADJUNTOS_MAX:
+            viejo, _ = adjuntos.popitem(last=False)
+            conn.execute(f"DETACH DATABASE {viejo}")
+        conn.execute(f"ATTACH DATABASE ? AS {esquema}", (str(ruta_archivo(nombre)),))
+        adjuntos[esquema] = nombre
+    return esquema + "."
+
+def _archivo_de(conn, boleta_id):
+    """Nombre del archivo donde quedó una boleta archivada, o None."""
+    fila = conn.execute("SELECT archivo FROM boleta_archivada WHERE id = ?", (boleta_id,)).fetchone()
+    return fila[0] if fila else None
+
+def archivo_de_boleta(boleta_id: int):
+    """Archivo de una boleta archivada (solo lectura: no se elimina ni cambia de estado), o None."""
+    return _archivo_de(_conn(), boleta_id)
+
+def version_boletas() -> int:
+    """Contador de cambios de 'boleta' (sube con cada alta, baja o modificación, en cualquier worker)."""
+    return _conn().execute("SELECT version FROM boleta_cambios WHERE id = 1").fetchone()[0]
+
+def version_boleta(boleta_id: int):
+    """Versión de una boleta (sube con cada UPDATE), o None si no existe."""
+    conn = _conn()
+    fila = conn.execute("SELECT version FROM boleta WHERE id = ?", (boleta_id,)).fetchone()
+    if fila is None:
+        archivo = _archivo_de(conn, boleta_id)
+        if archivo:
+            fila = conn.execute(f"SELECT version FROM {_adjuntar(conn, archivo)}boleta WHERE id = ?",
+                                (boleta_id,)).fetchone()
+    return fila[0] if fila else None
+
+# Conteos recientes por filtro: {(cliente, desde, hasta): (instante, version_boletas, total)},
+# los CONTEO_MAX usados más recientemente ('cliente' es texto libre: sin tope crecería sin fin)
+_conteos = OrderedDict()
+_conteos_lock = threading.Lock()
+
+def _olvidar_conteos():
+    with _conteos_lock:
+        _conteos.clear()
+
+def _conteo_guardado(clave, version):
+    with _conteos_lock:
+        guardado = _conteos.get(clave)
+        if guardado is None:
+            return None
+        if guardado[1] != version or time.monotonic() - guardado[0] >= CONTEO_TTL:
+            del _conteos[clave]
+            return None
+        _conteos.move_to_end(clave)
+        return guardado[2]
+
+def _guardar_conteo(clave, version, total):
+    with _conteos_lock:
+        # Cambiaron las boletas desde el último guardado: lo anterior ya no sirve
+        if _conteos and next(reversed(_conteos.values()))[1] != version:
+            _conteos.clear()
+        _conteos[clave] = (time.monotonic(), version, total)
+        _conteos.move_to_end(clave)
+        while len(_conteos) > CONTEO_MAX:
+            _conteos.popitem(last=False)
 
-        # Contar total de registros
-        cur.execute(f"SELECT COUNT(1) {base_q}{where_clause}", params)
-        total_registros = cur.fetchone()[0]
+def contar_boletas(cliente=None, fecha_desde=None, fecha_hasta=None) -> int:
+    """
+    COUNT(1) de boletas con los filtros dados, cacheado hasta CONTEO_TTL segundos
+    mientras no cambien las boletas (version_boletas).
+    """
+    clave = (cliente, fecha_desde, fecha_hasta)
+    version = version_boletas()
+    total = _conteo_guardado(clave, version)
+    if total is not None:
+        return total
+    conn = _conn()
+    total = conn.execute(*_sql_conteo(cliente, fecha_desde, fecha_hasta)).fetchone()[0]
+    for nombre, _, _ in archivos(fecha_desde, fecha_hasta):
+        esquema = _adjuntar(conn, nombre)
+        total += conn.execute(*_sql_conteo(cliente, fecha_desde, fecha_hasta, esquema)).fetchone()[0]
+    _guardar_conteo(clave, version, total)
+    return total
+
+def _cursor_token(fila) -> str:
+    """Token opaco con la posición (fecha, id) de una fila."""
+    crudo = f"{fila.fecha}|{fila.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+def _leer_cursor(token):
+    """Decodifica un token de _cursor_token. Devuelve (fecha, id) o None si no es válido."""
+    if not token:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("utf-8")
+        fecha, boleta_id = crudo.rsplit("|", 1)
+        return fecha, int(boleta_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def _listar(limit, pos_after, pos_before, offset, cliente, fecha_desde, fecha_hasta):
+    """
+    Filas del listado desde la BD principal y, si hace falta, desde los archivos.
+    Cada fuente devuelve sus primeras limit + offset filas y se mezclan en Python.
+    Los archivos se recorren desde el lado del orden: en cuanto las filas ya
+    reunidas quedan todas antes que el período de un archivo, no se adjunta ninguno más.
+    """
+    conn = _conn()
+    desc = not pos_before
+    # El cursor también acota qué archivos pueden aportar filas
+    desde, hasta = fecha_desde, fecha_hasta
+    if pos_after:
+        hasta = min(filter(None, (hasta, pos_after[0][:10])))
+    elif pos_before:
+        desde = max(filter(None, (desde, pos_before[0][:10])))
+    candidatos = archivos(desde, hasta)
+    if not candidatos:
+        return _leer(conn, _BOLETA, *_sql_listado(limit, pos_after, pos_before, offset,
+                                                  cliente, fecha_desde, fecha_hasta)).fetchall()
+
+    n = limit + offset
+    filas = _leer(conn, _BOLETA, *_sql_listado(n, pos_after, pos_before, 0,
+                                               cliente, fecha_desde, fecha_hasta)).fetchall()
+    for nombre, inicio, fin in (candidatos if desc else reversed(candidatos)):
+        if len(filas) >= n:
+            ultima = filas[n - 1].fecha
+            if (desc and ultima >= fin.isoformat()) or (not desc and ultima < inicio.isoformat()):
+                break
+        esquema = _adjuntar(conn, nombre)
+        filas += _leer(conn, _BOLETA, *_sql_listado(n, pos_after, pos_before, 0, cliente,
+                                                    fecha_desde, fecha_hasta, esquema)).fetchall()
+        filas.sort(key=lambda f: (f.fecha, f.id), reverse=desc)
+        del filas[n:]
+    return filas[offset:]
+
+def obtener_boletas_cursor(limit=20, after=None, before=None, offset=0,
+                           cliente=None, fecha_desde=None, fecha_hasta=None):
+    """
+    Paginación por keyset sobre (fecha DESC, id DESC).
+    after/before: tokens de posición (siguiente / anterior). offset solo se usa
+    sin token, para mantener los enlaces antiguos ?page=N.
+    Return: (filas, token_anterior, token_siguiente); los tokens son None en los extremos.
+    """
+    pos_after, pos_before = _leer_cursor(after), _leer_cursor(before)
+    filas = _listar(limit + 1, pos_after, pos_before, 0 if (pos_after or pos_before) else offset,
+                    cliente, fecha_desde, fecha_hasta)
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+    if pos_before:
+        filas.reverse()
 
-        # Obtener filas paginadas
-        q_filas = (f"SELECT * {base_q}{where_clause} "
-                   "ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?")
-        cur.execute(q_filas, params + [limit, offset])
-        filas = cur.fetchall()
-        
-        return filas, total_registros
+    if not filas:
+        return filas, None, None
+    if pos_before:
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        hay_anterior, hay_siguiente = bool(pos_after or offset), hay_mas
+    token_anterior = _cursor_token(filas[0]) if hay_anterior else None
+    token_siguiente = _cursor_token(filas[-1]) if hay_siguiente else None
+    return filas, token_anterior, token_siguiente
+
+def obtener_boletas_paginado(limit=20, offset=0, cliente=None, fecha_desde=None, fecha_hasta=None):
+    """Obtiene boletas paginadas y el conteo total. Usa el nuevo esquema."""
+    # Conteo total (cacheado)
+    total_registros = contar_boletas(cliente, fecha_desde, fecha_hasta)
+    # Obtener filas paginadas
+    filas = _leer(_conn(), _BOLETA, *_sql_listado(limit, offset=offset, cliente=cliente,
+                                                  fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)).fetchall()
+    return filas, total_registros
 
 def total_periodo(cliente=None, fecha_desde=None, fecha_hasta=None):
-    """Calcula el SUM(total) del nuevo esquema de boletas."""
-    with _conn() as conn:
-        cur = conn.cursor()
-        q = "SELECT COALESCE(SUM(total), 0) FROM boleta"
-        params, conds = [], []
-        if cliente:
-            conds.append("cliente LIKE ?"); params.append(f"%{cliente}%")
-        if fecha_desde:
-            conds.append("date(fecha) >= date(?)"); params.append(fecha_desde)
-        if fecha_hasta:
-            conds.append("date(fecha) <= date(?)"); params.append(fecha_hasta)
-        if conds: q += " WHERE " + " AND ".join(conds)
-        cur.execute(q, params)
-        return float(cur.fetchone()[0])
+    """Calcula el SUM(total) del nuevo esquema de boletas (vía boleta_resumen_diario si no hay cliente)."""
+    conn = _conn()
+    total = float(conn.execute(*_sql_total(cliente, fecha_desde, fecha_hasta)).fetchone()[0])
+    if cliente:
+        for nombre, _, _ in archivos(fecha_desde, fecha_hasta):
+            esquema = _adjuntar(conn, nombre)
+            total += conn.execute(*_sql_total(cliente, fecha_desde, fecha_hasta, esquema)).fetchone()[0]
+    return round(total, 2)
+
+# ====== COLA DE ENTREGAS ======
+# Solo boletas sin entregar: todas las consultas llevan "estado <> 'entregado'" literal para
+# usar el índice parcial idx_boleta_pendiente (entrega_fecha, entrega_hora, saldo, estado), que
+# no crece con el histórico. entrega_fecha es 'YYYY-MM-DD' o '' si no se pactó.
+_PENDIENTE = "estado <> 'entregado'"
+TRAMOS_ENTREGA = {
+    "vencidas": ("entrega_fecha > '' AND entrega_fecha < :hoy", "entrega_fecha, entrega_hora, id"),
+    "hoy": ("entrega_fecha = :hoy", "entrega_hora, id"),
+    "proximas": ("entrega_fecha > :hoy", "entrega_fecha, entrega_hora, id"),
+    "sin_fecha": ("IFNULL(entrega_fecha, '') = ''", "fecha, id"),
+    "con_saldo": ("saldo > 0", "entrega_fecha, entrega_hora, id"),
+}
+_SQL_CONTEO_ENTREGAS = f"""
+    SELECT {', '.join(f'IFNULL(SUM({cond}), 0) AS {tramo}' for tramo, (cond, _) in TRAMOS_ENTREGA.items())},
+           IFNULL(SUM(CASE WHEN saldo > 0 THEN saldo END), 0) AS saldo
+    FROM boleta WHERE {_PENDIENTE}
+"""
+
+def _hoy(hoy):
+    return (hoy or date.today()).isoformat()
+
+def conteo_entregas(hoy=None) -> dict:
+    """
+    Boletas sin entregar por tramo (vencidas, hoy, proximas, sin_fecha, con_saldo) y el
+    saldo por cobrar, en una sola pasada por el índice de pendientes.
+    """
+    fila = _conn().execute(_SQL_CONTEO_ENTREGAS, {"hoy": _hoy(hoy)}).fetchone()
+    return {**dict(fila), "saldo": round(fila["saldo"], 2)}
+
+def _sql_entregas(tramo, hoy=None, limit=200):
+    condicion, orden = TRAMOS_ENTREGA[tramo]
+    q = (f"SELECT {', '.join(modelos.COLUMNAS_DETALLE)} FROM boleta WHERE {_PENDIENTE} AND {condicion} "
+         f"ORDER BY {orden} LIMIT :limit")
+    return q, {"hoy": _hoy(hoy), "limit": limit}
+
+def boletas_por_entregar(tramo, hoy=None, limit=200) -> list[modelos.Boleta]:
+    """Boletas sin entregar de un tramo de TRAMOS_ENTREGA, por hora de entrega pactada."""
+    return _leer(_conn(), _BOLETA, *_sql_entregas(tramo, hoy, limit)).fetchall()
+
+_SQL_CABECERA = f"SELECT {', '.join(modelos.COLUMNAS_DETALLE)} FROM {{esquema}}boleta WHERE id = ?"
 
 def obtener_boleta_detalle(boleta_id: int):
-    """Devuelve (cabecera, items[])"""
-    with _conn() as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, numero, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora, "
-            "metodo_pago, estado, a_cuenta, saldo, total, notas "
-            "FROM boleta WHERE id = ?",
-            (boleta_id,)
-        )
-        cab = cur.fetchone()
-
-        cur.execute(
-            "SELECT id, descripcion, tipo, prendas, kilos, lavado, secado, p_unit, importe "
-            "FROM boleta_items WHERE boleta_id = ? ORDER BY id ASC",
-            (boleta_id,)
-        )
-        items = cur.fetchall()
-        return cab, items
+    """Devuelve (Boleta, [BoletaItem]); si no está en la BD principal la busca en su archivo."""
+    conn = _conn()
+    esquema = ""
+    cab = _leer(conn, _BOLETA, _SQL_CABECERA.format(esquema=esquema), (boleta_id,)).fetchone()
+    if cab is None:
+        archivo = _archivo_de(conn, boleta_id)
+        if archivo:
+            esquema = _adjuntar(conn, archivo)
+            cab = _leer(conn, _BOLETA, _SQL_CABECERA.format(esquema=esquema), (boleta_id,)).fetchone()
+
+    items = _leer(
+        conn, _ITEM,
+        f"SELECT {', '.join(modelos.COLUMNAS_ITEM)} FROM {esquema}boleta_items WHERE boleta_id = ? ORDER BY id ASC",
+        (boleta_id,)
+    ).fetchall()
+    return cab, items
 
 def obtener_boletas_todas():
-    """Obtiene todas las boletas del nuevo esquema para exportación."""
-    with _conn() as conn:
-        conn.row_factory = sqlite3.Row
+    """Obtiene todas las boletas del nuevo esquema (columnas del listado)."""
+    return _leer(_conn(), _BOLETA, f"SELECT {', '.join(modelos.COLUMNAS_LISTADO)} FROM boleta "
+                                   "ORDER BY fecha DESC, id DESC").fetchall()
+
+def iterar_boletas_export(cliente=None, fecha_desde=None, fecha_hasta=None):
+    """
+    Generador para exportación: una sola consulta boleta JOIN boleta_items,
+    leída fila a fila desde el cursor (sin cargar todo en memoria).
+    Cada fila trae la cabecera (b_*) repetida junto a su item (i_*).
+    Si el rango incluye archivos, se mezclan sus filas con las de la BD principal
+    en el mismo orden (cada fuente ya viene ordenada).
+    """
+    q, params = _sql_export(cliente, fecha_desde, fecha_hasta)
+    rutas = [None] + [ruta_archivo(nombre) for nombre, _, _ in archivos(fecha_desde, fecha_hasta)]
+    fuentes = [_filas(ruta, q, params, _FILA_EXPORT) for ruta in rutas]
+    if len(fuentes) == 1:
+        yield from fuentes[0]
+        return
+    # fecha DESC, id DESC y luego item ASC
+    yield from heapq.merge(*fuentes, key=lambda f: (f.b_fecha, f.b_id, -f.i_id), reverse=True)
+
+def _filas(ruta, q, params, fabrica=sqlite3.Row):
+    """
+    Lee q fila a fila con una conexión propia (la lectura larga no ocupa la del hilo).
+    fabrica: row_factory (None = tuplas simples, lo más rápido para millones de filas).
+    """
+    conn = _abrir(ruta)
+    try:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM boleta ORDER BY fecha DESC, id DESC")
-        return cur.fetchall()
+        cur.row_factory = fabrica
+        cur.execute(q, params)
+        while True:
+            filas = cur.fetchmany(5000)
+            if not filas:
+                break
+            yield from filas
+    finally:
+        conn.close()
+
+def reindexar_busqueda(conn=None) -> int:
+    """Reconstruye boleta_busqueda desde 'boleta' (backfill). Devuelve las boletas indexadas."""
+    propia = conn is None
+    conn = conn or _conn()
+    conn.execute("DELETE FROM boleta_busqueda")
+    cur = conn.execute(
+        "INSERT INTO boleta_busqueda (rowid, texto) "
+        "SELECT id, lava_busqueda(cliente, telefono, notas) FROM boleta"
+    )
+    if propia:
+        conn.commit()
+    return cur.rowcount
+
+# ====== CLIENTES ======
+# La tabla cliente la mantienen los triggers de boleta (migración 9); esto es el backfill.
+# Por cliente: la última boleta da nombre y fecha, y la dirección es la última no vacía.
+_SQL_CLIENTES_DESDE_BOLETA = """
+    SELECT cliente_telefono, cliente, direccion, boletas, primera, fecha FROM (
+        SELECT cliente_telefono, cliente, fecha,
+               FIRST_VALUE(NULLIF(direccion, '')) OVER (
+                   PARTITION BY cliente_telefono ORDER BY NULLIF(direccion, '') IS NULL, fecha DESC
+               ) AS direccion,
+               COUNT(1) OVER (PARTITION BY cliente_telefono) AS boletas,
+               MIN(fecha) OVER (PARTITION BY cliente_telefono) AS primera,
+               ROW_NUMBER() OVER (PARTITION BY cliente_telefono ORDER BY fecha DESC, id DESC) AS orden
+        FROM boleta WHERE cliente_telefono IS NOT NULL
+    ) WHERE orden = 1
+"""
+
+_SQL_INDICE_CLIENTE = ("CREATE INDEX IF NOT EXISTS {esquema}idx_boleta_cliente_tel ON boleta(cliente_telefono, fecha) "
+                       "WHERE cliente_telefono IS NOT NULL")
+
+def _enlazar_archivo(ruta):
+    """Agrega boleta.cliente_telefono (y su índice) a un archivo creado antes de la tabla cliente."""
+    conn = _abrir(ruta)
+    try:
+        if "cliente_telefono" not in {f[1] for f in conn.execute("PRAGMA table_info(boleta)")}:
+            conn.execute("ALTER TABLE boleta ADD COLUMN cliente_telefono TEXT")
+        conn.execute("UPDATE boleta SET cliente_telefono = lava_telefono(telefono) "
+                     "WHERE cliente_telefono IS NOT lava_telefono(telefono)")
+        conn.execute(_SQL_INDICE_CLIENTE.format(esquema=""))
+        conn.commit()
+    finally:
+        conn.close()
+
+def reconstruir_clientes(conn=None) -> int:
+    """
+    Enlaza cada boleta con su cliente (boleta.cliente_telefono, también en los archivos) y
+    recalcula la tabla cliente. Devuelve los clientes.
+    """
+    propia = conn is None
+    conn = conn or _conn()
+    conn.execute("UPDATE boleta SET cliente_telefono = lava_telefono(telefono) "
+                 "WHERE cliente_telefono IS NOT lava_telefono(telefono)")
+    clientes = {}
+    fuentes = [conn.execute(_SQL_CLIENTES_DESDE_BOLETA).fetchall()]
+    for nombre, _, _ in archivos():
+        _enlazar_archivo(ruta_archivo(nombre))
+        fuentes.append(list(_filas(ruta_archivo(nombre), _SQL_CLIENTES_DESDE_BOLETA, (), None)))
+    for filas in fuentes:
+        for telefono, nombre, direccion, boletas, primera, ultima in filas:
+            c = clientes.get(telefono)
+            if c is None:
+                clientes[telefono] = [nombre, direccion, boletas, primera, ultima]
+                continue
+            reciente = ultima > c[4]
+            c[0] = nombre if reciente else c[0]
+            c[1] = (direccion or c[1]) if reciente else (c[1] or direccion)
+            c[2] += boletas
+            c[3], c[4] = min(primera, c[3]), max(ultima, c[4])
+    conn.execute("DELETE FROM cliente")
+    conn.executemany(
+        "INSERT INTO cliente (telefono, nombre, nombre_busqueda, direccion, boletas, primera, ultima) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(t, c[0] or "", normalizar_texto(c[0]), *c[1:]) for t, c in clientes.items()])
+    if propia:
+        conn.commit()
+    return len(clientes)
+
+# Autocompletado: todos los clientes del prefijo, ordenados por frecuencia y recencia.
+# Una boleta de hace CLIENTE_DECAIMIENTO_DIAS días pesa la mitad que una de hoy.
+# El ranking se calcula solo con idx_cliente_nombre_orden (nombre_busqueda, ultima, boletas)
+# o la clave primaria (telefono); después se leen las filas de los elegidos.
+CLIENTE_DECAIMIENTO_DIAS = 30
+_ORDEN_CLIENTE = (f"boletas / (1.0 + MAX(julianday('now', 'localtime') - julianday(ultima), 0) "
+                  f"/ {CLIENTE_DECAIMIENTO_DIAS}) DESC, ultima DESC")
+_SQL_SUGERIR_CLIENTES = f"""
+    SELECT {', '.join(modelos.COLUMNAS_CLIENTE)} FROM cliente WHERE telefono IN (
+        SELECT telefono FROM cliente WHERE {{columna}} >= ? AND {{columna}} < ?
+        ORDER BY {_ORDEN_CLIENTE} LIMIT ?
+    )
+    ORDER BY {_ORDEN_CLIENTE}
+"""
+
+def sugerir_clientes(texto, limit=8) -> list[modelos.Cliente]:
+    """
+    Clientes cuyo nombre (sin tildes ni mayúsculas) o teléfono empieza por 'texto'.
+    Solo dígitos (y espacios, +, -) se busca por teléfono; si no, por nombre.
+    """
+    texto = str(texto or "").strip()
+    if texto and not any(ch.isalpha() for ch in texto):
+        columna, prefijo = "telefono", normalizar_telefono(texto)
+    else:
+        columna, prefijo = "nombre_busqueda", normalizar_texto(texto)
+    if not prefijo or len(prefijo) < 2:
+        return []
+    return _leer(_conn(), _CLIENTE, _SQL_SUGERIR_CLIENTES.format(columna=columna),
+                 (prefijo, prefijo + "\uffff", limit)).fetchall()
+
+_SQL_HISTORIAL_CLIENTE = (f"SELECT {', '.join(modelos.COLUMNAS_LISTADO)} FROM {{esquema}}boleta "
+                          "WHERE cliente_telefono = ? ORDER BY fecha DESC, id DESC LIMIT ?")
+
+def historial_cliente(telefono, limit=20) -> list[modelos.Boleta]:
+    """
+    Últimas boletas de un cliente (por su teléfono), de la BD principal y de los archivos,
+    por el índice idx_boleta_cliente_tel. Los archivos anteriores a su primera boleta no se abren.
+    """
+    telefono = normalizar_telefono(telefono)
+    if not telefono:
+        return []
+    conn = _conn()
+    q = _SQL_HISTORIAL_CLIENTE
+    filas = _leer(conn, _BOLETA, q.format(esquema=""), (telefono, limit)).fetchall()
+    primera = conn.execute("SELECT primera FROM cliente WHERE telefono = ?", (telefono,)).fetchone()
+    if primera is None:
+        return filas
+    for nombre, inicio, fin in archivos(primera[0], None):
+        if len(filas) >= limit and filas[limit - 1].fecha >= fin.isoformat():
+            break
+        filas += _leer(conn, _BOLETA, q.format(esquema=_adjuntar(conn, nombre)), (telefono, limit)).fetchall()
+        filas.sort(key=lambda f: (f.fecha, f.id), reverse=True)
+        del filas[limit:]
+    return filas
+
+def iterar_items_precio(fecha_desde=None, fecha_hasta=None):
+    """
+    Generador de tuplas (tipo, prendas, kilos, p_unit, importe) de boleta_items, para
+    re-preciar en bloque (pricing.TablaPrecios.simular). Filtra por la fecha de la boleta.
+    """
+    conds, params = _filtros_boleta(None, fecha_desde, fecha_hasta, alias="b")
+    where_clause = " WHERE " + " AND ".join(conds) if conds else ""
+    q = ("SELECT i.tipo, i.prendas, i.kilos, i.p_unit, i.importe "
+         f"FROM boleta_items AS i JOIN boleta AS b ON b.id = i.boleta_id{where_clause}")
+    yield from _filas(None, q, params, None)
+    for nombre, _, _ in archivos(fecha_desde, fecha_hasta):
+        yield from _filas(ruta_archivo(nombre), q, params, None)
+
+# ====== RESUMEN DIARIO ======
+_SQL_RESUMEN_DESDE_BOLETA = (
+    "SELECT substr(fecha, 1, 10) AS dia, IFNULL(metodo_pago, '') AS metodo_pago, "
+    "IFNULL(estado, '') AS estado, COUNT(1) AS cantidad, IFNULL(SUM(total), 0) AS total, "
+    "IFNULL(SUM(a_cuenta), 0) AS a_cuenta, IFNULL(SUM(saldo), 0) AS saldo "
+    "FROM boleta GROUP BY 1, 2, 3"
+)
+
+_SQL_RESUMEN_SUMAR_FILA = """
+    INSERT INTO boleta_resumen_diario (dia, metodo_pago, estado, cantidad, total, a_cuenta, saldo)
+    VALUES (:dia, :metodo_pago, :estado, :cantidad, :total, :a_cuenta, :saldo)
+    ON CONFLICT (dia, metodo_pago, estado) DO UPDATE SET
+        cantidad = cantidad + excluded.cantidad, total = total + excluded.total,
+        a_cuenta = a_cuenta + excluded.a_cuenta, saldo = saldo + excluded.saldo
+"""
+
+def _resumen_archivos():
+    """Filas del resumen calculadas sobre los archivos (el rollup también cubre lo archivado)."""
+    for nombre, _, _ in archivos():
+        yield from (dict(f) for f in _filas(ruta_archivo(nombre), _SQL_RESUMEN_DESDE_BOLETA, ()))
+
+def reconstruir_resumen(conn=None) -> int:
+    """Recalcula boleta_resumen_diario desde 'boleta' y los archivos. Devuelve las filas de 'boleta'."""
+    propia = conn is None
+    conn = conn or _conn()
+    de_archivos = list(_resumen_archivos())  # se lee antes de escribir
+    conn.execute("DELETE FROM boleta_resumen_diario")
+    cur = conn.execute(
+        "INSERT INTO boleta_resumen_diario (dia, metodo_pago, estado, cantidad, total, a_cuenta, saldo) "
+        + _SQL_RESUMEN_DESDE_BOLETA
+    )
+    filas = cur.rowcount
+    conn.executemany(_SQL_RESUMEN_SUMAR_FILA, de_archivos)
+    if propia:
+        conn.commit()
+    return filas
+
+def verificar_resumen(reparar=False) -> list[dict]:
+    """
+    Compara boleta_resumen_diario con lo que sale de 'boleta' (y de los archivos) y devuelve
+    las diferencias (una por clave dia/metodo_pago/estado). Con reparar=True reconstruye el rollup.
+    """
+    conn = _conn()
+    columnas = ("cantidad", "total", "a_cuenta", "saldo")
+    esperado = {}
+    for f in [dict(f) for f in conn.execute(_SQL_RESUMEN_DESDE_BOLETA)] + list(_resumen_archivos()):
+        e = esperado.setdefault((f["dia"], f["metodo_pago"], f["estado"]), dict.fromkeys(columnas, 0))
+        for col in columnas:
+            e[col] += f[col]
+    actual = {(f["dia"], f["metodo_pago"], f["estado"]): f
+              for f in conn.execute("SELECT * FROM boleta_resumen_diario")}
+    diferencias = []
+    for clave in sorted(esperado.keys() | actual.keys()):
+        e, a = esperado.get(clave), actual.get(clave)
+        for col in columnas:
+            ve, va = (e[col] if e else 0), (a[col] if a else 0)
+            if abs(ve - va) > 0.005:
+                diferencias.append(dict(dia=clave[0], metodo_pago=clave[1], estado=clave[2],
+                                        columna=col, esperado=ve, resumen=va))
+    if diferencias and reparar:
+        with conn:
+            reconstruir_resumen(conn)
+    return diferencias
+
+# ====== REPORTE DEL PERÍODO ======
+# Dos pasadas: ventas por día y método de pago desde boleta_resumen_diario (ya incluye lo
+# archivado) y kilos/servicios desde boleta JOIN boleta_items (BD principal y archivos).
+# Los períodos cerrados (hasta < hoy) se guardan en reporte_cache; los triggers de la
+# migración 12 borran los que incluyen un día que cambió.
+REPORTE_CACHE_MAX = 200  # reportes guardados; se descartan los menos recientes
+
+_SQL_REPORTE_VENTAS = """
+    SELECT dia, metodo_pago, SUM(cantidad) AS boletas, SUM(total) AS total,
+           SUM(a_cuenta) AS a_cuenta, SUM(saldo) AS saldo,
+           SUM(SUM(total)) OVER (ORDER BY dia) AS acumulado,
+           SUM(SUM(cantidad)) OVER (PARTITION BY metodo_pago) AS boletas_metodo,
+           SUM(SUM(total)) OVER (PARTITION BY metodo_pago) AS total_metodo,
+           SUM(SUM(total)) OVER () AS total_periodo
+    FROM boleta_resumen_diario
+    WHERE dia >= ? AND dia <= ?
+    GROUP BY dia, metodo_pago
+    ORDER BY dia, metodo_pago
+"""
+
+def _sql_reporte_items(desde, hasta, esquema=""):
+    conds, params = _filtros_boleta(None, desde, hasta, alias="b")
+    q = ("SELECT substr(b.fecha, 1, 10) AS dia, IFNULL(i.lavado, '') AS lavado, COUNT(1) AS items, "
+         "COUNT(DISTINCT b.id) AS boletas, IFNULL(SUM(i.kilos), 0) AS kilos, "
+         "IFNULL(SUM(i.prendas), 0) AS prendas, IFNULL(SUM(i.importe), 0) AS importe "
+         f"FROM {esquema}boleta AS b JOIN {esquema}boleta_items AS i ON i.boleta_id = b.id "
+         f"WHERE {' AND '.join(conds)} GROUP BY 1, 2")
+    return q, params
+
+def _calcular_reporte(desde, hasta) -> dict:
+    conn = _conn()
+    por_dia, por_metodo = {}, {}
+    for f in conn.execute(_SQL_REPORTE_VENTAS, (desde, hasta)):
+        d = por_dia.setdefault(f["dia"], dict(dia=f["dia"], boletas=0, total=0.0, a_cuenta=0.0, saldo=0.0,
+                                               kilos=0.0, prendas=0, acumulado=0.0))
+        for col in ("boletas", "total", "a_cuenta", "saldo"):
+            d[col] += f[col]
+        d["acumulado"] = f["acumulado"]
+        por_metodo[f["metodo_pago"]] = dict(
+            metodo_pago=f["metodo_pago"], boletas=f["boletas_metodo"], total=f["total_metodo"],
+            participacion=f["total_metodo"] / f["total_periodo"] if f["total_periodo"] else 0.0)
+
+    filas = list(conn.execute(*_sql_reporte_items(desde, hasta)))
+    for nombre, _, _ in archivos(desde, hasta):
+        filas += conn.execute(*_sql_reporte_items(desde, hasta, _adjuntar(conn, nombre))).fetchall()
+    por_lavado = {}
+    for f in filas:
+        if f["dia"] in por_dia:  # boletas sin resumen (no debería haber) quedan fuera de los días
+            por_dia[f["dia"]]["kilos"] += f["kilos"]
+            por_dia[f["dia"]]["prendas"] += f["prendas"]
+        s = por_lavado.setdefault(f["lavado"], dict(lavado=f["lavado"], items=0, boletas=0, kilos=0.0,
+                                                   prendas=0, importe=0.0))
+        for col in ("items", "boletas", "kilos", "prendas", "importe"):
+            s[col] += f[col]
+    importe_total = sum(s["importe"] for s in por_lavado.values())
+    servicios = sorted(por_lavado.values(), key=lambda s: s["importe"], reverse=True)
+    for puesto, s in enumerate(servicios, 1):
+        s["puesto"] = puesto
+        s["participacion"] = s["importe"] / importe_total if importe_total else 0.0
+
+    dias = list(por_dia.values())
+    redondear = lambda filas: [{k: round(v, 3) if isinstance(v, float) else v for k, v in f.items()} for f in filas]
+    return dict(
+        desde=desde, hasta=hasta,
+        totales=dict(
+            boletas=sum(d["boletas"] for d in dias), total=round(sum(d["total"] for d in dias), 2),
+            a_cuenta=round(sum(d["a_cuenta"] for d in dias), 2), saldo=round(sum(d["saldo"] for d in dias), 2),
+            kilos=round(sum(s["kilos"] for s in servicios), 3), prendas=sum(s["prendas"] for s in servicios),
+        ),
+        por_dia=redondear(dias),
+        por_metodo_pago=redondear(sorted(por_metodo.values(), key=lambda m: m["total"], reverse=True)),
+        por_lavado=redondear(servicios),
+    )
+
+def _guardar_reporte(conn, desde, hasta, version, datos):
+    # Si algo cambió mientras se calculaba, el reporte puede estar viejo: no se guarda
+    if conn.execute("SELECT version FROM boleta_cambios WHERE id = 1").fetchone()[0] != version:
+        return
+    conn.execute("INSERT OR REPLACE INTO reporte_cache (desde, hasta, datos, creado) VALUES (?, ?, ?, ?)",
+                 (desde, hasta, datos, time.time()))
+    conn.execute("DELETE FROM reporte_cache WHERE (desde, hasta) NOT IN "
+                 "(SELECT desde, hasta FROM reporte_cache ORDER BY creado DESC LIMIT ?)", (REPORTE_CACHE_MAX,))
+
+def reporte_periodo(fecha_desde, fecha_hasta, hoy=None) -> dict:
+    """
+    Ventas del período por día y método de pago, kilos y prendas por día, y lo vendido por
+    servicio (lavado). Los períodos ya cerrados se leen de reporte_cache desde la segunda vez.
+    Return: dict con desde, hasta, totales, por_dia, por_metodo_pago, por_lavado y 'cache'.
+    """
+    desde, hasta = _dia(fecha_desde), _dia(fecha_hasta)
+    if desde is None or hasta is None or desde > hasta:
+        raise ValueError("Rango de fechas inválido")
+    desde, hasta = desde.isoformat(), hasta.isoformat()
+    cerrado = hasta < _hoy(hoy)
+    conn = _conn()
+    if cerrado:
+        fila = conn.execute("SELECT datos FROM reporte_cache WHERE desde = ? AND hasta = ?", (desde, hasta)).fetchone()
+        if fila:
+            return {**json.loads(fila[0]), "cache": True}
+    version = version_boletas()
+    reporte = _calcular_reporte(desde, hasta)
+    if cerrado:
+        _escritor.ejecutar(_guardar_reporte, desde, hasta, version, json.dumps(reporte))
+    return {**reporte, "cache": False}
+
+# ====== CONTROL DE PLANES DE CONSULTA ======
+def _plan(conn, q, params):
+    return [fila[3] for fila in conn.execute("EXPLAIN QUERY PLAN " + q, params)]
+
+def verificar_planes() -> list[str]:
+    """
+    Revisa con EXPLAIN QUERY PLAN que las consultas filtradas de listado, totales
+    y exportación usen índices. Devuelve la lista de problemas (vacía si todo va bien).
+    Se ejecuta en build.sh: un 'SCAN boleta' sin índice hace fallar el deploy.
+    """
+    hoy = date.today().isoformat()
+    casos = {
+        "listado": _sql_listado(20),
+        "listado por fechas": _sql_listado(20, fecha_desde="2024-01-01", fecha_hasta=hoy),
+        "listado siguiente página": _sql_listado(20, pos_after=(hoy, 10**9), fecha_desde="2024-01-01"),
+        "listado por cliente": _sql_listado(20, cliente="nunez"),
+        "total por cliente": _sql_total(cliente="nunez", fecha_desde="2024-01-01"),
+        "conteo por fechas": _sql_conteo(fecha_desde="2024-01-01", fecha_hasta=hoy),
+        "total por fechas": _sql_total(fecha_desde="2024-01-01", fecha_hasta=hoy),
+        "export por fechas": _sql_export(fecha_desde="2024-01-01", fecha_hasta=hoy),
+        "export por cliente": _sql_export(cliente="nunez"),
+        "historial de cliente": (_SQL_HISTORIAL_CLIENTE.format(esquema=""), ("51987654321", 20)),
+        "sugerir clientes por nombre": (_SQL_SUGERIR_CLIENTES.format(columna="nombre_busqueda"), ("ma", "mb", 8)),
+        "sugerir clientes por teléfono": (_SQL_SUGERIR_CLIENTES.format(columna="telefono"), ("5198", "5199", 8)),
+        "conteo de entregas": (_SQL_CONTEO_ENTREGAS, {"hoy": hoy}),
+        **{f"entregas {tramo}": _sql_entregas(tramo) for tramo in TRAMOS_ENTREGA},
+        "reporte ventas": (_SQL_REPORTE_VENTAS, ("2024-01-01", hoy)),
+        "reporte items": _sql_reporte_items("2024-01-01", hoy),
+    }
+    # Con búsqueda por cliente el FTS devuelve solo las coincidencias: ordenarlas en memoria es barato.
+    # Lo mismo con los clientes de un prefijo (autocompletado) y las boletas pendientes (índice parcial),
+    # y con las ventanas del reporte, que ordenan las pocas filas del resumen ya agrupadas.
+    orden_en_memoria_ok = {"listado por cliente", "export por cliente", "sugerir clientes por nombre",
+                           "sugerir clientes por teléfono", *(f"entregas {tramo}" for tramo in TRAMOS_ENTREGA),
+                           "reporte ventas"}
+    problemas = []
+    conn = _conn()
+    for nombre, (q, params) in casos.items():
+        plan = _plan(conn, q, params)
+        for paso in plan:
+            # 'SCAN tabla' a secas = recorrido completo (con índice aparece 'USING ...')
+            if re.fullmatch(r"SCAN \w+", paso) or (
+                "TEMP B-TREE FOR ORDER BY" in paso and nombre not in orden_en_memoria_ok
+            ):
+                problemas.append(f"{nombre}: {paso}  <- {q}")
+    return problemas
 
 # ====== API DE CONFIGURACIÓN ======
+# Caché en memoria de toda la tabla config: (version, {key: value}).
+# Se revalida con PRAGMA data_version, que solo cambia cuando otra conexión (otro hilo
+# u otro worker de gunicorn) confirmó algo; solo entonces se lee config_version y,
+# si subió, se recarga la tabla. Sin cambios, leer la config no consulta ninguna tabla.
+_config_cache = (None, {})
+
+def _cargar_config(conn):
+    global _config_cache
+    with conn:
+        version = conn.execute("SELECT version FROM config_version WHERE id = 1").fetchone()[0]
+        valores = {k: v for k, v in conn.execute("SELECT key, value FROM config")}
+    _config_cache = (version, valores)
+    return valores
+
+def _config_vigente() -> dict:
+    conn = _conn()
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    version, valores = _config_cache
+    if version is not None and getattr(_local, "data_version", None) == data_version:
+        return valores
+    _local.data_version = data_version
+    actual = conn.execute("SELECT version FROM config_version WHERE id = 1").fetchone()[0]
+    if actual == version:
+        return valores
+    return _cargar_config(conn)
+
+def precargar_config():
+    """Carga la caché de configuración (al arrancar cada worker)."""
+    _cargar_config(_conn())
+
 def get_config(key: str, default: str = None) -> str:
-    """Obtiene un valor de la tabla de configuración."""
-    with _conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT value FROM config WHERE key = ?", (key,))
-        res = cur.fetchone()
-        return res[0] if res else default
+    """Obtiene un valor de la tabla de configuración (desde la caché en memoria)."""
+    return _config_vigente().get(key, default)
 
 def set_config(key: str, value: str):
     """Establece un valor en la tabla de configuración."""
@@ -215,17 +1075,61 @@ def set_config(key: str, value: str):
         cur = conn.cursor()
         cur.execute("REPLACE INTO config (key, value) VALUES (?, ?)", (key, value))
         conn.commit()
+    _cargar_config(_conn())
 
-def eliminar_boleta(boleta_id: int):
-    """Elimina una boleta y sus items asociados."""
-    with _conn() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM boleta WHERE id = ?", (boleta_id,))
-        conn.commit()
+def _eliminar_boleta(conn, boleta_id):
+    return conn.execute("DELETE FROM boleta WHERE id = ?", (boleta_id,)).rowcount
+
+def eliminar_boleta(boleta_id: int) -> int:
+    """
+    Elimina una boleta y sus items asociados.
+    Return: filas borradas; 0 si no está en la BD principal (no existe o está archivada).
+    """
+    borradas = _escritor.ejecutar(_eliminar_boleta, boleta_id)
+    if borradas:
+        _olvidar_conteos()
+    return borradas
+
+def _actualizar_estado(conn, boleta_id, nuevo_estado):
+    return conn.execute("UPDATE boleta SET estado = ? WHERE id = ?", (nuevo_estado, boleta_id)).rowcount
 
 def actualizar_estado_boleta(boleta_id: int, nuevo_estado: str):
     """Actualiza el estado de una boleta específica."""
-    with _conn() as conn:
-        cur = conn.cursor()
-        cur.execute("UPDATE boleta SET estado = ? WHERE id = ?", (nuevo_estado, boleta_id))
-        conn.commit()
+    _escritor.ejecutar(_actualizar_estado, boleta_id, nuevo_estado)
+
+def _alternar_estado(conn, boleta_id):
+    fila = conn.execute(
+        "UPDATE boleta SET estado = CASE estado WHEN 'entregado' THEN 'registrado' ELSE 'entregado' END "
+        "WHERE id = ? RETURNING estado", (boleta_id,)).fetchone()
+    return fila[0] if fila else None
+
+def alternar_estado_boleta(boleta_id: int) -> str | None:
+    """
+    Pasa una boleta de 'entregado' a 'registrado' y viceversa en una sola sentencia
+    (sin leerla antes). Return: el estado nuevo, o None si la boleta no está en la BD
+    principal (no existe o está archivada).
+    """
+    return _escritor.ejecutar(_alternar_estado, boleta_id)
+
+# Límite de variables por sentencia en SQLite antiguos
+_IDS_POR_SENTENCIA = 500
+
+def _estado_lote(conn, ids, estado):
+    cambiadas = []
+    for i in range(0, len(ids), _IDS_POR_SENTENCIA):
+        parte = ids[i:i + _IDS_POR_SENTENCIA]
+        cambiadas += [fila[0] for fila in conn.execute(
+            f"UPDATE boleta SET estado = ? WHERE id IN ({','.join('?' * len(parte))}) AND estado IS NOT ? "
+            "RETURNING id", (estado, *parte, estado))]
+    return cambiadas
+
+def actualizar_estado_lote(ids, estado: str) -> list[int]:
+    """
+    Pone 'estado' a muchas boletas en una sola transacción. Las que ya lo tenían no se
+    tocan (no cambia su versión). El resumen diario se mantiene por triggers.
+    Return: ids que cambiaron.
+    """
+    ids = sorted({int(i) for i in ids})
+    if not ids:
+        return []
+    return _escritor.ejecutar(_estado_lote, ids, estado)
@@ -0,0 +1,191 @@
+"""
+Escritor único por proceso con commits agrupados (group commit).
+
+database.py encola sus escrituras de mostrador (insertar_boleta_compuesta,
+actualizar_estado_boleta, eliminar_boleta). Un hilo por proceso las ejecuta con
+su propia conexión y confirma en un solo COMMIT todas las que llegaron mientras
+se hacía el anterior. Cada trabajo corre en su SAVEPOINT: si falla, solo él se
+deshace y el error le llega a quien lo pidió.
+
+Entre workers de gunicorn sigue habiendo un lock por BD: si BEGIN IMMEDIATE o
+COMMIT responden SQLITE_BUSY pese a busy_timeout, el grupo entero se reintenta
+con espera creciente.
+
+Si la conexión del escritor no se puede abrir, falla ese grupo y el siguiente lo
+vuelve a intentar. Si el hilo muere, quien espera recibe un error en vez de
+quedarse colgado, y la próxima escritura arranca otro hilo.
+"""
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import metricas
+
+log = logging.getLogger("lavanderia.escritura")
+
+# LAVA_ESCRITURA_COLA=0: cada escritura en su propia transacción, en el hilo que la pide
+ESCRITURA_COLA = os.getenv("LAVA_ESCRITURA_COLA", "1") != "0"
+GRUPO_MAX = int(os.getenv("LAVA_ESCRITURA_GRUPO", "64"))
+REINTENTOS = 8
+
+GRUPOS = metricas.Histograma(
+    "lava_escritura_grupo", "Escrituras confirmadas por COMMIT.", "modo", (1, 2, 4, 8, 16, 32, 64, 128))
+REINTENTOS_BUSY = metricas.Contador(
+    "lava_escritura_reintentos_total", "Transacciones reintentadas por SQLITE_BUSY.", "modo")
+metricas.REGISTRO.extend([GRUPOS, REINTENTOS_BUSY])
+
+
+def ocupada(e) -> bool:
+    """¿La BD estaba bloqueada por otra conexión (SQLITE_BUSY / SQLITE_LOCKED)?"""
+    if not isinstance(e, sqlite3.OperationalError):
+        return False
+    codigo = getattr(e, "sqlite_errorcode", None)
+    return codigo in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) or "locked" in str(e)
+
+
+def _esperar(intento):
+    time.sleep(min(0.5, 0.01 * 2 ** intento) * (0.5 + random.random()))
+
+
+class Escritor:
+    """
+    abrir(): conexión nueva para el hilo escritor.
+    conexion(): conexión del hilo que pide, para el modo sin cola.
+    """
+
+    def __init__(self, abrir, conexion, en_cola=ESCRITURA_COLA, grupo_max=GRUPO_MAX):
+        self._abrir, self._conexion = abrir, conexion
+        self.en_cola, self.grupo_max = en_cola, grupo_max
+        self._cola, self._hilo, self._pid = None, None, None
+        self._lock = threading.Lock()
+
+    def ejecutar(self, fn, *args):
+        """Ejecuta fn(conn, *args) en una transacción de escritura; devuelve su resultado ya confirmado."""
+        if not self.en_cola:
+            return self._directo(fn, args)
+        futuro = Future()
+        cola, hilo = self._cola_del_proceso()
+        cola.put((fn, args, futuro))
+        # Mientras el hilo viva se espera lo que haga falta (BUSY se reintenta allá); si murió,
+        # nadie va a resolver el futuro y se avisa en vez de quedarse colgado
+        while True:
+            try:
+                return futuro.result(timeout=1)
+            except TimeoutError:
+                if not hilo.is_alive() and not futuro.done():
+                    raise RuntimeError("El hilo escritor se detuvo: la escritura no se hizo.") from None
+
+    def _vivo(self):
+        return self._pid == os.getpid() and self._hilo.is_alive()
+
+    def _cola_del_proceso(self):
+        # Tras un fork (gunicorn) el hilo escritor no existe en el hijo, o pudo morir: se arranca otro
+        if not self._vivo():
+            with self._lock:
+                if not self._vivo():
+                    if self._pid == os.getpid():
+                        log.error("El hilo escritor se detuvo; se arranca otro")
+                    self._cola = queue.SimpleQueue()
+                    self._hilo = threading.Thread(target=self._bucle, args=(self._cola,),
+                                                  name="lava-escritor", daemon=True)
+                    self._hilo.start()
+                    self._pid = os.getpid()
+        return self._cola, self._hilo
+
+    def _conectar(self):
+        """Conexión del hilo escritor; si no se puede abrir se reintenta con espera creciente."""
+        for intento in range(REINTENTOS):
+            try:
+                conn = self._abrir()
+                conn.isolation_level = None  # transacciones explícitas
+                return conn
+            except sqlite3.Error:
+                if intento == REINTENTOS - 1:
+                    raise
+                log.warning("No se pudo abrir la BD para escribir (intento %d)", intento + 1)
+                _esperar(intento)
+
+    def _bucle(self, cola):
+        conn = None
+        try:
+            while True:
+                grupo = [cola.get()]
+                while len(grupo) < self.grupo_max:
+                    try:
+                        grupo.append(cola.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    if conn is None:  # abrirla aquí: si falla, falla el grupo y no el hilo
+                        conn = self._conectar()
+                    self._confirmar(conn, grupo)
+                except Exception as e:  # nunca debe morir el hilo escritor
+                    log.exception("Error en el escritor")
+                    if conn is not None and isinstance(e, sqlite3.Error):
+                        conn.close()  # ni el ROLLBACK funcionó: el próximo grupo abre otra
+                        conn = None
+                    for _, _, futuro in grupo:
+                        if not futuro.done():
+                            futuro.set_exception(e)
+        finally:
+            # Si algo peor que un Exception mata el hilo, cerrar suelta el lock de escritura
+            # (ejecutar() lo nota y arranca otro)
+            if conn is not None:
+                conn.close()
+
+    def _confirmar(self, conn, grupo):
+        for intento in range(REINTENTOS):
+            resultados = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for fn, args, _ in grupo:
+                    conn.execute("SAVEPOINT trabajo")
+                    try:
+                        resultados.append((True, fn(conn, *args)))
+                    except Exception as e:
+                        if ocupada(e):
+                            raise  # se rehace el grupo entero
+                        conn.execute("ROLLBACK TO trabajo")
+                        resultados.append((False, e))
+                    conn.execute("RELEASE trabajo")
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if ocupada(e) and intento < REINTENTOS - 1:
+                    REINTENTOS_BUSY.sumar("cola")
+                    _esperar(intento)
+                    continue
+                for _, _, futuro in grupo:
+                    futuro.set_exception(e)
+                return
+            GRUPOS.observar("cola", len(grupo))
+            for (ok, valor), (_, _, futuro) in zip(resultados, grupo):
+                if ok:
+                    futuro.set_result(valor)
+                else:
+                    futuro.set_exception(valor)
+            return
+
+    def _directo(self, fn, args):
+        conn = self._conexion()
+        for intento in range(REINTENTOS):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                valor = fn(conn, *args)
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if ocupada(e) and intento < REINTENTOS - 1:
+                    REINTENTOS_BUSY.sumar("directo")
+                    _esperar(intento)
+                    continue
+                raise
+            GRUPOS.observar("directo", 1)
+            return valor
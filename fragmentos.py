@@ -0,0 +1,65 @@
+"""
+Caché LRU (por worker) de fragmentos HTML ya renderizados.
+
+La clave incluye la versión de la boleta (boleta.version): un cambio hecho en otro
+worker produce otra clave, así que nunca se sirve un fragmento viejo. invalidar()
+solo libera memoria antes de tiempo.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import metricas
+
+FRAGMENTOS_MAX = int(os.getenv("LAVA_FRAGMENTOS_MAX", "256"))
+
+FRAGMENTOS = metricas.Contador(
+    "lava_cache_fragmentos_total", "Búsquedas en la caché de fragmentos renderizados.", "resultado")
+metricas.REGISTRO.append(FRAGMENTOS)
+
+
+class CacheLRU:
+    """Diccionario acotado: al llenarse descarta lo usado hace más tiempo."""
+
+    def __init__(self, maximo=FRAGMENTOS_MAX):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, generar):
+        """Valor guardado para 'clave', o generar() (que se guarda) si no está."""
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+                FRAGMENTOS.sumar("acierto")
+                return valor
+        FRAGMENTOS.sumar("fallo")
+        valor = generar()  # fuera del lock: renderizar no bloquea a otros hilos
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+        return valor
+
+    def invalidar(self, boleta_id):
+        """Descarta todas las versiones de una boleta."""
+        with self._lock:
+            for clave in [c for c in self._datos if c[1] == boleta_id]:
+                del self._datos[clave]
+
+    def __len__(self):
+        return len(self._datos)
+
+
+# Claves: (tipo de fragmento, boleta_id, versión)
+CACHE = CacheLRU()
+
+
+def boleta(tipo, boleta_id, version, generar):
+    return CACHE.obtener((tipo, boleta_id, version), generar)
+
+
+def invalidar(boleta_id):
+    CACHE.invalidar(boleta_id)
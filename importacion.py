@@ -0,0 +1,144 @@
+import csv
+from datetime import datetime
+from itertools import groupby
+
+import database
+
+# Columnas que produce /export.csv (Numero_Boleta es opcional)
+COLUMNAS_REQUERIDAS = (
+    "Boleta_ID", "Fecha_Emision", "Cliente", "Telefono", "Direccion",
+    "Metodo_Pago_Boleta", "Estado_Boleta", "Total_Boleta", "A_Cuenta_Boleta", "Saldo_Boleta", "Notas_Boleta",
+    "Item_ID", "Item_Descripcion", "Item_Tipo", "Item_Cantidad_Unidades", "Item_Cantidad_Kilos",
+    "Item_Servicio", "Item_Precio_Unitario", "Item_Importe",
+)
+TAMANO_LOTE = 500  # boletas por transacción
+
+
+class ErrorImportacion(ValueError):
+    """Archivo que no tiene el formato de /export.csv."""
+
+
+def _texto(valor):
+    """Quita el apóstrofo que export_csv antepone a celdas que empiezan con = + - @."""
+    valor = (valor or "").strip()
+    if len(valor) > 1 and valor[0] == "'" and valor[1] in "=+-@":
+        return valor[1:]
+    return valor
+
+def _numero(valor, campo):
+    try:
+        return float(_texto(valor).replace(",", ".") or 0)
+    except ValueError:
+        raise ValueError(f"{campo} no es un número: {valor!r}")
+
+def _fecha(valor):
+    """Fecha_Emision -> 'YYYY-MM-DD HH:MM:SS'. Lanza ValueError si no es válida."""
+    fecha_txt = _texto(valor)
+    try:
+        return datetime.fromisoformat(fecha_txt).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise ValueError(f"Fecha_Emision inválida: {fecha_txt!r}")
+
+def _clave_boleta(fila, fecha):
+    """Clave de idempotencia: Numero_Boleta, o sin él 'id:<Boleta_ID>@<fecha>'."""
+    # El id de otra instalación solo es único junto con su fecha
+    boleta_id = _texto(fila.get("Boleta_ID"))
+    return _texto(fila.get("Numero_Boleta")) or (boleta_id and f"id:{boleta_id}@{fecha}")
+
+def _fila_a_boleta(fila):
+    """Convierte una fila del CSV en (cabecera, item). Lanza ValueError si no es válida."""
+    # Filas cortas: dict(zip(...)) no trae las últimas columnas
+    faltan = [c for c in COLUMNAS_REQUERIDAS if fila.get(c) is None]
+    if faltan:
+        raise ValueError(f"Fila incompleta: faltan {len(faltan)} columnas desde {faltan[0]}")
+    cliente = _texto(fila["Cliente"])
+    if not cliente:
+        raise ValueError("Cliente vacío")
+    fecha = _fecha(fila["Fecha_Emision"])
+    boleta_id = _texto(fila["Boleta_ID"])
+    numero = _clave_boleta(fila, fecha)
+    if not numero:
+        raise ValueError("Falta Boleta_ID / Numero_Boleta")
+    cabecera = dict(
+        id=int(boleta_id) if boleta_id.isdigit() and not _texto(fila.get("Numero_Boleta")) else None,
+        numero=numero, cliente=cliente, direccion=_texto(fila["Direccion"]),
+        telefono=_texto(fila["Telefono"]), fecha=fecha, entrega_fecha=None, entrega_hora=None,
+        metodo_pago=_texto(fila["Metodo_Pago_Boleta"]) or "efectivo",
+        estado=_texto(fila["Estado_Boleta"]) or "registrado",
+        a_cuenta=_numero(fila["A_Cuenta_Boleta"], "A_Cuenta_Boleta"),
+        saldo=_numero(fila["Saldo_Boleta"], "Saldo_Boleta"),
+        total=_numero(fila["Total_Boleta"], "Total_Boleta"),
+        notas=_texto(fila["Notas_Boleta"]),
+    )
+    item = dict(
+        descripcion=_texto(fila["Item_Descripcion"]), tipo=_texto(fila["Item_Tipo"]) or "otro",
+        prendas=int(_numero(fila["Item_Cantidad_Unidades"], "Item_Cantidad_Unidades")),
+        kilos=_numero(fila["Item_Cantidad_Kilos"], "Item_Cantidad_Kilos"),
+        lavado=_texto(fila["Item_Servicio"]) or "normal", secado=None,
+        p_unit=_numero(fila["Item_Precio_Unitario"], "Item_Precio_Unitario"),
+        importe=_numero(fila["Item_Importe"], "Item_Importe"),
+    )
+    return cabecera, item
+
+def leer_boletas(archivo, errores):
+    """
+    Lee el CSV en streaming y va entregando (cabecera, items) por boleta.
+    Las filas consecutivas con el mismo Boleta_ID/Numero_Boleta forman una boleta;
+    si alguna fila es inválida se descarta la boleta completa y se anota en 'errores'
+    como (linea, mensaje).
+    """
+    lector = csv.reader(archivo, delimiter=";")
+    encabezado = [c.strip().lstrip("\ufeff") for c in next(lector, [])]
+    faltan = [c for c in COLUMNAS_REQUERIDAS if c not in encabezado]
+    if faltan:
+        raise ErrorImportacion(f"Faltan columnas: {', '.join(faltan)}")
+
+    def filas():
+        for valores in lector:
+            if not any(v.strip() for v in valores):
+                continue
+            fila = dict(zip(encabezado, valores))
+            yield lector.line_num, fila
+
+    def clave(par):
+        # La misma clave que _fila_a_boleta: mismo id con otra fecha es otra boleta
+        _, fila = par
+        try:
+            fecha = _fecha(fila.get("Fecha_Emision"))
+        except ValueError:
+            fecha = _texto(fila.get("Fecha_Emision"))
+        return _clave_boleta(fila, fecha)
+
+    for _, grupo in groupby(filas(), key=clave):
+        cabecera, items, valida = None, [], True
+        for linea, fila in grupo:
+            try:
+                cab, item = _fila_a_boleta(fila)
+            except ValueError as e:
+                errores.append((linea, str(e)))
+                valida = False
+                continue
+            cabecera = cabecera or cab
+            items.append(item)
+        if valida and cabecera:
+            yield cabecera, items
+
+def importar_csv(archivo, tamano_lote=TAMANO_LOTE) -> dict:
+    """
+    Importa un CSV con el formato de /export.csv, en transacciones de 'tamano_lote' boletas.
+    Es idempotente: las boletas ya cargadas (mismo numero) se omiten.
+    Return: dict con insertadas, omitidas y errores [(linea, mensaje)].
+    """
+    resumen = {"insertadas": 0, "omitidas": 0, "errores": []}
+    lote = []
+    for boleta in leer_boletas(archivo, resumen["errores"]):
+        lote.append(boleta)
+        if len(lote) >= tamano_lote:
+            insertadas, omitidas = database.insertar_boletas_lote(lote)
+            resumen["insertadas"] += insertadas
+            resumen["omitidas"] += len(omitidas)
+            lote = []
+    insertadas, omitidas = database.insertar_boletas_lote(lote)
+    resumen["insertadas"] += insertadas
+    resumen["omitidas"] += len(omitidas)
+    return resumen
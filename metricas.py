@@ -0,0 +1,203 @@
+"""
+Métricas en memoria (por worker) con salida en formato de texto de Prometheus.
+
+- Latencia por endpoint, consultas SQL y tiempo en SQLite por petición (hooks de Flask).
+- Tiempo por función de database.py y registro de consultas lentas.
+Todo es aritmética sobre contadores ya asignados: se puede dejar activo en producción.
+"""
+import functools
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+
+log = logging.getLogger("lavanderia.metricas")
+
+# Umbral para registrar una llamada a database.py como lenta
+SQL_LENTO_MS = float(os.getenv("LAVA_SQL_LENTO_MS", "200"))
+
+# Funciones de database.py que no tocan la BD (no se miden)
+NO_INSTRUMENTAR = {"normalizar_texto", "normalizar_telefono"}
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class Histograma:
+    """Histograma acumulativo con etiquetas, al estilo Prometheus."""
+
+    def __init__(self, nombre, ayuda, etiqueta, buckets=BUCKETS_SEGUNDOS):
+        self.nombre, self.ayuda, self.etiqueta, self.buckets = nombre, ayuda, etiqueta, buckets
+        self._series = {}  # valor de etiqueta -> [conteos por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor_etiqueta, valor):
+        with self._lock:
+            serie = self._series.get(valor_etiqueta)
+            if serie is None:
+                serie = self._series[valor_etiqueta] = [0] * (len(self.buckets) + 2)
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def texto(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for valor_etiqueta, serie in sorted(series.items()):
+            etiqueta = f'{self.etiqueta}="{_escapar(valor_etiqueta)}"'
+            acumulado = 0
+            for limite, n in zip(self.buckets, serie):
+                acumulado += n
+                lineas.append(f'{self.nombre}_bucket{{{etiqueta},le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{etiqueta},le="+Inf"}} {serie[-1]}')
+            lineas.append(f"{self.nombre}_sum{{{etiqueta}}} {serie[-2]:.6f}")
+            lineas.append(f"{self.nombre}_count{{{etiqueta}}} {serie[-1]}")
+        return lineas
+
+
+class Contador:
+    """Contador con etiquetas."""
+
+    def __init__(self, nombre, ayuda, etiqueta):
+        self.nombre, self.ayuda, self.etiqueta = nombre, ayuda, etiqueta
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, valor_etiqueta, n=1):
+        with self._lock:
+            self._valores[valor_etiqueta] = self._valores.get(valor_etiqueta, 0) + n
+
+    def valor(self, valor_etiqueta):
+        return self._valores.get(valor_etiqueta, 0)
+
+    def texto(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            valores = dict(self._valores)
+        for valor_etiqueta, n in sorted(valores.items()):
+            lineas.append(f'{self.nombre}{{{self.etiqueta}="{_escapar(valor_etiqueta)}"}} {n}')
+        return lineas
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+PETICION_SEGUNDOS = Histograma(
+    "lava_http_peticion_segundos", "Latencia de cada petición HTTP por endpoint.", "endpoint")
+PETICION_CONSULTAS = Histograma(
+    "lava_http_consultas_por_peticion", "Sentencias SQL ejecutadas por petición.", "endpoint",
+    BUCKETS_CONSULTAS)
+PETICION_SQL_SEGUNDOS = Histograma(
+    "lava_http_sql_segundos", "Tiempo en database.py por petición.", "endpoint")
+PETICIONES = Contador("lava_http_peticiones_total", "Peticiones HTTP por código de estado.", "estado")
+DB_SEGUNDOS = Histograma("lava_db_llamada_segundos", "Duración de cada llamada a database.py.", "funcion")
+DB_LENTAS = Contador("lava_db_lentas_total", "Llamadas a database.py por encima de LAVA_SQL_LENTO_MS.", "funcion")
+
+# Otros módulos pueden registrar sus propias métricas (p. ej. cachés)
+REGISTRO = [PETICION_SEGUNDOS, PETICION_CONSULTAS, PETICION_SQL_SEGUNDOS, PETICIONES, DB_SEGUNDOS, DB_LENTAS]
+
+_local = threading.local()
+
+
+# --- Petición en curso ---
+def iniciar_peticion():
+    _local.inicio = time.perf_counter()
+    _local.consultas = 0
+    _local.sql = 0.0
+
+
+def terminar_peticion(endpoint, estado):
+    inicio = getattr(_local, "inicio", None)
+    if inicio is None:
+        return
+    endpoint = endpoint or "desconocido"
+    PETICION_SEGUNDOS.observar(endpoint, time.perf_counter() - inicio)
+    PETICION_CONSULTAS.observar(endpoint, _local.consultas)
+    PETICION_SQL_SEGUNDOS.observar(endpoint, _local.sql)
+    PETICIONES.sumar(str(estado))
+    _local.inicio = None
+
+
+# --- Trazas de database.py ---
+def _traza_sql(sentencia):
+    """trace callback de sqlite3: cuenta sentencias y guarda la última (sin las de triggers)."""
+    if sentencia.startswith("--"):
+        return
+    _local.consultas = getattr(_local, "consultas", 0) + 1
+    _local.ultima_sql = sentencia
+
+
+def _sin_literales(sql):
+    """sqlite3 entrega la sentencia con los valores ya insertados: se ocultan antes de loguear."""
+    sql = re.sub(r"'(?:[^']|'')*'", "'?'", sql)
+    return re.sub(r"\b\d+(?:\.\d+)?\b", "?", " ".join(sql.split()))
+
+
+def _forma(valor):
+    """Forma de un parámetro para el log (tipo y tamaño, nunca el contenido)."""
+    if isinstance(valor, dict):
+        return "dict(" + ",".join(sorted(valor)) + ")"
+    if isinstance(valor, (list, tuple)):
+        return f"{type(valor).__name__}[{len(valor)}]"
+    if isinstance(valor, str):
+        return f"str[{len(valor)}]"
+    return type(valor).__name__
+
+
+def _envolver(nombre, fn):
+    @functools.wraps(fn)
+    def envoltura(*args, **kwargs):
+        profundidad = getattr(_local, "profundidad", 0)
+        _local.profundidad = profundidad + 1
+        inicio = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _local.profundidad = profundidad
+            DB_SEGUNDOS.observar(nombre, duracion)
+            if profundidad == 0:  # llamadas anidadas ya cuentan dentro de la externa
+                _local.sql = getattr(_local, "sql", 0.0) + duracion
+            if duracion * 1000 >= SQL_LENTO_MS:
+                DB_LENTAS.sumar(nombre)
+                log.warning(
+                    "SQL lenta: %s %.1f ms | params=%s | última sentencia: %s", nombre, duracion * 1000,
+                    [_forma(a) for a in args] + [f"{k}={_forma(v)}" for k, v in kwargs.items() if v is not None],
+                    _sin_literales(getattr(_local, "ultima_sql", ""))[:500],
+                )
+    return envoltura
+
+
+def instrumentar_database(database):
+    """
+    Envuelve las funciones públicas de database.py (medición de tiempo) y hace que toda
+    conexión nueva cuente sus sentencias con set_trace_callback.
+    """
+    abrir = database._abrir
+
+    @functools.wraps(abrir)
+    def abrir_con_traza(*args):
+        conn = abrir(*args)
+        conn.set_trace_callback(_traza_sql)
+        return conn
+
+    database._abrir = abrir_con_traza
+    for nombre, fn in list(vars(database).items()):
+        if (nombre.startswith("_") or nombre in NO_INSTRUMENTAR or not inspect.isfunction(fn) or fn.__module__ != database.__name__
+                or inspect.isgeneratorfunction(fn)):
+            continue  # los generadores (export) se cuentan por sentencias, no por duración
+        setattr(database, nombre, _envolver(nombre, fn))
+
+
+def texto_prometheus():
+    lineas = []
+    for metrica in REGISTRO:
+        lineas.extend(metrica.texto())
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,603 @@
+"""
+Migraciones de esquema versionadas con PRAGMA user_version.
+
+Se aplican una vez por deploy (build.sh):   python migraciones.py
+Al arrancar, cada worker solo lee user_version (asegurar()); si la BD quedó
+atrás (p. ej. en desarrollo, sin build.sh) aplica lo que falte.
+
+Para cambiar el esquema se agrega una migración al final de MIGRACIONES: nunca
+se edita una que ya se aplicó. Cada paso es una sentencia SQL o una función(conn);
+todos los pasos de una migración corren en la misma transacción (BEGIN IMMEDIATE).
+"""
+import logging
+import time
+
+import database
+
+log = logging.getLogger("lavanderia.migraciones")
+
+# Cuerpos de los triggers que mantienen boleta_resumen_diario al día
+_SQL_RESUMEN_SUMAR = """
+    INSERT INTO boleta_resumen_diario (dia, metodo_pago, estado, cantidad, total, a_cuenta, saldo)
+    VALUES (substr(new.fecha, 1, 10), IFNULL(new.metodo_pago, ''), IFNULL(new.estado, ''), 1,
+            IFNULL(new.total, 0), IFNULL(new.a_cuenta, 0), IFNULL(new.saldo, 0))
+    ON CONFLICT (dia, metodo_pago, estado) DO UPDATE SET
+        cantidad = cantidad + 1, total = total + excluded.total,
+        a_cuenta = a_cuenta + excluded.a_cuenta, saldo = saldo + excluded.saldo;
+"""
+_SQL_RESUMEN_RESTAR = """
+    UPDATE boleta_resumen_diario SET
+        cantidad = cantidad - 1, total = total - IFNULL(old.total, 0),
+        a_cuenta = a_cuenta - IFNULL(old.a_cuenta, 0), saldo = saldo - IFNULL(old.saldo, 0)
+    WHERE dia = substr(old.fecha, 1, 10) AND metodo_pago = IFNULL(old.metodo_pago, '')
+      AND estado = IFNULL(old.estado, '');
+    DELETE FROM boleta_resumen_diario
+    WHERE dia = substr(old.fecha, 1, 10) AND metodo_pago = IFNULL(old.metodo_pago, '')
+      AND estado = IFNULL(old.estado, '') AND cantidad <= 0;
+"""
+
+# Borra los reportes guardados (reporte_cache) cuyo período incluye el día {dia}
+_SQL_REPORTE_INVALIDAR = "DELETE FROM reporte_cache WHERE desde <= {dia} AND hasta >= {dia};"
+_DIA_ITEM = "(SELECT substr(fecha, 1, 10) FROM boleta WHERE id = {fila}.boleta_id)"
+
+# ===== Pasos de migración con datos =====
+# Copias del backfill tal como era al agregarse cada migración: las funciones de
+# database.py siguen cambiando y una BD vieja debe migrar siempre igual.
+_SQL_INDICE_CLIENTE_V9 = ("CREATE INDEX IF NOT EXISTS idx_boleta_cliente_tel ON boleta(cliente_telefono, fecha) "
+                          "WHERE cliente_telefono IS NOT NULL")
+_SQL_TELEFONO_V9 = ("UPDATE boleta SET cliente_telefono = lava_telefono(telefono) "
+                    "WHERE cliente_telefono IS NOT lava_telefono(telefono)")
+_SQL_CLIENTES_V9 = """
+    SELECT cliente_telefono, cliente, direccion, boletas, primera, fecha FROM (
+        SELECT cliente_telefono, cliente, fecha,
+               FIRST_VALUE(NULLIF(direccion, '')) OVER (
+                   PARTITION BY cliente_telefono ORDER BY NULLIF(direccion, '') IS NULL, fecha DESC
+               ) AS direccion,
+               COUNT(1) OVER (PARTITION BY cliente_telefono) AS boletas,
+               MIN(fecha) OVER (PARTITION BY cliente_telefono) AS primera,
+               ROW_NUMBER() OVER (PARTITION BY cliente_telefono ORDER BY fecha DESC, id DESC) AS orden
+        FROM boleta WHERE cliente_telefono IS NOT NULL
+    ) WHERE orden = 1
+"""
+
+
+def _m6_retirar_legado(conn):
+    """Migración 6: sin filas en la tabla original 'boletas', se elimina."""
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'boletas'").fetchone()
+    if existe and conn.execute("SELECT 1 FROM boletas LIMIT 1").fetchone() is None:
+        conn.execute("DROP INDEX IF EXISTS idx_boletas_fecha")
+        conn.execute("DROP INDEX IF EXISTS idx_boletas_cliente")
+        conn.execute("DROP TABLE IF EXISTS boletas")
+
+
+def _m9_clientes_de_archivo(ruta):
+    """Migración 9: lee los clientes de un archivo (migración 8), agregándole cliente_telefono."""
+    arch = database._abrir(ruta)
+    try:
+        if "cliente_telefono" not in {f[1] for f in arch.execute("PRAGMA table_info(boleta)")}:
+            arch.execute("ALTER TABLE boleta ADD COLUMN cliente_telefono TEXT")
+        arch.execute(_SQL_TELEFONO_V9)
+        arch.execute(_SQL_INDICE_CLIENTE_V9)
+        arch.commit()
+        return [tuple(f) for f in arch.execute(_SQL_CLIENTES_V9)]
+    finally:
+        arch.close()
+
+
+def _m9_clientes(conn):
+    """Migración 9: llena 'cliente' desde boleta y los archivos (un cliente por teléfono)."""
+    conn.execute(_SQL_TELEFONO_V9)
+    fuentes = [conn.execute(_SQL_CLIENTES_V9).fetchall()]
+    for nombre, _, _ in database.archivos():
+        fuentes.append(_m9_clientes_de_archivo(database.ruta_archivo(nombre)))
+    clientes = {}
+    for filas in fuentes:
+        for telefono, nombre, direccion, boletas, primera, ultima in filas:
+            c = clientes.get(telefono)
+            if c is None:
+                clientes[telefono] = [nombre, direccion, boletas, primera, ultima]
+                continue
+            reciente = ultima > c[4]
+            c[0] = nombre if reciente else c[0]
+            c[1] = (direccion or c[1]) if reciente else (c[1] or direccion)
+            c[2] += boletas
+            c[3], c[4] = min(primera, c[3]), max(ultima, c[4])
+    conn.execute("DELETE FROM cliente")
+    conn.executemany(
+        "INSERT INTO cliente (telefono, nombre, nombre_busqueda, direccion, boletas, primera, ultima) "
+        "VALUES (?1, ?2, lava_texto(?2), ?3, ?4, ?5, ?6)",
+        [(t, c[0] or "", *c[1:]) for t, c in clientes.items()])
+
+
+# Todo usa IF NOT EXISTS: las BDs creadas antes de las migraciones (user_version = 0)
+# ya tienen parte de estos objetos y pasan por aquí sin error.
+MIGRACIONES = [
+    (1, "Esquema base: boleta + boleta_items, config y tabla original 'boletas'", [
+        # ===== Esquema ORIGINAL (lo mantenemos para compatibilidad) =====
+        """
+        CREATE TABLE IF NOT EXISTS boletas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente TEXT NOT NULL,
+            tipo_item TEXT NOT NULL,
+            kilos REAL DEFAULT 0,
+            cantidad INTEGER DEFAULT 0,
+            servicio TEXT DEFAULT 'normal',
+            perfumado INTEGER DEFAULT 0,
+            precio REAL NOT NULL,
+            fecha TEXT NOT NULL,
+            metodo_pago TEXT DEFAULT 'efectivo',
+            estado TEXT DEFAULT 'registrado'
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_boletas_fecha ON boletas(fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_boletas_cliente ON boletas(cliente)",
+        # ===== NUEVO ESQUEMA (Cabecera + Items) =====
+        """
+        CREATE TABLE IF NOT EXISTS boleta (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero TEXT,                  -- opcional: correlativo impreso (N° 007601)
+            cliente TEXT NOT NULL,
+            direccion TEXT,
+            telefono TEXT,
+            fecha TEXT NOT NULL,          -- fecha de emisión
+            entrega_fecha TEXT,           -- fecha prometida
+            entrega_hora TEXT,            -- hora prometida (ej. '17:00')
+            metodo_pago TEXT DEFAULT 'efectivo',
+            estado TEXT DEFAULT 'registrado',
+            a_cuenta REAL DEFAULT 0,      -- pago parcial
+            saldo REAL DEFAULT 0,
+            total REAL DEFAULT 0,         -- total de la boleta (suma items)
+            notas TEXT                    -- observaciones (ej. 'Martes 5 pm')
+        )
+        """,
+        # Un índice sobre (fecha) en SQLite ya termina en el rowid (= id), así que sirve
+        # tal cual para ordenar y paginar por (fecha DESC, id DESC) sin un índice compuesto aparte.
+        "CREATE INDEX IF NOT EXISTS idx_boleta_fecha ON boleta(fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_boleta_cliente ON boleta(cliente)",
+        """
+        CREATE TABLE IF NOT EXISTS boleta_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            boleta_id INTEGER NOT NULL REFERENCES boleta(id) ON DELETE CASCADE,
+            descripcion TEXT,             -- 'Frazadas', 'Edredón', 'Kilos', etc.
+            tipo TEXT,                    -- kilos | edredon | terno | otro
+            prendas INTEGER DEFAULT 0,    -- nº de prendas (para terno/edredón)
+            kilos REAL DEFAULT 0,         -- para servicio por kilos
+            lavado TEXT,                  -- 'Normal', 'Seco', 'A mano'...
+            secado TEXT,                  -- 'Secadora', 'Tendedero'...
+            p_unit REAL DEFAULT 0,        -- precio unitario (por kilo o por prenda)
+            importe REAL DEFAULT 0        -- subtotal del item
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_bitems_boleta ON boleta_items(boleta_id)",
+        # ===== TABLA DE CONFIGURACIÓN =====
+        "CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)",
+        # Contraseñas por defecto si no existen
+        "INSERT OR IGNORE INTO config (key, value) VALUES ('USER_PASSWORD', 'Rios123')",
+        "INSERT OR IGNORE INTO config (key, value) VALUES ('ADMIN_PASSWORD', 'Cris123')",
+    ]),
+    (2, "Búsqueda de clientes (FTS5 trigram, sin tildes ni mayúsculas)", [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS boleta_busqueda USING fts5(texto, tokenize='trigram')",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_busqueda_ai AFTER INSERT ON boleta BEGIN
+            INSERT INTO boleta_busqueda (rowid, texto)
+            VALUES (new.id, lava_busqueda(new.cliente, new.telefono, new.notas));
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_busqueda_ad AFTER DELETE ON boleta BEGIN
+            DELETE FROM boleta_busqueda WHERE rowid = old.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_busqueda_au AFTER UPDATE OF cliente, telefono, notas ON boleta BEGIN
+            UPDATE boleta_busqueda SET texto = lava_busqueda(new.cliente, new.telefono, new.notas)
+            WHERE rowid = new.id;
+        END
+        """,
+        # Backfill: las boletas que ya existían
+        "DELETE FROM boleta_busqueda",
+        "INSERT INTO boleta_busqueda (rowid, texto) SELECT id, lava_busqueda(cliente, telefono, notas) FROM boleta",
+    ]),
+    (3, "Resumen diario por día, método de pago y estado", [
+        """
+        CREATE TABLE IF NOT EXISTS boleta_resumen_diario (
+            dia TEXT NOT NULL,            -- 'YYYY-MM-DD' (de boleta.fecha)
+            metodo_pago TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            a_cuenta REAL NOT NULL DEFAULT 0,
+            saldo REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, metodo_pago, estado)
+        ) WITHOUT ROWID
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_ai AFTER INSERT ON boleta BEGIN
+            {_SQL_RESUMEN_SUMAR}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_ad AFTER DELETE ON boleta BEGIN
+            {_SQL_RESUMEN_RESTAR}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_au
+        AFTER UPDATE OF fecha, metodo_pago, estado, total, a_cuenta, saldo ON boleta BEGIN
+            {_SQL_RESUMEN_RESTAR}
+            {_SQL_RESUMEN_SUMAR}
+        END
+        """,
+        # Backfill (todavía no había archivos: llegaron con la migración 8)
+        "DELETE FROM boleta_resumen_diario",
+        """
+        INSERT INTO boleta_resumen_diario (dia, metodo_pago, estado, cantidad, total, a_cuenta, saldo)
+        SELECT substr(fecha, 1, 10), IFNULL(metodo_pago, ''), IFNULL(estado, ''), COUNT(1),
+               IFNULL(SUM(total), 0), IFNULL(SUM(a_cuenta), 0), IFNULL(SUM(saldo), 0)
+        FROM boleta GROUP BY 1, 2, 3
+        """,
+    ]),
+    (4, "Contador de versión de config (caché entre workers)", [
+        """
+        CREATE TABLE IF NOT EXISTS config_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT OR IGNORE INTO config_version (id, version) VALUES (1, 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_config_ai AFTER INSERT ON config BEGIN
+            UPDATE config_version SET version = version + 1 WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_config_au AFTER UPDATE ON config BEGIN
+            UPDATE config_version SET version = version + 1 WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_config_ad AFTER DELETE ON config BEGIN
+            UPDATE config_version SET version = version + 1 WHERE id = 1;
+        END
+        """,
+    ]),
+    (5, "Índice único de boleta.numero (importación idempotente)", [
+        # 'numero' identifica boletas importadas (talonario / otra sucursal): no se repite
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_boleta_numero ON boleta(numero) WHERE numero IS NOT NULL",
+    ]),
+    (6, "Correspondencia boletas (original) -> boleta, para migrar la tabla original", [
+        # legado_id: id en 'boletas'. MAX(legado_id) es el punto de control de migrar_legado()
+        """
+        CREATE TABLE IF NOT EXISTS boleta_legado (
+            legado_id INTEGER PRIMARY KEY,
+            boleta_id INTEGER NOT NULL
+        )
+        """,
+        _m6_retirar_legado,
+    ]),
+    (7, "Versiones de boleta y contador de cambios (ETag de la API)", [
+        # boleta.version sube con cada UPDATE; boleta_cambios con cualquier alta, baja o cambio
+        "ALTER TABLE boleta ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+        """
+        CREATE TABLE IF NOT EXISTS boleta_cambios (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT OR IGNORE INTO boleta_cambios (id, version) VALUES (1, 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_ai AFTER INSERT ON boleta BEGIN
+            UPDATE boleta_cambios SET version = version + 1 WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_ad AFTER DELETE ON boleta BEGIN
+            UPDATE boleta_cambios SET version = version + 1 WHERE id = 1;
+        END
+        """,
+        # Sin recursive_triggers, el UPDATE de version no vuelve a disparar este trigger
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_au AFTER UPDATE ON boleta BEGIN
+            UPDATE boleta SET version = old.version + 1 WHERE id = new.id;
+            UPDATE boleta_cambios SET version = version + 1 WHERE id = 1;
+        END
+        """,
+    ]),
+    (8, "Boletas archivadas: en qué archivo quedó cada una (ver archivo.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS boleta_archivada (
+            id INTEGER PRIMARY KEY,       -- boleta.id (se conserva en el archivo)
+            archivo TEXT NOT NULL         -- 'boletas-2023' o 'boletas-2023-05'
+        )
+        """,
+    ]),
+    (9, "Clientes por teléfono normalizado (autocompletado e historial)", [
+        # cliente_telefono = lava_telefono(telefono): se fija al insertar (_SQL_INSERTAR_BOLETA)
+        "ALTER TABLE boleta ADD COLUMN cliente_telefono TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS cliente (
+            telefono TEXT PRIMARY KEY,    -- normalizado: '51' + dígitos
+            nombre TEXT NOT NULL,         -- el de su última boleta
+            nombre_busqueda TEXT NOT NULL, -- lava_texto(nombre): prefijo del autocompletado
+            direccion TEXT,               -- la última no vacía
+            boletas INTEGER NOT NULL DEFAULT 0,  -- también las archivadas
+            primera TEXT,                 -- fecha de su primera y última boleta
+            ultima TEXT
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_cliente_nombre ON cliente(nombre_busqueda)",
+        _SQL_INDICE_CLIENTE_V9,
+        # En el UPSERT las columnas sin 'excluded.' son los valores antes del cambio
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cliente_ai AFTER INSERT ON boleta
+        WHEN new.cliente_telefono IS NOT NULL BEGIN
+            INSERT INTO cliente (telefono, nombre, nombre_busqueda, direccion, boletas, primera, ultima)
+            VALUES (new.cliente_telefono, IFNULL(new.cliente, ''), lava_texto(new.cliente),
+                    NULLIF(new.direccion, ''), 1, new.fecha, new.fecha)
+            ON CONFLICT (telefono) DO UPDATE SET
+                nombre = CASE WHEN excluded.ultima >= ultima THEN excluded.nombre ELSE nombre END,
+                nombre_busqueda = CASE WHEN excluded.ultima >= ultima THEN excluded.nombre_busqueda
+                                       ELSE nombre_busqueda END,
+                direccion = CASE WHEN excluded.ultima >= ultima THEN IFNULL(excluded.direccion, direccion)
+                                 ELSE IFNULL(direccion, excluded.direccion) END,
+                boletas = boletas + 1,
+                primera = MIN(primera, excluded.primera),
+                ultima = MAX(ultima, excluded.ultima);
+        END
+        """,
+        # Archivar no es dar de baja: boleta_archivada se llena antes del DELETE (archivo.py)
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cliente_ad AFTER DELETE ON boleta
+        WHEN old.cliente_telefono IS NOT NULL
+             AND NOT EXISTS (SELECT 1 FROM boleta_archivada WHERE id = old.id) BEGIN
+            UPDATE cliente SET boletas = boletas - 1 WHERE telefono = old.cliente_telefono;
+            DELETE FROM cliente WHERE telefono = old.cliente_telefono AND boletas <= 0;
+        END
+        """,
+        _m9_clientes,
+    ]),
+    (10, "Cola de entregas: índice parcial de boletas sin entregar", [
+        # Solo las pendientes (pocas) entran al índice; con saldo y estado cubre el conteo por tramos
+        """
+        CREATE INDEX IF NOT EXISTS idx_boleta_pendiente ON boleta(entrega_fecha, entrega_hora, saldo, estado)
+        WHERE estado <> 'entregado'
+        """,
+    ]),
+    (11, "Claves de idempotencia de boletas creadas sin conexión", [
+        # clave: la genera el navegador al guardar la boleta (cola.js); un reenvío no la duplica
+        """
+        CREATE TABLE IF NOT EXISTS boleta_clave (
+            clave TEXT PRIMARY KEY,
+            boleta_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (12, "Reportes de períodos cerrados ya calculados (database.reporte_periodo)", [
+        """
+        CREATE TABLE IF NOT EXISTS reporte_cache (
+            desde TEXT NOT NULL,          -- 'YYYY-MM-DD'
+            hasta TEXT NOT NULL,
+            datos TEXT NOT NULL,          -- JSON del reporte
+            creado REAL NOT NULL,
+            PRIMARY KEY (desde, hasta)
+        ) WITHOUT ROWID
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reporte_ai AFTER INSERT ON boleta BEGIN
+            {_SQL_REPORTE_INVALIDAR.format(dia="substr(new.fecha, 1, 10)")}
+        END
+        """,
+        # Archivar no cambia el reporte (lo archivado se sigue leyendo)
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reporte_ad AFTER DELETE ON boleta
+        WHEN NOT EXISTS (SELECT 1 FROM boleta_archivada WHERE id = old.id) BEGIN
+            {_SQL_REPORTE_INVALIDAR.format(dia="substr(old.fecha, 1, 10)")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reporte_au
+        AFTER UPDATE OF fecha, metodo_pago, total, a_cuenta, saldo ON boleta BEGIN
+            {_SQL_REPORTE_INVALIDAR.format(dia="substr(old.fecha, 1, 10)")}
+            {_SQL_REPORTE_INVALIDAR.format(dia="substr(new.fecha, 1, 10)")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reporte_items_ai AFTER INSERT ON boleta_items BEGIN
+            {_SQL_REPORTE_INVALIDAR.format(dia=_DIA_ITEM.format(fila="new"))}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reporte_items_ad AFTER DELETE ON boleta_items BEGIN
+            {_SQL_REPORTE_INVALIDAR.format(dia=_DIA_ITEM.format(fila="old"))}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reporte_items_au AFTER UPDATE ON boleta_items BEGIN
+            {_SQL_REPORTE_INVALIDAR.format(dia=_DIA_ITEM.format(fila="old"))}
+            {_SQL_REPORTE_INVALIDAR.format(dia=_DIA_ITEM.format(fila="new"))}
+        END
+        """,
+    ]),
+    (13, "Autocompletado de clientes: el índice por nombre cubre el orden (ultima, boletas)", [
+        # El ranking recorre todo el prefijo en el índice, sin leer la tabla ni cortar por orden alfabético
+        "CREATE INDEX IF NOT EXISTS idx_cliente_nombre_orden ON cliente(nombre_busqueda, ultima, boletas)",
+        "DROP INDEX IF EXISTS idx_cliente_nombre",
+    ]),
+]
+
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+
+def version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar() -> list[int]:
+    """Aplica las migraciones pendientes, cada una en su transacción. Devuelve las aplicadas."""
+    conn = database._abrir()
+    conn.isolation_level = None  # transacciones explícitas
+    aplicadas = []
+    try:
+        while True:
+            # BEGIN IMMEDIATE serializa a varios procesos migrando a la vez
+            conn.execute("BEGIN IMMEDIATE")
+            pendientes = [m for m in MIGRACIONES if m[0] > version(conn)]
+            if not pendientes:
+                conn.execute("COMMIT")
+                break
+            numero, descripcion, pasos = pendientes[0]
+            try:
+                for paso in pasos:
+                    paso(conn) if callable(paso) else conn.execute(paso)
+                conn.execute(f"PRAGMA user_version = {numero}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            log.info("Migración %s aplicada: %s", numero, descripcion)
+            aplicadas.append(numero)
+        if aplicadas:
+            conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return aplicadas
+
+
+def asegurar():
+    """Arranque de worker: una sola lectura de user_version; migra solo si hace falta."""
+    if version(database._conn()) >= VERSION_ACTUAL:
+        return
+    log.warning("Esquema atrasado (user_version=%s < %s): aplicando migraciones",
+                version(database._conn()), VERSION_ACTUAL)
+    aplicar()
+
+
+# ===== Tabla original 'boletas' (un ítem por fila) =====
+TAMANO_LOTE_LEGADO = 200
+_DESCRIPCION_LEGADO = {"kilos": "Kilos", "edredon": "Edredón", "terno": "Terno"}
+
+
+def _hay_legado(conn) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'boletas'").fetchone() is not None
+
+
+def _soltar_legado(conn):
+    conn.execute("DROP INDEX IF EXISTS idx_boletas_fecha")
+    conn.execute("DROP INDEX IF EXISTS idx_boletas_cliente")
+    conn.execute("DROP TABLE IF EXISTS boletas")
+
+
+def _legado_a_boleta(f):
+    """Fila de 'boletas' -> (cabecera, item) del esquema nuevo. Se cobraba al registrar: saldo 0."""
+    precio = f["precio"] or 0
+    cantidad = f["kilos"] if f["tipo_item"] == "kilos" else f["cantidad"]
+    cabecera = dict(
+        numero=None, cliente=f["cliente"], direccion=None, telefono=None, fecha=f["fecha"],
+        entrega_fecha=None, entrega_hora=None, metodo_pago=f["metodo_pago"], estado=f["estado"],
+        a_cuenta=precio, saldo=0, total=precio, notas="Perfumado" if f["perfumado"] else None,
+    )
+    item = dict(
+        descripcion=_DESCRIPCION_LEGADO.get(f["tipo_item"], f["tipo_item"]), tipo=f["tipo_item"],
+        prendas=f["cantidad"] or 0, kilos=f["kilos"] or 0, lavado=f["servicio"], secado=None,
+        p_unit=round(precio / cantidad, 2) if cantidad else precio, importe=precio,
+    )
+    return cabecera, item
+
+
+def migrar_legado(tamano_lote=TAMANO_LOTE_LEGADO, pausa=0.05, progreso=None) -> int:
+    """
+    Copia las filas de 'boletas' a boleta + boleta_items en lotes pequeños, cada uno en su
+    transacción junto con su punto de control (boleta_legado): se puede cortar y retomar,
+    y entre lotes otros procesos pueden escribir. Devuelve las filas copiadas en esta ejecución.
+    """
+    conn = database._abrir()
+    conn.isolation_level = None
+    copiadas = 0
+    try:
+        if not _hay_legado(conn):
+            return 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                filas = conn.execute("""
+                    SELECT * FROM boletas
+                    WHERE id > (SELECT IFNULL(MAX(legado_id), 0) FROM boleta_legado)
+                    ORDER BY id LIMIT ?
+                """, (tamano_lote,)).fetchall()
+                for f in filas:
+                    cabecera, item = _legado_a_boleta(f)
+                    boleta_id = conn.execute(database._SQL_INSERTAR_BOLETA, cabecera).lastrowid
+                    conn.execute(database._SQL_INSERTAR_ITEM, {**item, "boleta_id": boleta_id})
+                    conn.execute("INSERT INTO boleta_legado (legado_id, boleta_id) VALUES (?, ?)",
+                                 (f["id"], boleta_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if not filas:
+                break
+            copiadas += len(filas)
+            if progreso:
+                progreso(copiadas)
+            time.sleep(pausa)  # deja pasar a las escrituras de la tienda
+    finally:
+        conn.close()
+    return copiadas
+
+
+def verificar_legado() -> dict:
+    """Compara 'boletas' con lo migrado: cantidades y sumas (precio vs. total e importes)."""
+    conn = database._abrir()
+    try:
+        if not _hay_legado(conn):
+            return dict(existe=False, ok=True)
+        legado, suma_legado = conn.execute(
+            "SELECT COUNT(1), ROUND(IFNULL(SUM(precio), 0), 2) FROM boletas").fetchone()
+        migradas, suma_total, suma_items = conn.execute("""
+            SELECT COUNT(1), ROUND(IFNULL(SUM(b.total), 0), 2),
+                   ROUND(IFNULL(SUM((SELECT SUM(i.importe) FROM boleta_items i WHERE i.boleta_id = b.id)), 0), 2)
+            FROM boletas l
+            JOIN boleta_legado m ON m.legado_id = l.id
+            JOIN boleta b ON b.id = m.boleta_id
+        """).fetchone()
+        pendientes = conn.execute(
+            "SELECT COUNT(1) FROM boletas l WHERE NOT EXISTS "
+            "(SELECT 1 FROM boleta_legado m WHERE m.legado_id = l.id)").fetchone()[0]
+    finally:
+        conn.close()
+    return dict(
+        existe=True, legado=legado, migradas=migradas, pendientes=pendientes,
+        suma_legado=suma_legado, suma_total=suma_total, suma_items=suma_items,
+        ok=pendientes == 0 and migradas == legado and suma_legado == suma_total == suma_items,
+    )
+
+
+def retirar_legado(vacuum=False):
+    """
+    Elimina 'boletas' y sus dos índices, solo si verificar_legado() cuadra.
+    Con vacuum=True además devuelve el espacio al sistema de archivos (bloquea la BD un rato).
+    """
+    v = verificar_legado()
+    if not v["existe"]:
+        return v
+    if not v["ok"]:
+        raise ValueError(f"La migración de 'boletas' no cuadra: {v}")
+    conn = database._abrir()
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _soltar_legado(conn)
+        conn.execute("COMMIT")
+        if vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return v
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    hechas = aplicar()
+    print(f"Esquema en versión {VERSION_ACTUAL}" + (f" (aplicadas: {hechas})" if hechas else " (sin cambios)"))
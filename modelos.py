@@ -0,0 +1,99 @@
+"""
+Registros tipados que devuelve database.py para boletas, items y clientes (en vez de sqlite3.Row).
+
+Cada caso de uso lee solo sus columnas: el listado no trae dirección, número ni
+montos parciales; el detalle trae todo; el export usa una tupla con nombre.
+Los campos de Boleta están ordenados para que cada proyección sea un prefijo:
+la fila de SQLite se pasa por posición, sin diccionarios intermedios.
+"""
+from dataclasses import dataclass, fields
+from typing import NamedTuple, Optional
+
+
+@dataclass(slots=True)
+class Boleta:
+    # --- listado (/boletas, API) ---
+    id: int
+    fecha: str
+    cliente: str
+    telefono: Optional[str]
+    notas: Optional[str]
+    entrega_fecha: Optional[str]
+    metodo_pago: Optional[str]
+    estado: Optional[str]
+    total: float
+    version: int
+    # --- solo en el detalle ---
+    numero: Optional[str] = None
+    direccion: Optional[str] = None
+    entrega_hora: Optional[str] = None
+    a_cuenta: float = 0.0
+    saldo: float = 0.0
+
+    def como_dict(self) -> dict:
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+
+@dataclass(slots=True)
+class BoletaItem:
+    id: int
+    descripcion: Optional[str]
+    tipo: Optional[str]
+    prendas: int
+    kilos: float
+    lavado: Optional[str]
+    secado: Optional[str]
+    p_unit: float
+    importe: float
+
+    def como_dict(self) -> dict:
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+
+@dataclass(slots=True)
+class Cliente:
+    """Cliente registrado (tabla cliente): nombre y dirección de su última boleta."""
+    telefono: str
+    nombre: str
+    direccion: Optional[str]
+    boletas: int
+    ultima: Optional[str]
+
+    def como_dict(self) -> dict:
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+
+class FilaExport(NamedTuple):
+    """Una fila de /export.csv: cabecera (b_*) repetida junto a cada item (i_*)."""
+    b_id: int
+    b_fecha: str
+    b_cliente: str
+    b_telefono: Optional[str]
+    b_direccion: Optional[str]
+    b_metodo_pago: Optional[str]
+    b_estado: Optional[str]
+    b_total: float
+    b_a_cuenta: float
+    b_saldo: float
+    b_notas: Optional[str]
+    i_id: int
+    i_descripcion: Optional[str]
+    i_tipo: Optional[str]
+    i_prendas: int
+    i_kilos: float
+    i_lavado: Optional[str]
+    i_p_unit: float
+    i_importe: float
+    b_numero: Optional[str]
+
+
+# Proyecciones: columnas que lee cada caso de uso, en el orden de los campos
+COLUMNAS_DETALLE = tuple(f.name for f in fields(Boleta))
+COLUMNAS_LISTADO = COLUMNAS_DETALLE[:10]
+COLUMNAS_ITEM = tuple(f.name for f in fields(BoletaItem))
+COLUMNAS_CLIENTE = tuple(f.name for f in fields(Cliente))
+
+
+def fabrica(modelo):
+    """row_factory de sqlite3 que arma 'modelo' con la fila por posición."""
+    return lambda _cursor, fila: modelo(*fila)
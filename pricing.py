@@ -1,24 +1,139 @@
-from decimal import Decimal, ROUND_HALF_UP 
 import config_precios as cfg
 
 
-def _money(x):
-    return Decimal(x).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+def _escalar(x, decimales) -> int:
+    """
+    x × 10**decimales como entero, redondeando la mitad hacia arriba (en valor absoluto).
+    Se trabaja sobre el texto decimal de x, así 2.675 da 268 céntimos y no 267.
+    """
+    if isinstance(x, int):
+        return x * 10 ** decimales
+    if isinstance(x, float) and -1e6 < x < 1e6:
+        # Caso común: lejos del medio, el float escalado redondea igual que su texto
+        escalado = x * 10 ** decimales
+        entero = round(escalado)
+        if abs(abs(escalado - entero) - 0.5) > 1e-6:
+            return entero
+    texto = str(x or 0).strip()
+    if "e" in texto or "E" in texto:  # floats muy chicos o muy grandes: 1e-05
+        texto = f"{float(texto):.{decimales + 1}f}"
+    signo = -1 if texto.startswith("-") else 1
+    entero, _, fraccion = texto.lstrip("+-").partition(".")
+    fraccion = fraccion.ljust(decimales + 1, "0")
+    valor = int(entero or 0) * 10 ** decimales + int(fraccion[:decimales] or 0)
+    if fraccion[decimales] >= "5":
+        valor += 1
+    return signo * valor
 
 
-def calcular_precio(tipo_item, kilos, cantidad, servicio, perfumado):
-    subtotal = Decimal("0.00")
+def _centimos(x) -> int:
+    """Monto -> céntimos enteros (redondeo comercial)."""
+    return _escalar(x, 2)
+
+
+def _milesimas(x) -> int:
+    """Cantidad (kilos o prendas) -> milésimas enteras."""
+    return _escalar(x, 3)
+
+
+def _importe(cantidad_mil: int, p_unit_cent: int) -> int:
+    """cantidad × precio en céntimos, redondeando medio céntimo hacia arriba."""
+    return (cantidad_mil * p_unit_cent + 500) // 1000
+
+
+class TablaPrecios:
+    """
+    Precios de config_precios compilados una sola vez a céntimos enteros.
+    Todo el cálculo posterior es aritmética entera (sin Decimal por ítem).
+    """
+    __slots__ = ("base", "recargo_servicio", "recargo_perfumado")
+
+    def __init__(self, precio_kilo, precio_edredon, precio_terno, recargo_servicio, recargo_perfumado):
+        kilo, edredon, terno = _centimos(precio_kilo), _centimos(precio_edredon), _centimos(precio_terno)
+        # Tipos del esquema original (kilos/edredon/terno) y del formulario (kilogramo/unidad);
+        # 'unidad' toma el precio de edredón, igual que el valor por defecto de boleta_nueva.
+        self.base = {"kilos": kilo, "kilogramo": kilo, "edredon": edredon, "unidad": edredon, "terno": terno}
+        self.recargo_servicio = {k: _centimos(v) for k, v in recargo_servicio.items()}
+        self.recargo_perfumado = _centimos(recargo_perfumado)
 
-    if tipo_item == "kilos":
-        subtotal = _money(Decimal(kilos) * Decimal(cfg.PRECIO_KILO))
-    elif tipo_item == "edredon":
-        subtotal = _money(Decimal(cantidad) * Decimal(cfg.PRECIO_EDREDON))
-    elif tipo_item == "terno":
-        subtotal = _money(Decimal(cantidad) * Decimal(cfg.PRECIO_TERNO))
+    @classmethod
+    def desde_config(cls, **cambios):
+        """Tabla con los valores de config_precios; 'cambios' permite simular otros precios."""
+        valores = dict(
+            precio_kilo=cfg.PRECIO_KILO, precio_edredon=cfg.PRECIO_EDREDON, precio_terno=cfg.PRECIO_TERNO,
+            recargo_servicio=cfg.RECARGO_SERVICIO, recargo_perfumado=cfg.RECARGO_PERFUMADO,
+        )
+        valores.update({k: v for k, v in cambios.items() if v is not None})
+        return cls(**valores)
 
-    # Recargos opcionales por servicio
-    subtotal += _money(cfg.RECARGO_SERVICIO.get(servicio, 0))
-    if perfumado:
-        subtotal += _money(cfg.RECARGO_PERFUMADO)
+    def precio_unitario(self, tipo) -> int:
+        """Precio de lista en céntimos para un tipo (0 si no tiene)."""
+        return self.base.get(tipo, 0)
 
-    return float(subtotal)
+    def importe_centimos(self, tipo, cantidad, servicio="normal", perfumado=False, p_unit=None) -> int:
+        """
+        Importe de un ítem en céntimos.
+        Con p_unit (precio puesto en el mostrador) el importe es cantidad × p_unit.
+        Sin p_unit se usa el precio de lista del tipo más los recargos de servicio/perfumado,
+        como calcular_precio().
+        """
+        if p_unit is not None:
+            return _importe(_milesimas(cantidad), _centimos(p_unit))
+        importe = _importe(_milesimas(cantidad), self.precio_unitario(tipo))
+        importe += self.recargo_servicio.get(servicio, 0)
+        if perfumado:
+            importe += self.recargo_perfumado
+        return importe
+
+    def precio_items(self, items) -> tuple[list[float], float]:
+        """
+        Precia una lista de ítems de una vez.
+        items: dicts con tipo, cantidad y opcionalmente servicio, perfumado, p_unit.
+        Return: (importes en soles por ítem, total en soles), exactos al céntimo.
+        """
+        importes = [
+            self.importe_centimos(it.get("tipo"), it.get("cantidad"), it.get("servicio") or "normal",
+                                  it.get("perfumado"), it.get("p_unit"))
+            for it in items
+        ]
+        return [c / 100 for c in importes], sum(importes) / 100
+
+    def simular(self, items_historicos, tabla_actual=None) -> dict:
+        """
+        Re-precia boleta_items históricos con esta tabla.
+        items_historicos: tuplas (tipo, prendas, kilos, p_unit, importe) (ver database.iterar_items_precio).
+        Un ítem se re-precia solo si se cobró a precio de lista de 'tabla_actual' (por defecto
+        config_precios); los precios especiales se mantienen.
+        Return: dict con items, actual, simulado, diferencia y el detalle por tipo.
+        """
+        tabla_actual = tabla_actual or TABLA
+        actual = simulado = n = 0
+        por_tipo = {}
+        for tipo, prendas, kilos, p_unit, importe in items_historicos:
+            cent_actual = _centimos(importe)
+            cent_punit = _centimos(p_unit)
+            if cent_punit and cent_punit == tabla_actual.precio_unitario(tipo):
+                cantidad = kilos if kilos else prendas
+                cent_nuevo = _importe(_milesimas(cantidad), self.precio_unitario(tipo))
+            else:
+                cent_nuevo = cent_actual
+            n += 1
+            actual += cent_actual
+            simulado += cent_nuevo
+            t = por_tipo.setdefault(tipo or "", [0, 0, 0])
+            t[0] += 1; t[1] += cent_actual; t[2] += cent_nuevo
+        return dict(
+            items=n, actual=actual / 100, simulado=simulado / 100, diferencia=(simulado - actual) / 100,
+            por_tipo={k: dict(items=v[0], actual=v[1] / 100, simulado=v[2] / 100) for k, v in por_tipo.items()},
+        )
+
+
+# Tabla compilada con los precios vigentes
+TABLA = TablaPrecios.desde_config()
+
+
+def calcular_precio(tipo_item, kilos, cantidad, servicio, perfumado):
+    cantidad_item = kilos if tipo_item == "kilos" else cantidad
+    if tipo_item not in ("kilos", "edredon", "terno"):
+        cantidad_item = 0
+    return TABLA.importe_centimos(tipo_item, cantidad_item, servicio, perfumado) / 100
@@ -0,0 +1,223 @@
+"""
+Respaldos en caliente de lavanderia.db con la API de backup de SQLite.
+
+La copia avanza de a RESPALDO_PAGINAS páginas con una pausa entre pasos: cada paso
+toma la BD solo unos milisegundos, así que /boleta/nueva no espera al respaldo.
+Cada respaldo se verifica con PRAGMA integrity_check, se comprime (.db.gz) con la
+fecha y hora en el nombre, y se conservan los últimos RESPALDO_CONSERVAR.
+Los archivos de boletas antiguas (archivo.py) se copian aparte, solo cuando cambian.
+
+    flask --app app respaldar
+"""
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import database
+
+log = logging.getLogger("lavanderia.respaldo")
+
+RESPALDO_DIR = Path(os.getenv("LAVA_RESPALDO_DIR", str(database.DATA_DIR / "respaldos")))
+RESPALDO_CONSERVAR = int(os.getenv("LAVA_RESPALDO_CONSERVAR", "14"))
+RESPALDO_PAGINAS = int(os.getenv("LAVA_RESPALDO_PAGINAS", "256"))  # páginas por paso
+RESPALDO_PAUSA = float(os.getenv("LAVA_RESPALDO_PAUSA", "0.02"))  # segundos entre pasos
+# Si otra conexión escribe durante la copia, SQLite la reinicia; tras estos reinicios se
+# copia lo que falta de una vez (con WAL eso tampoco bloquea a las escrituras)
+REINICIOS_MAX = 3
+# Cada cuánto la sonda mide si una escritura tendría que esperar
+SONDA_INTERVALO = 0.05
+
+_RESPALDO_RE = re.compile(r"^lavanderia-\d{8}-\d{6}\.db\.gz$")
+
+
+class ErrorRespaldo(RuntimeError):
+    """La copia no pasó PRAGMA integrity_check."""
+
+
+class _Reiniciada(Exception):
+    pass
+
+
+def _sonda_escritura(ruta, parar, esperas):
+    """Toma y suelta el bloqueo de escritura cada SONDA_INTERVALO y anota cuánto esperó."""
+    conn = sqlite3.connect(ruta, timeout=database.DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    try:
+        while not parar.wait(SONDA_INTERVALO):
+            inicio = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("ROLLBACK")
+            except sqlite3.OperationalError:
+                pass  # ocupada más que busy_timeout: igual cuenta la espera
+            esperas.append(time.perf_counter() - inicio)
+    finally:
+        conn.close()
+
+
+def _copiar(origen, destino, paginas, pausa) -> dict:
+    """Backup por pasos de 'origen' (ruta) a 'destino' (ruta); devuelve pasos, paso más largo y reinicios."""
+    fuente = sqlite3.connect(origen, timeout=database.DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    stats = {"pasos": 0, "paso_max_ms": 0.0, "reinicios": 0}
+    try:
+        # Con WAL, una transacción de lectura abierta fija la instantánea entre pasos: la copia
+        # no se reinicia por las escrituras y estas no esperan (en modo rollback sí esperarían)
+        if fuente.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            fuente.execute("BEGIN")
+            fuente.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        while True:
+            copia = sqlite3.connect(destino)
+            marca = [time.perf_counter(), None]  # inicio del paso, páginas que faltaban
+
+            def progreso(_estado, faltan, _total):
+                # Cada paso toma la BD de origen y la suelta antes de volver: esto es lo que dura
+                stats["pasos"] += 1
+                stats["paso_max_ms"] = max(stats["paso_max_ms"], (time.perf_counter() - marca[0]) * 1000)
+                if marca[1] is not None and faltan > marca[1]:
+                    stats["reinicios"] += 1
+                    if paginas > 0 and stats["reinicios"] >= REINICIOS_MAX:
+                        raise _Reiniciada
+                marca[1] = faltan
+                if faltan:
+                    time.sleep(pausa)  # sleep= de backup() solo se usa si el paso dio BUSY
+                marca[0] = time.perf_counter()
+
+            try:
+                fuente.backup(copia, pages=paginas, progress=progreso, sleep=pausa)
+                return stats
+            except _Reiniciada:
+                log.warning("Respaldo de %s reiniciado %d veces: se copia de una vez", origen, stats["reinicios"])
+                paginas = -1
+            finally:
+                copia.close()
+    finally:
+        fuente.close()
+
+
+def _verificar(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        resultado = [fila[0] for fila in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    if resultado != ["ok"]:
+        raise ErrorRespaldo(f"{ruta.name}: integrity_check -> {'; '.join(resultado[:5])}")
+
+
+def _comprimir(ruta, destino):
+    """ruta -> destino (.gz), escribiendo a un .part que se renombra al terminar."""
+    parcial = destino.with_name(f"{destino.name}.{os.getpid()}.part")
+    with open(ruta, "rb") as entrada, gzip.open(parcial, "wb", compresslevel=6) as salida:
+        shutil.copyfileobj(entrada, salida, 1024 * 1024)
+    os.replace(parcial, destino)
+
+
+def _respaldar_archivo(origen, destino, paginas, pausa):
+    temporal = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+    try:
+        stats = _copiar(origen, temporal, paginas, pausa)
+        _verificar(temporal)
+        _comprimir(temporal, destino)
+    finally:
+        temporal.unlink(missing_ok=True)
+    return stats
+
+
+def respaldos() -> list[tuple[str, int, datetime]]:
+    """Respaldos existentes (nombre, bytes, fecha), del más reciente al más antiguo."""
+    if not RESPALDO_DIR.exists():
+        return []
+    lista = [r for r in RESPALDO_DIR.iterdir() if _RESPALDO_RE.match(r.name)]
+    return [(r.name, r.stat().st_size, datetime.strptime(r.name[11:26], "%Y%m%d-%H%M%S"))
+            for r in sorted(lista, key=lambda r: r.name, reverse=True)]
+
+
+def ruta_respaldo(nombre) -> Path | None:
+    """Ruta de un respaldo por su nombre (None si el nombre no es de un respaldo)."""
+    return RESPALDO_DIR / nombre if _RESPALDO_RE.match(nombre or "") else None
+
+
+def rotar(conservar=RESPALDO_CONSERVAR) -> list[str]:
+    """Elimina los respaldos más antiguos que los últimos 'conservar'. Devuelve los eliminados."""
+    sobrantes = [nombre for nombre, _, _ in respaldos()[max(conservar, 1):]]
+    for nombre in sobrantes:
+        (RESPALDO_DIR / nombre).unlink(missing_ok=True)
+    return sobrantes
+
+
+def respaldar(paginas=RESPALDO_PAGINAS, pausa=RESPALDO_PAUSA, conservar=RESPALDO_CONSERVAR,
+              con_archivos=True) -> dict:
+    """
+    Respalda lavanderia.db (y los archivos que cambiaron) en RESPALDO_DIR.
+    Return: dict con el respaldo, tamaños, duración, pasos, paso más largo, reinicios,
+    la espera más larga que vio una escritura durante la copia y lo eliminado por rotación.
+    """
+    RESPALDO_DIR.mkdir(parents=True, exist_ok=True)
+    inicio = time.perf_counter()
+    destino = RESPALDO_DIR / f"lavanderia-{datetime.now():%Y%m%d-%H%M%S}.db.gz"
+
+    parar, esperas = threading.Event(), []
+    sonda = threading.Thread(target=_sonda_escritura, args=(database.DB_PATH, parar, esperas), daemon=True)
+    sonda.start()
+    try:
+        stats = _respaldar_archivo(database.DB_PATH, destino, paginas, pausa)
+    finally:
+        parar.set()
+        sonda.join()
+
+    # Los archivos solo cambian al archivar: se copian si son más nuevos que su respaldo
+    copiados = []
+    if con_archivos:
+        for nombre, _, _ in database.archivos():
+            origen = database.ruta_archivo(nombre)
+            copia = RESPALDO_DIR / "archivo" / f"{nombre}.db.gz"
+            if copia.exists() and copia.stat().st_mtime >= origen.stat().st_mtime:
+                continue
+            copia.parent.mkdir(exist_ok=True)
+            _respaldar_archivo(origen, copia, paginas, pausa)
+            copiados.append(nombre)
+
+    resultado = {
+        "respaldo": destino.name,
+        "bytes_bd": os.path.getsize(database.DB_PATH),
+        "bytes_respaldo": destino.stat().st_size,
+        "segundos": round(time.perf_counter() - inicio, 3),
+        **stats,
+        "paso_max_ms": round(stats["paso_max_ms"], 1),
+        "espera_escritura_max_ms": round(max(esperas, default=0) * 1000, 1),
+        "archivos": copiados,
+        "eliminados": rotar(conservar),
+    }
+    log.info("Respaldo %s", resultado)
+    return resultado
+
+
+# --- Trabajo lanzado desde el panel de administración (un hilo por worker) ---
+_trabajo_lock = threading.Lock()
+ULTIMO = {"estado": None}  # en_curso / ok / error, con el resultado o el mensaje
+
+
+def iniciar_en_segundo_plano() -> bool:
+    """Lanza respaldar() en un hilo. False si ya hay uno en curso en este worker."""
+    if not _trabajo_lock.acquire(blocking=False):
+        return False
+    ULTIMO.clear()
+    ULTIMO.update(estado="en_curso", inicio=datetime.now().isoformat(timespec="seconds"))
+
+    def trabajo():
+        try:
+            ULTIMO.update(estado="ok", resultado=respaldar())
+        except Exception as e:
+            log.exception("Falló el respaldo")
+            ULTIMO.update(estado="error", mensaje=str(e))
+        finally:
+            _trabajo_lock.release()
+
+    threading.Thread(target=trabajo, name="lava-respaldo", daemon=True).start()
+    return True
@@ -0,0 +1,75 @@
+// Utilidades globales
+window.LavanderiaUtils = {
+  formatMoney: (amount) => {
+    return new Intl.NumberFormat('es-PE', {
+      style: 'currency',
+      currency: 'PEN'
+    }).format(amount);
+  },
+
+  formatPhone: (phone) => {
+    const cleaned = phone.replace(/\D/g, '');
+    if (cleaned.length === 9) {
+      return cleaned.replace(/(\d{3})(\d{3})(\d{3})/, '$1 $2 $3');
+    }
+    return phone;
+  },
+
+  showToast: (message, type = 'info') => {
+    const toast = document.createElement('div');
+    toast.className = `flash ${type} toast-notification`;
+    toast.innerHTML = `
+      <span class="flash-icon">
+        ${type === 'success' ? '✅' : type === 'error' ? '❌' : 'ℹ️'}
+      </span>
+      ${message}
+    `;
+
+    document.body.appendChild(toast);
+
+    setTimeout(() => {
+      toast.style.opacity = '0';
+      toast.style.transform = 'translateY(-20px)';
+      setTimeout(() => toast.remove(), 300);
+    }, 3000);
+  }
+};
+
+// Auto-hide flash messages después de 5 segundos
+document.addEventListener('DOMContentLoaded', function() {
+  const flashMessages = document.querySelectorAll('.flash:not(.toast-notification)');
+  flashMessages.forEach(flash => {
+    setTimeout(() => {
+      if (flash.parentElement) {
+        flash.style.opacity = '0';
+        flash.style.transform = 'translateY(-10px)';
+        setTimeout(() => flash.remove(), 300);
+      }
+    }, 5000);
+  });
+});
+
+// Cerrar mensajes flash
+document.addEventListener('click', function(e) {
+  if (e.target.matches('.flash-close')) e.target.closest('.flash').remove();
+});
+
+// Confirmar acciones peligrosas
+document.addEventListener('click', function(e) {
+  if (e.target.matches('.btn.danger, .btn-danger')) {
+    if (!confirm('¿Estás seguro de realizar esta acción?')) {
+      e.preventDefault();
+    }
+  }
+});
+
+// Service Worker: /boleta/nueva sin conexión (ver sw.js y cola.js)
+const URL_SW = document.currentScript && document.currentScript.dataset.sw;
+if ('serviceWorker' in navigator && URL_SW) {
+  window.addEventListener('load', function() {
+    navigator.serviceWorker.register(URL_SW, { scope: '/' })
+      .catch(function(registrationError) {
+        console.log('SW registration failed: ', registrationError);
+      });
+  });
+}
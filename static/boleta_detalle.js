@@ -0,0 +1,11 @@
+document.getElementById("printButton").addEventListener("click", function() {
+  window.print();
+});
+
+// Mejorar la experiencia con keyboard shortcuts
+document.addEventListener('keydown', function(e) {
+  if (e.ctrlKey && e.key === 'p') {
+    e.preventDefault();
+    document.getElementById('printButton').click();
+  }
+});
@@ -0,0 +1,298 @@
+const PRECIOS = {
+  kilo: 3.50,
+  edredon: 15.00,
+  terno: 20.00,
+  perfumado: 0.50
+};
+
+const SERVICIOS = {
+  normal: { nombre: 'Normal', recargo: 0.0 },
+  seco: { nombre: 'Lavado en seco', recargo: 0.0 },
+  mano: { nombre: 'Lavado a mano', recargo: 0.0 }
+};
+
+function fmt(n) { 
+  return (Math.round(n * 100) / 100).toFixed(2); 
+}
+
+function addItem(pref = {}) {
+  const row = document.createElement('div');
+  row.className = 'item-row';
+
+  const serviciosOptions = Object.entries(SERVICIOS)
+    .map(([key, val]) => `<option value="${key}" ${pref.servicio === key ? 'selected' : ''}>${val.nombre}</option>`)
+    .join('');
+
+  row.innerHTML = `
+    <div class="item-row-header">
+      <input name="item_desc[]" placeholder="Ej: Frazadas, ropa de cama..." value="${pref.desc || ''}" required style="flex-grow: 1; margin-right: 10px;">
+      <button type="button" class="btn danger small quitar-item" title="Eliminar">🗑️ Eliminar</button>
+    </div>
+    <div class="item-row-fields">
+      <div><label>Tipo de Ítem</label><select name="item_tipo[]" required><option value="unidad" ${pref.tipo === 'unidad' ? 'selected' : ''}>Por Unidad</option><option value="kilogramo" ${pref.tipo === 'kilogramo' ? 'selected' : ''}>Por Kilogramo</option></select></div>
+      <div><label>Servicio</label><select name="item_servicio[]">${serviciosOptions}</select></div>
+      <div><label>Cantidad</label><input name="item_cantidad[]" type="number" step="1" min="0" value="${pref.cantidad || 1}"></div>
+      <div><label>Precio Unit. (S/)</label><input name="item_punit[]" type="number" step="0.01" min="0" value="${pref.pu || 0}"></div>
+      <div class="item-importe-display"><label>Importe</label><strong>S/ 0.00</strong></div>
+    </div>
+  `;
+
+  document.getElementById('items').appendChild(row);
+  const sel = row.querySelector('select[name="item_tipo[]"]');
+  onTipoChange(sel);
+}
+
+function onTipoChange(sel) {
+  const row = sel.closest('.item-row');
+  const tipo = sel.value;
+  const cantidadInput = row.querySelector('input[name="item_cantidad[]"]');
+  const puInput = row.querySelector('input[name="item_punit[]"]');
+
+  switch (tipo) {
+    case 'kilogramo':
+      cantidadInput.step = "0.01";
+      cantidadInput.value = "1.0";
+      puInput.value = PRECIOS.kilo;
+      break;
+    case 'unidad':
+    default: 
+      cantidadInput.step = "1";
+      cantidadInput.value = "1";
+      puInput.value = PRECIOS.edredon; // Un valor por defecto para unidad
+  }
+  recalc();
+}
+
+function removeItem(btn) {
+  btn.closest('.item-row').remove();
+  recalc();
+}
+
+function recalc() {
+  let total = 0;
+
+  document.querySelectorAll('#items .item-row').forEach(row => {
+    const tipo = row.querySelector('select[name="item_tipo[]"]').value;
+    const servicioKey = row.querySelector('select[name="item_servicio[]"]').value;
+    const servicio = SERVICIOS[servicioKey] || SERVICIOS.normal;
+    const cantidad = parseFloat(row.querySelector('input[name="item_cantidad[]"]').value || 0);
+    // Igual que el servidor: precio en blanco = el de lista; un 0 escrito se respeta
+    const punitTxt = row.querySelector('input[name="item_punit[]"]').value.trim();
+    const punit = punitTxt === ''
+      ? (tipo === 'kilogramo' ? PRECIOS.kilo : PRECIOS.edredon)
+      : parseFloat(punitTxt) || 0;
+
+    let importe = 0;
+    importe = cantidad * punit;
+    importe += cantidad * servicio.recargo; // Siempre 0 ahora, pero mantenemos la lógica
+    total += importe;
+
+    // Actualizar el display del importe del item
+    const importeDisplay = row.querySelector('.item-importe-display strong');
+    if (importeDisplay) {
+      importeDisplay.textContent = 'S/ ' + fmt(importe);
+    }
+  });
+
+  const aCuenta = parseFloat(document.querySelector('input[name="a_cuenta"]').value || 0);
+  const saldo = total - aCuenta;
+
+  document.getElementById('total').textContent = 'S/ ' + fmt(total);
+  document.getElementById('saldo').textContent = 'S/ ' + fmt(saldo);
+}
+
+// Event listeners (delegados en #items: las filas se crean y se quitan)
+document.getElementById('boletaForm').addEventListener('input', recalc);
+document.getElementById('a_cuenta').addEventListener('input', recalc);
+document.getElementById('agregar-item').addEventListener('click', () => addItem());
+document.getElementById('items').addEventListener('change', e => {
+  if (e.target.name === 'item_tipo[]') onTipoChange(e.target);
+  else recalc();
+});
+document.getElementById('items').addEventListener('click', e => {
+  const boton = e.target.closest('.quitar-item');
+  if (boton) removeItem(boton);
+});
+
+// Agregar primera fila por defecto
+addItem({ tipo: 'unidad' });
+
+// Configurar fecha mínima (hoy)
+const today = new Date().toISOString().split('T')[0];
+document.getElementById('entrega_fecha').min = today;
+
+// Formatear teléfono automáticamente
+document.getElementById('telefono').addEventListener('input', function(e) {
+  let value = e.target.value.replace(/\D/g, '');
+  if (value.length > 0) {
+    if (value.length <= 3) {
+      value = value;
+    } else if (value.length <= 6) {
+      value = value.slice(0, 3) + ' ' + value.slice(3);
+    } else {
+      value = value.slice(0, 3) + ' ' + value.slice(3, 6) + ' ' + value.slice(6, 9);
+    }
+  }
+  e.target.value = value;
+});
+
+// Autocompletado de clientes registrados: al elegir uno se llenan teléfono y dirección
+const DATOS = JSON.parse(document.getElementById('datos-pagina').textContent);
+const URL_CLIENTES = DATOS.url_clientes;
+let sugeridos = [];
+let esperaCliente = null;
+
+function telefonoLocal(t) {
+  const d = String(t || '').replace(/^51/, '');
+  return d.length === 9 ? `${d.slice(0, 3)} ${d.slice(3, 6)} ${d.slice(6)}` : d;
+}
+
+function opcion(valor, etiqueta) {
+  const o = document.createElement('option');
+  o.value = valor;
+  o.label = etiqueta;
+  return o;
+}
+
+async function buscarClientes(texto) {
+  try {
+    const res = await fetch(`${URL_CLIENTES}?q=${encodeURIComponent(texto)}`);
+    if (res.status !== 200 || res.redirected) return;
+    sugeridos = (await res.json()).clientes;
+  } catch (e) {
+    return;  // sin red: se escribe a mano
+  }
+  document.getElementById('clientes-sugeridos').replaceChildren(
+    ...sugeridos.map(c => opcion(c.nombre, `${telefonoLocal(c.telefono)} · ${c.boletas} boletas`)));
+  document.getElementById('telefonos-sugeridos').replaceChildren(
+    ...sugeridos.map(c => opcion(telefonoLocal(c.telefono), c.nombre)));
+}
+
+function elegirCliente(c) {
+  document.getElementById('cliente').value = c.nombre;
+  document.getElementById('telefono').value = telefonoLocal(c.telefono);
+  if (c.direccion) document.getElementById('direccion').value = c.direccion;
+  document.getElementById('cliente-frecuente').textContent =
+    `${c.boletas} boletas · última el ${String(c.ultima || '').slice(0, 10)}`;
+}
+
+['cliente', 'telefono'].forEach(campo => {
+  document.getElementById(campo).addEventListener('input', function(e) {
+    const valor = e.target.value.trim();
+    const elegido = sugeridos.find(c => valor === (campo === 'cliente' ? c.nombre : telefonoLocal(c.telefono)));
+    if (elegido) { elegirCliente(elegido); return; }
+    document.getElementById('cliente-frecuente').textContent = '';
+    clearTimeout(esperaCliente);
+    if (valor.length >= 2) esperaCliente = setTimeout(() => buscarClientes(valor), 150);
+  });
+});
+
+// Guardado con cola: la boleta entra a la cola del navegador (cola.js) con su clave y se
+// envía en lote a /api/boletas/sync. Sin red queda pendiente y el formulario sigue libre.
+const MAX_ENVIADAS = 20;
+let enviadas = [];  // respuestas del servidor en esta página, la más reciente primero
+let estadoCola = 'ok';
+
+function esc(v) {
+  return String(v ?? '').replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+}
+
+function camposFormulario(form) {
+  const campos = {};
+  for (const [nombre, valor] of new FormData(form)) {
+    if (nombre.endsWith('[]')) (campos[nombre] = campos[nombre] || []).push(valor);
+    else campos[nombre] = valor;
+  }
+  return campos;
+}
+
+function limpiarFormulario(form) {
+  form.reset();
+  document.getElementById('items').replaceChildren();
+  addItem({ tipo: 'unidad' });
+  document.getElementById('cliente-frecuente').textContent = '';
+  document.getElementById('cliente').focus();
+}
+
+async function mostrarCola() {
+  const pendientes = await ColaBoletas.pendientes();
+  const filas = pendientes.map(b => `
+    <li>${b.error ? '⚠️' : '⏳'} <strong>${esc(b.campos.cliente)}</strong>
+      <small>${new Date(b.creada).toLocaleTimeString()}</small>
+      ${b.error ? `<small class="cola-error">${esc(b.error)}</small>
+        <button type="button" class="btn danger small" data-descartar="${esc(b.clave)}">Descartar</button>` : '<small>sin enviar</small>'}
+    </li>`).concat(enviadas.map(b => `
+    <li>✅ <strong>#${String(b.id).padStart(4, '0')}</strong> ${esc(b.cliente)} · S/ ${fmt(b.total)}
+      <a class="btn small" href="${esc(b.detalle)}">🖨️ Ver</a>
+      <a class="btn success small" href="${esc(b.whatsapp)}" target="_blank" rel="noopener">💚 WhatsApp</a>
+    </li>`));
+  document.getElementById('cola-lista').innerHTML = filas.join('');
+
+  const sinEnviar = pendientes.filter(b => !b.error).length;
+  const estado = document.getElementById('cola-estado');
+  if (!sinEnviar) estado.textContent = '';
+  else if (estadoCola === 'sesion') estado.innerHTML = `La sesión venció: <a href="${esc(DATOS.url_login)}">inicia sesión</a> para enviar ${sinEnviar} boleta(s).`;
+  else if (estadoCola === 'error') estado.textContent = `El servidor no respondió: ${sinEnviar} boleta(s) se reintentarán.`;
+  else if (estadoCola === 'sin_red') estado.textContent = `Sin conexión: ${sinEnviar} boleta(s) se enviarán al volver la red.`;
+  else estado.textContent = `${sinEnviar} boleta(s) por enviar.`;
+  document.getElementById('cola-boletas').hidden = !filas.length;
+}
+
+function anotarEnviadas(nuevas) {
+  enviadas = nuevas.slice().reverse().concat(enviadas).slice(0, MAX_ENVIADAS);
+}
+
+async function sincronizarCola() {
+  const resultado = await ColaBoletas.sincronizar(DATOS.url_sync);
+  estadoCola = resultado.estado;
+  anotarEnviadas(resultado.enviadas);
+  if (estadoCola === 'sin_red' && 'serviceWorker' in navigator) {
+    // El service worker reintenta aunque se cierre la página (donde hay Background Sync)
+    navigator.serviceWorker.ready.then(reg => reg.sync && reg.sync.register('boletas')).catch(() => {});
+  }
+  await mostrarCola();
+}
+
+if (window.ColaBoletas && ColaBoletas.disponible) {
+  const form = document.getElementById('boletaForm');
+  form.addEventListener('submit', async function(e) {
+    e.preventDefault();
+    if (!document.querySelector('#items .item-row')) {
+      alert('Agrega al menos un ítem con cantidad/precio.');
+      return;
+    }
+    const boton = form.querySelector('button[type="submit"]');
+    boton.disabled = true;
+    try {
+      await ColaBoletas.agregar(camposFormulario(form));
+    } catch (err) {
+      form.submit();  // sin IndexedDB (p. ej. navegación privada): envío normal
+      return;
+    } finally {
+      boton.disabled = false;
+    }
+    limpiarFormulario(form);
+    await sincronizarCola();
+  });
+
+  document.getElementById('cola-lista').addEventListener('click', async function(e) {
+    const clave = e.target.dataset.descartar;
+    if (clave && confirm('¿Descartar esta boleta sin enviar?')) {
+      await ColaBoletas.quitar(clave);
+      await mostrarCola();
+    }
+  });
+
+  // Lo que envió el service worker en segundo plano
+  if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.addEventListener('message', function(e) {
+      if (!e.data || e.data.tipo !== 'cola-boletas') return;
+      estadoCola = e.data.estado;
+      anotarEnviadas(e.data.enviadas);
+      mostrarCola();
+    });
+  }
+  window.addEventListener('online', sincronizarCola);
+  sincronizarCola().catch(() => {});  // pendientes de visitas anteriores
+}
+
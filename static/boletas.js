@@ -0,0 +1,171 @@
+// Función para imprimir boleta individual
+function printBoleta(boletaId) {
+  // Intentar abrir la boleta detallada
+  const url = conId(URL_DETALLE, boletaId);
+
+  // Crear una ventana de impresión
+  const printWindow = window.open(url, '_blank', 'width=800,height=600');
+
+  if (printWindow) {
+    printWindow.onload = function() {
+      // Esperar un poco para que cargue completamente
+      setTimeout(() => {
+        printWindow.print();
+      }, 1000);
+    };
+  } else {
+    alert('Por favor permite las ventanas emergentes para imprimir');
+  }
+}
+
+// Refresco incremental: se consulta la API con el ETag de lo mostrado y solo si
+// cambió algo (200 en vez de 304) se reemplazan las filas con otra versión.
+// Las URLs y los ETags iniciales vienen de la plantilla en #datos-pagina
+const DATOS = JSON.parse(document.getElementById('datos-pagina').textContent);
+const API_LISTA = DATOS.api_lista + location.search;
+const API_TOTALES = DATOS.api_totales + location.search;
+const URL_DETALLE = DATOS.url_detalle;
+const URL_ESTADO = DATOS.url_estado;
+const URL_ELIMINAR = DATOS.url_eliminar;
+const ES_ADMIN = DATOS.es_admin;
+const WHATSAPP = DATOS.whatsapp;
+const REFRESCO_MS = 15000;
+let etagLista = `"${DATOS.etag_lista}"`;
+let etagTotales = `"${DATOS.etag_totales}"`;
+
+function esc(v) {
+  return String(v ?? '').replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+}
+function conId(url, id) { return url.replace(/0$/, id); }
+
+function filaHTML(b) {
+  const num = String(b.id).padStart(4, '0');
+  const total = Number(b.total || 0).toFixed(2);
+  const estadoClass = b.estado === 'entregado' ? 'status-entregado' : 'status-registrado';
+  const estado = esc(String(b.estado || '').toUpperCase());
+  const badge = ES_ADMIN
+    ? `<form action="${conId(URL_ESTADO, b.id)}" method="post" class="status-form">
+         <button type="submit" class="status-badge ${estadoClass}" title="Clic para cambiar estado">${estado}</button>
+       </form>`
+    : `<span class="status-badge ${estadoClass}">${estado}</span>`;
+  const texto = encodeURIComponent(`Hola ${b.cliente}, sobre su boleta #${num} por S/ ${total}...`);
+  const eliminar = ES_ADMIN
+    ? `<form action="${conId(URL_ELIMINAR, b.id)}" method="post" data-confirmar="¿Estás seguro de que quieres eliminar esta boleta? Esta acción no se puede deshacer.">
+         <button type="submit" class="btn danger small" style="font-size: 11px; padding: 6px 8px; width: 100%;">🗑️ Eliminar</button>
+       </form>`
+    : '';
+  const marca = ES_ADMIN
+    ? `<td><input type="checkbox" name="ids" value="${b.id}" form="form-lote" class="marca-boleta" /></td>`
+    : '';
+  return `<tr data-id="${b.id}" data-version="${b.version}">
+    ${marca}
+    <td><strong>#${num}</strong></td>
+    <td>${esc(String(b.fecha || '').slice(0, 16))}</td>
+    <td><strong>${esc(b.cliente)}</strong><br><small style="color: var(--muted);">${esc(b.telefono || 'Sin telf.')}</small></td>
+    <td>
+      <span style="background: #fff3e0; color: #f57c00; padding: 2px 6px; border-radius: 4px; font-size: 12px;">Múltiples Items</span>
+      <br><small style="color: var(--muted);">${esc(b.notas || 'Sin notas')}</small>
+    </td>
+    <td>${esc(b.entrega_fecha || 'No espec.')}</td>
+    <td>${esc(b.metodo_pago)}</td>
+    <td>${badge}</td>
+    <td><strong>S/ ${total}</strong></td>
+    <td>
+      <div style="display: flex; flex-direction: column; gap: 4px; min-width: 160px;">
+        <a href="${conId(URL_DETALLE, b.id)}" class="btn small" style="font-size: 11px; padding: 6px 8px;">🔍 Ver Detalle</a>
+        <a href="https://wa.me/${esc(b.telefono || WHATSAPP)}?text=${texto}" target="_blank" class="btn success small" style="font-size: 11px; padding: 6px 8px;">💚 WhatsApp</a>
+        ${eliminar}
+      </div>
+    </td>
+  </tr>`;
+}
+
+async function pedir(url, etag) {
+  const res = await fetch(url, {headers: etag ? {'If-None-Match': etag} : {}, cache: 'no-store'});
+  if (res.status !== 200 || res.redirected) return null;  // 304, sesión vencida, error
+  return {etag: res.headers.get('ETag'), datos: await res.json()};
+}
+
+async function refrescarBoletas() {
+  if (document.hidden) return;
+  try {
+    const lista = await pedir(API_LISTA, etagLista);
+    if (lista) {
+      etagLista = lista.etag;
+      const tbody = document.getElementById('tabla-boletas');
+      if (!lista.datos.boletas.length) { location.reload(); return; }
+      const actuales = {};
+      tbody.querySelectorAll('tr[data-id]').forEach(tr => { actuales[tr.dataset.id] = tr; });
+      const filas = lista.datos.boletas.map(b => {
+        const tr = actuales[b.id];
+        if (tr && tr.dataset.version === String(b.version)) return tr;  // sin cambios: se reutiliza
+        const tmp = document.createElement('tbody');
+        tmp.innerHTML = filaHTML(b);
+        const nueva = tmp.firstElementChild;
+        const marca = tr && tr.querySelector('.marca-boleta');
+        if (marca && marca.checked) nueva.querySelector('.marca-boleta').checked = true;
+        return nueva;
+      });
+      tbody.replaceChildren(...filas);
+      contarMarcadas();
+    }
+    const totales = await pedir(API_TOTALES, etagTotales);
+    if (totales) {
+      etagTotales = totales.etag;
+      document.getElementById('total-periodo').textContent = Number(totales.datos.total).toFixed(2);
+    }
+  } catch (e) {
+    // sin red: se reintenta en el siguiente ciclo
+  }
+}
+
+// Selección múltiple para cambiar el estado de varias boletas de una vez
+function contarMarcadas() {
+  const form = document.getElementById('form-lote');
+  if (!form) return;
+  const n = document.querySelectorAll('.marca-boleta:checked').length;
+  document.getElementById('lote-marcadas').textContent = n;
+  form.querySelectorAll('button').forEach(b => { b.disabled = n === 0; });
+}
+document.addEventListener('change', e => {
+  if (e.target.id === 'marcar-todas') {
+    document.querySelectorAll('.marca-boleta').forEach(c => { c.checked = e.target.checked; });
+  }
+  if (e.target.id === 'marcar-todas' || e.target.classList.contains('marca-boleta')) contarMarcadas();
+});
+
+// Formularios con data-confirmar (eliminar): también sirve para las filas que llegan del refresco
+document.addEventListener('submit', e => {
+  const mensaje = e.target.dataset.confirmar;
+  if (mensaje && !confirm(mensaje)) e.preventDefault();
+});
+
+setInterval(refrescarBoletas, REFRESCO_MS);
+document.addEventListener('visibilitychange', refrescarBoletas);
+
+// Mejorar la experiencia de filtros
+document.addEventListener('DOMContentLoaded', function() {
+  // Auto-submit en cambio de fechas
+  const fechaInputs = document.querySelectorAll('input[type="date"]');
+  fechaInputs.forEach(input => {
+    input.addEventListener('change', function() {
+      // Auto-submit después de seleccionar fecha
+      setTimeout(() => {
+        if (this.form) {
+          this.form.submit();
+        }
+      }, 300);
+    });
+  });
+
+  // Limpiar filtros con Enter en el campo de cliente
+  const clienteInput = document.querySelector('input[name="cliente"]');
+  if (clienteInput) {
+    clienteInput.addEventListener('keypress', function(e) {
+      if (e.key === 'Enter') {
+        e.preventDefault();
+        this.form.submit();
+      }
+    });
+  }
+});
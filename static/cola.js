@@ -0,0 +1,102 @@
+// Cola de boletas guardadas en el navegador (IndexedDB), compartida por boleta_nueva.js y sw.js.
+// Cada boleta lleva una clave generada aquí: /api/boletas/sync nunca inserta dos veces la misma,
+// así que reenviar tras un corte (o desde la página y el service worker a la vez) es seguro.
+(function(global) {
+  const BD = 'lavanderia';
+  const ALMACEN = 'boletas_pendientes';
+  const LOTE = 100;  // = SYNC_MAX de app.py
+
+  function abrir() {
+    return new Promise((resolve, reject) => {
+      const req = indexedDB.open(BD, 1);
+      req.onupgradeneeded = () => req.result.createObjectStore(ALMACEN, { keyPath: 'clave' });
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  // fn recibe el almacén; si devuelve un IDBRequest, se resuelve con su resultado
+  async function operar(modo, fn) {
+    const db = await abrir();
+    try {
+      return await new Promise((resolve, reject) => {
+        const tx = db.transaction(ALMACEN, modo);
+        const req = fn(tx.objectStore(ALMACEN));
+        tx.oncomplete = () => resolve(req ? req.result : undefined);
+        tx.onerror = tx.onabort = () => reject(tx.error);
+      });
+    } finally {
+      db.close();
+    }
+  }
+
+  function nuevaClave() {
+    if (global.crypto.randomUUID) return crypto.randomUUID();
+    return Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  async function agregar(campos) {
+    const boleta = { clave: nuevaClave(), creada: Date.now(), campos: campos, error: null };
+    await operar('readwrite', s => { s.put(boleta); });
+    return boleta;
+  }
+
+  async function pendientes() {
+    const todas = await operar('readonly', s => s.getAll());
+    return todas.sort((a, b) => a.creada - b.creada);
+  }
+
+  function quitar(clave) {
+    return operar('readwrite', s => { s.delete(clave); });
+  }
+
+  function marcarError(clave, error) {
+    return operar('readwrite', s => {
+      const req = s.get(clave);
+      req.onsuccess = () => { if (req.result) s.put(Object.assign(req.result, { error: error })); };
+    });
+  }
+
+  // estado: 'ok', 'sin_red', 'sesion' (venció el login) o 'error' (el servidor falló)
+  async function enviar(url) {
+    const resultado = { enviadas: [], errores: [], estado: 'ok' };
+    const cola = (await pendientes()).filter(b => !b.error);
+    for (let i = 0; i < cola.length; i += LOTE) {
+      const lote = cola.slice(i, i + LOTE).map(b => ({ clave: b.clave, creada: b.creada, campos: b.campos }));
+      let res;
+      try {
+        res = await fetch(url, {
+          method: 'POST', credentials: 'same-origin',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ boletas: lote }),
+        });
+      } catch (e) {
+        resultado.estado = 'sin_red';
+        break;
+      }
+      if (res.redirected) { resultado.estado = 'sesion'; break; }
+      if (!res.ok) { resultado.estado = 'error'; break; }
+      const datos = await res.json();
+      for (const b of datos.boletas) {
+        await quitar(b.clave);
+        resultado.enviadas.push(b);
+      }
+      for (const e of datos.errores) {
+        await marcarError(e.clave, e.error);
+        resultado.errores.push(e);
+      }
+    }
+    return resultado;
+  }
+
+  // Un solo envío a la vez entre pestañas y service worker (donde hay Web Locks)
+  function sincronizar(url) {
+    if (global.navigator.locks) return navigator.locks.request('cola-boletas', () => enviar(url));
+    return enviar(url);
+  }
+
+  global.ColaBoletas = {
+    disponible: 'indexedDB' in global,
+    agregar: agregar, pendientes: pendientes, quitar: quitar, sincronizar: sincronizar,
+  };
+})(self);
@@ -0,0 +1,62 @@
+// Service worker (servido en /sw.js): /boleta/nueva abre sin conexión y las boletas de la
+// cola (cola.js) se envían a /api/boletas/sync cuando vuelve la red (Background Sync).
+importScripts(new URL(location).searchParams.get('cola') || '/static/cola.js');
+
+const PAGINA = '/boleta/nueva';
+const URL_SYNC = '/api/boletas/sync';
+const CACHE = 'lava-mostrador';
+
+// Guarda la página y sus CSS/JS; lo que quedó de versiones anteriores se borra
+async function guardarPagina(respuesta) {
+  const html = await respuesta.clone().text();
+  const activos = [...html.matchAll(/(?:href|src)="(\/(?:activos|static)\/[^"]+)"/g)].map(m => m[1]);
+  const cache = await caches.open(CACHE);
+  await cache.addAll(activos);
+  await cache.put(PAGINA, respuesta);
+  const vigentes = new Set([PAGINA, ...activos].map(u => new URL(u, location).href));
+  for (const req of await cache.keys()) {
+    if (!vigentes.has(req.url)) await cache.delete(req);
+  }
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    fetch(PAGINA).then(res => res.ok && !res.redirected && guardarPagina(res)).catch(() => {})
+  );
+  self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener('fetch', event => {
+  const req = event.request;
+  const url = new URL(req.url);
+  if (req.method !== 'GET' || url.origin !== location.origin) return;
+
+  if (req.mode === 'navigate' && url.pathname === PAGINA) {
+    // Red primero (la página trae los mensajes del servidor); sin red, la copia guardada
+    event.respondWith(fetch(req).then(res => {
+      if (res.ok && !res.redirected) event.waitUntil(guardarPagina(res.clone()));
+      return res;
+    }).catch(() => caches.match(PAGINA).then(copia => copia || Response.error())));
+  } else if (url.pathname.startsWith('/activos/')) {
+    // Nombres con huella: lo guardado nunca queda viejo
+    event.respondWith(caches.match(req).then(copia => copia || fetch(req)));
+  } else if (url.pathname.startsWith('/static/')) {
+    event.respondWith(fetch(req).catch(() => caches.match(req).then(copia => copia || Response.error())));
+  }
+});
+
+async function sincronizar() {
+  const resultado = await ColaBoletas.sincronizar(URL_SYNC);
+  const ventanas = await self.clients.matchAll({ type: 'window' });
+  ventanas.forEach(v => v.postMessage(Object.assign({ tipo: 'cola-boletas' }, resultado)));
+  // Sin red, el navegador vuelve a disparar 'sync' más tarde
+  if (resultado.estado === 'sin_red') throw new Error('Sin conexión');
+}
+
+self.addEventListener('sync', event => {
+  if (event.tag === 'boletas') event.waitUntil(sincronizar());
+});